@@ -0,0 +1,49 @@
+"""Import time benchmark.
+
+Measures the time taken to start a fresh interpreter and import each of the
+main modules of paf_tools, as paid by every short-lived worker process.
+
+Run from the repository root:-
+
+    python benchmarks/import_time.py [repeats]
+
+"""
+import sys
+import time
+import statistics
+import subprocess
+
+#Define the modules to time, from the lightest to the heaviest.
+MODULES = [
+        'paf_tools.structure',
+        'paf_tools.populate.files_parser',
+        'paf_tools.populate.data_store',
+        'paf_tools.populate.populate',
+        'paf_tools.database.tables',
+        'paf_tools.database.lookup',
+        ]
+
+def time_import(module, repeats):
+    """Return the median time taken to import a module in a new process."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', 'import ' + module])
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main(argv=None):
+    """Print the median import time of each module."""
+    argv = sys.argv[1:] if argv is None else argv
+    repeats = int(argv[0]) if argv else 10
+    baseline = time_import('sys', repeats)
+    print("{:<35} {:>10}".format("module", "ms"))
+    print("{:<35} {:>10.1f}".format("(interpreter startup)", baseline * 1000))
+    for module in MODULES:
+        print("{:<35} {:>10.1f}".format(module,
+                                        time_import(module, repeats) * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
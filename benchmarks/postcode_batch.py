@@ -0,0 +1,56 @@
+"""Postcode batch benchmark.
+
+Compares the rate at which postcodes are converted to their key form by
+calling to_key for each postcode and by normalise_batch.
+
+Run from the repository root:-
+
+    python benchmarks/postcode_batch.py [number of postcodes]
+
+"""
+import os
+import sys
+import time
+import random
+
+#Import paf_tools from this repository, as the script's own folder (rather
+#than the repository root) is first on the path.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from paf_tools.postcode import to_key, normalise_batch
+
+#Define the forms in which the sample postcodes are written.
+FORMS = ["{} {}", "{}{}", "{}  {}", "{}-{}"]
+
+def sample_postcodes(count):
+    """Return a list of postcodes in a mixture of cases and spacings."""
+    random.seed(0)
+    postcodes = []
+    for _ in range(count):
+        outward = random.choice(["OX4", "M1", "SW1A", "EC1V", "B33", "ZZ"])
+        inward = "{}{}{}".format(random.randint(0, 9),
+                                 random.choice("ABDEFGHJ"),
+                                 random.choice("ABDEFGHJ"))
+        postcode = random.choice(FORMS).format(outward, inward)
+        postcodes.append(random.choice([postcode, postcode.lower()]))
+    return postcodes
+
+def main(argv=None):
+    """Print the rate of each method, in postcodes per second."""
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 1000000
+    postcodes = sample_postcodes(count)
+    start = time.perf_counter()
+    keys = [to_key(x) or '' for x in postcodes]
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_keys = normalise_batch(postcodes).keys
+    batch = time.perf_counter() - start
+    assert keys == batch_keys
+    print("{:<20} {:>15}".format("method", "postcodes/s"))
+    print("{:<20} {:>15,.0f}".format("to_key", count / single))
+    print("{:<20} {:>15,.0f}".format("normalise_batch", count / batch))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
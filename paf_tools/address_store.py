@@ -0,0 +1,212 @@
+"""Address Store module.
+
+Defines the AddressStore class, a compact in-memory store of flattened
+address data for lookup by postcode.
+
+The addresses within a postcode usually share their post town, localities
+and thoroughfare, and so the store encodes the addresses of each postcode
+together:-
+
+    * the fields with the same value for every address in the postcode are
+      stored once, along with a bitmask identifying them;
+    * the remaining fields are stored for each address, with the Address
+      Keys delta coded (as consecutive addresses usually have close keys);
+      and
+    * the postcodes are grouped into blocks of consecutive postcodes, each
+      of which is serialised with marshal and compressed with zlib.
+
+The postcodes are held in sorted order in a single byte string, with the
+number of the block holding each, so a lookup consists of a binary search
+followed by the decompression of a single block. Decoded blocks are held in
+an LRU cache, so that the addresses of frequently requested postcodes are
+returned without decompressing them again.
+
+"""
+import zlib
+import marshal
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from paf_tools.postcode import to_key
+from paf_tools.columnar import COLUMNS, FixedWidthColumn
+from paf_tools.sorting import external_sort, DEFAULT_RUN_SIZE
+
+#Define the fields of each address, other than the postcode.
+FIELDS = [field for field, _, _ in COLUMNS if field != 'postcode']
+#Define the position of the Address Key within FIELDS.
+ADDRESS_KEY_INDEX = FIELDS.index('address key')
+#Define the default number of addresses after which a block is closed.
+DEFAULT_BLOCK_SIZE = 256
+#Define the zlib compression level.
+COMPRESSION_LEVEL = 6
+
+class AddressStore(object):
+    """This class defines the AddressStore class.
+
+    The AddressStore holds flattened address data in compressed blocks, and
+    returns the addresses of a postcode in the same form as PAFData.
+
+    """
+    def __init__(self, addresses, block_size=DEFAULT_BLOCK_SIZE,
+                 cache_size=4096, run_size=None, tmpdir=None):
+        """Initialise AddressStore instance, encoding the addresses given.
+
+        The addresses are sorted by postcode using an external sort, so
+        they need not be given in postcode order, and are never all held in
+        memory uncompressed.
+
+        Keyword arguments:
+        addresses - an iterable of flattened address dictionaries (e.g. a
+                    PAFData instance)
+        block_size - the number of addresses after which a block is closed
+                     (defaults to DEFAULT_BLOCK_SIZE)
+        cache_size - the number of decoded blocks cached (defaults to 4096)
+        run_size - the number of addresses sorted in memory at once
+                   (defaults to the external sort default)
+        tmpdir - the folder in which to create temporary files (defaults
+                 to the system temporary folder)
+
+        """
+        self.address_count = 0
+        self.blocks = []
+        postcodes = bytearray()
+        block_numbers = array('I')
+        rows = external_sort(
+                ((address['postcode'], tuple(address.get(x) for x in FIELDS))
+                 for address in addresses),
+                key=lambda row: row[0],
+                run_size=run_size or DEFAULT_RUN_SIZE, tmpdir=tmpdir
+                )
+        block, block_addresses = [], 0
+        for postcode, group in _group_by_postcode(rows):
+            #Postcodes are held in the 7 character key form used by the PAF.
+            key = postcode.encode('ascii', 'replace')[:7].ljust(7)
+            block.append((key.decode('ascii'), _encode_group(group)))
+            postcodes.extend(key)
+            block_numbers.append(len(self.blocks))
+            self.address_count += len(group)
+            block_addresses += len(group)
+            if block_addresses >= block_size:
+                self.blocks.append(_compress(block))
+                block, block_addresses = [], 0
+        if block:
+            self.blocks.append(_compress(block))
+        self.postcodes = FixedWidthColumn(memoryview(bytes(postcodes)), 7)
+        self.block_numbers = block_numbers
+        self._block = lru_cache(cache_size)(self._decode_block)
+
+    def __len__(self):
+        """Return the number of postcodes in the store."""
+        return len(self.block_numbers)
+
+    def __contains__(self, postcode):
+        return self._find(postcode) is not None
+
+    def get(self, postcode):
+        """Get the addresses within a postcode.
+
+        Returns a list of flattened address dictionaries, which is empty if
+        the postcode is not present or not valid.
+
+        Keyword arguments:
+        postcode - the postcode, in any form accepted by postcode.to_key
+
+        """
+        position = self._find(postcode)
+        if position is None:
+            return []
+        key = self.postcodes[position].decode('ascii')
+        return [dict(address) for address in
+                self._block(self.block_numbers[position])[key]]
+
+    @property
+    def compressed_size(self):
+        """Return the size of the compressed blocks and index, in bytes."""
+        return (sum(len(x) for x in self.blocks) + len(self.postcodes) * 7 +
+                self.block_numbers.itemsize * len(self.block_numbers))
+
+    def cache_info(self):
+        """Return the hits, misses and size of the decoded block cache."""
+        return self._block.cache_info()
+
+    def _find(self, postcode):
+        """Find the position of a postcode, or None if it is not present."""
+        key = to_key(postcode)
+        if key is None:
+            return None
+        key = key.encode('ascii')
+        position = bisect_left(self.postcodes, key)
+        if position < len(self.postcodes) and \
+           self.postcodes[position] == key:
+            return position
+        return None
+
+    def _decode_block(self, number):
+        """Decode a block into a dictionary of addresses by postcode."""
+        block = marshal.loads(zlib.decompress(self.blocks[number]))
+        return {postcode: _decode_group(postcode, group)
+                for postcode, group in block}
+
+
+def _group_by_postcode(rows):
+    """Group rows sorted by postcode, yielding (postcode, [values...])."""
+    postcode, group = None, []
+    for row_postcode, values in rows:
+        if row_postcode != postcode and group:
+            yield postcode, group
+            group = []
+        postcode = row_postcode
+        group.append(values)
+    if group:
+        yield postcode, group
+
+def _encode_group(group):
+    """Encode the addresses of a postcode, factoring out shared fields.
+
+    Returns a tuple of (bitmask of shared fields, shared values, the values
+    of the remaining fields of each address).
+
+    """
+    first = group[0]
+    shared = [x for x in range(len(FIELDS))
+              if all(values[x] == first[x] for values in group)]
+    mask = sum(1 << x for x in shared)
+    varying = [x for x in range(len(FIELDS)) if not mask & (1 << x)]
+    rows = []
+    previous_key = 0
+    for values in group:
+        row = [values[x] for x in varying]
+        if ADDRESS_KEY_INDEX in varying:
+            position = varying.index(ADDRESS_KEY_INDEX)
+            row[position] = values[ADDRESS_KEY_INDEX] - previous_key
+            previous_key = values[ADDRESS_KEY_INDEX]
+        rows.append(tuple(row))
+    return mask, tuple(first[x] for x in shared), tuple(rows)
+
+def _decode_group(postcode, group):
+    """Decode the addresses of a postcode into flattened tuples of items.
+
+    Addresses are returned as tuples of (field, value) pairs, so that the
+    cached result cannot be altered by callers.
+
+    """
+    mask, shared_values, rows = group
+    shared = [x for x in range(len(FIELDS)) if mask & (1 << x)]
+    varying = [x for x in range(len(FIELDS)) if not mask & (1 << x)]
+    common = [('postcode', postcode)] + [
+            (FIELDS[x], value) for x, value in zip(shared, shared_values)
+            ]
+    addresses = []
+    previous_key = 0
+    for row in rows:
+        items = [(FIELDS[x], value) for x, value in zip(varying, row)]
+        if ADDRESS_KEY_INDEX in varying:
+            position = varying.index(ADDRESS_KEY_INDEX)
+            previous_key += row[position]
+            items[position] = ('address key', previous_key)
+        addresses.append(tuple(common + items))
+    return addresses
+
+def _compress(block):
+    """Serialise and compress a block of encoded postcodes."""
+    return zlib.compress(marshal.dumps(tuple(block)), COMPRESSION_LEVEL)
@@ -0,0 +1,342 @@
+"""Columnar module.
+
+Defines a columnar file format for a fully flattened PAF release, which
+may be memory-mapped and read by any number of processes without loading
+it into a database or building Python objects for every address.
+
+Rows are held in postcode order, and each field of the flattened address
+data is held in its own column:-
+
+    * the postcode, postcode type and delivery point suffix are held as
+      fixed-width ASCII strings (the postcode in its 7 character key form);
+    * the Address Key, Organisation Key, building number and the keys of
+      the locality and thoroughfares are held as unsigned 32-bit integers
+      (with a building number of 0 meaning none);
+    * the concatenation indicator is held as a single byte; and
+    * every other field is dictionary encoded, as an unsigned 32-bit code
+      into a dictionary of strings shared by all of the columns.
+
+The file begins with the magic bytes b"PAFCOL02", followed by the length
+and contents of a JSON header giving the number of rows and the position
+of each column and of the dictionary. Every column begins on an 8 byte
+boundary, so that it may be viewed in place as an array.
+
+"""
+import json
+import mmap
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from paf_tools.postcode import to_key
+from paf_tools.sorting import external_sort, DEFAULT_RUN_SIZE
+
+#Define the magic bytes at the start of every columnar file. (Files of
+#version 01 lack the key columns, so are refused rather than misread.)
+FILE_MAGIC = b"PAFCOL02"
+#Define the layout of the start of the file, before the JSON header.
+FILE_PREFIX = struct.Struct("=8sQ")
+#Define the columns of the file, as tuples of (flattened field name, kind,
+#width in bytes).
+COLUMNS = [
+        ('postcode', 'fixed', 7),
+        ('address key', 'integer', 4),
+        ('organisation key', 'integer', 4),
+        ('postcode type', 'fixed', 1),
+        ('delivery point suffix', 'fixed', 2),
+        ('building number', 'integer', 4),
+        ('concatenation indicator', 'boolean', 1),
+        ('locality key', 'integer', 4),
+        ('thoroughfare key', 'integer', 4),
+        ('thoroughfare descriptor key', 'integer', 4),
+        ('dependent thoroughfare key', 'integer', 4),
+        ('dependent thoroughfare descriptor key', 'integer', 4),
+        ('po box', 'string', 4),
+        ('post town', 'string', 4),
+        ('dependent locality', 'string', 4),
+        ('double dependent locality', 'string', 4),
+        ('building name', 'string', 4),
+        ('organisation name', 'string', 4),
+        ('department name', 'string', 4),
+        ('sub-building name', 'string', 4),
+        ('thoroughfare', 'string', 4),
+        ('dependent thoroughfare', 'string', 4),
+        ]
+#Define the fields for which an empty string is read back as None.
+NULLABLE_FIELDS = ['po box']
+
+def write_columnar_file(addresses, filename, run_size=None, tmpdir=None):
+    """Write flattened address data to a columnar file.
+
+    The addresses are encoded as they are read, and sorted into postcode
+    order using an external sort, so only the dictionary of distinct strings
+    is held in memory in full. Returns the number of rows written.
+
+    Keyword arguments:
+    addresses - an iterable of flattened address dictionaries (e.g. a
+                PAFData instance)
+    filename - the path of the file to write
+    run_size - the number of rows sorted in memory at once (defaults to the
+               external sort default)
+    tmpdir - the folder in which to create temporary files (defaults to the
+             system temporary folder)
+
+    """
+    dictionary = {'': 0}
+    def encode(address):
+        row = []
+        for field, kind, width in COLUMNS:
+            value = address.get(field)
+            if kind == 'fixed':
+                value = (value or '').encode('ascii', 'replace')
+                row.append(value[:width].ljust(width))
+            elif kind == 'string':
+                value = value or ''
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                row.append(code)
+            else:
+                row.append(int(value or 0))
+        return tuple(row)
+    rows = external_sort(map(encode, addresses), key=lambda row: row[0],
+                         run_size=run_size or DEFAULT_RUN_SIZE, tmpdir=tmpdir)
+    columns = [tempfile.TemporaryFile(dir=tmpdir) for _ in COLUMNS]
+    buffers = [bytearray() if kind == 'fixed' else
+               array('B' if kind == 'boolean' else 'I')
+               for _, kind, _ in COLUMNS]
+    count = 0
+    for row in rows:
+        for buffer, value in zip(buffers, row):
+            if isinstance(value, bytes):
+                buffer.extend(value)
+            else:
+                buffer.append(value)
+        count += 1
+        if not count % 65536:
+            _flush(buffers, columns)
+    _flush(buffers, columns)
+    strings = sorted(dictionary, key=dictionary.get)
+    _assemble(filename, count, columns, strings)
+    return count
+
+def _flush(buffers, columns):
+    """Write the buffered values of each column to its temporary file."""
+    for buffer, column in zip(buffers, columns):
+        column.write(buffer)
+        del buffer[:]
+    return None
+
+def _assemble(filename, count, columns, strings):
+    """Write the header, columns and dictionary to the columnar file."""
+    encoded = [x.encode('utf-8') for x in strings]
+    offsets = array('Q', [0])
+    for string in encoded:
+        offsets.append(offsets[-1] + len(string))
+    header = {'rows': count, 'columns': {}, 'dictionary': {}}
+    #Work out the position of each section, with each beginning on an 8
+    #byte boundary after the header.
+    sizes = [column.seek(0, 2) for column in columns]
+    sections = sizes + [len(offsets) * 8, offsets[-1]]
+    header_length = 1024
+    while True:
+        position = _align(FILE_PREFIX.size + header_length)
+        starts = []
+        for size in sections:
+            starts.append(position)
+            position = _align(position + size)
+        for (field, kind, width), start in zip(COLUMNS, starts):
+            header['columns'][field] = {'kind': kind, 'width': width,
+                                        'start': start}
+        header['dictionary'] = {'size': len(strings), 'offsets': starts[-2],
+                                'data': starts[-1]}
+        data = json.dumps(header).encode('utf-8')
+        if len(data) <= header_length:
+            break
+        header_length = len(data)
+    with open(filename, 'wb') as columnar_file:
+        columnar_file.write(FILE_PREFIX.pack(FILE_MAGIC, header_length))
+        columnar_file.write(data.ljust(header_length))
+        for section, start in zip(columns + [offsets.tobytes(),
+                                             b''.join(encoded)], starts):
+            columnar_file.write(b'\0' * (start - columnar_file.tell()))
+            if isinstance(section, bytes):
+                columnar_file.write(section)
+                continue
+            section.seek(0)
+            while True:
+                chunk = section.read(1 << 20)
+                if not chunk:
+                    break
+                columnar_file.write(chunk)
+            section.close()
+    return None
+
+def _align(position):
+    """Round a position up to the next 8 byte boundary."""
+    return (position + 7) & ~7
+
+
+class ColumnarFile(object):
+    """This class defines the ColumnarFile class.
+
+    The ColumnarFile gives access to the rows and columns of a columnar
+    file through a memory map. Columns are returned as views of the mapped
+    file, so no data is copied or decoded until a value is read.
+
+    """
+    def __init__(self, filename, cache_size=65536):
+        """Initialise ColumnarFile instance.
+
+        Keyword arguments:
+        filename - the path of the columnar file
+        cache_size - the number of dictionary strings for which the decoded
+                     string is cached (defaults to 65536)
+
+        """
+        with open(filename, 'rb') as columnar_file:
+            self._map = mmap.mmap(columnar_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, header_length = FILE_PREFIX.unpack_from(self._map)
+        if magic != FILE_MAGIC:
+            self._map.close()
+            raise ValueError("Error! {} is not a valid columnar file."
+                             .format(filename))
+        header = json.loads(bytes(
+                self._map[FILE_PREFIX.size:FILE_PREFIX.size + header_length]
+                ))
+        self.rows = header['rows']
+        self._view = memoryview(self._map)
+        self._columns = {}
+        for field, column in header['columns'].items():
+            section = self._view[column['start']:column['start'] +
+                                 self.rows * column['width']]
+            if column['kind'] == 'fixed':
+                self._columns[field] = FixedWidthColumn(section,
+                                                        column['width'])
+            else:
+                self._columns[field] = section.cast(
+                        'B' if column['kind'] == 'boolean' else 'I'
+                        )
+        self._kinds = {field: column['kind'] for field, column in
+                       header['columns'].items()}
+        dictionary = header['dictionary']
+        self._offsets = self._view[dictionary['offsets']:
+                                   dictionary['offsets'] +
+                                   (dictionary['size'] + 1) * 8].cast('Q')
+        self._strings_start = dictionary['data']
+        self.string = lru_cache(cache_size)(self._decode_string)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, index):
+        return self.row(index)
+
+    @property
+    def fields(self):
+        """Return the names of the columns."""
+        return [field for field, _, _ in COLUMNS]
+
+    def column(self, field):
+        """Return a column, viewed in place.
+
+        Integer and boolean columns are returned as memoryviews, and
+        dictionary encoded columns as memoryviews of their codes (which may
+        be decoded using the string method). Fixed-width columns are
+        returned as FixedWidthColumns.
+
+        """
+        return self._columns[field]
+
+    def row(self, index):
+        """Return a row, as a flattened address dictionary."""
+        if index < 0:
+            index += self.rows
+        if not 0 <= index < self.rows:
+            raise IndexError(index)
+        row = {}
+        for field, kind, _ in COLUMNS:
+            value = self._columns[field][index]
+            if kind == 'fixed':
+                value = value.decode('ascii').rstrip()
+                if field == 'postcode':
+                    value = value.ljust(7)
+            elif kind == 'string':
+                value = self.string(value)
+                if field in NULLABLE_FIELDS and not value:
+                    value = None
+            elif kind == 'boolean':
+                value = bool(value)
+            elif field == 'building number' and not value:
+                value = None
+            row[field] = value
+        return row
+
+    def postcode_range(self, postcode):
+        """Return the range of row indices within a postcode.
+
+        The postcode may be given in any form accepted by postcode.to_key.
+        Returns an empty range if the postcode is not valid.
+
+        """
+        key = to_key(postcode)
+        if key is None:
+            return range(0)
+        key = key.encode('ascii')
+        postcodes = self._columns['postcode']
+        return range(bisect_left(postcodes, key),
+                     bisect_right(postcodes, key))
+
+    def find_postcode(self, postcode):
+        """Return the rows within a postcode, as flattened dictionaries."""
+        return [self.row(x) for x in self.postcode_range(postcode)]
+
+    def close(self):
+        """Close the columnar file."""
+        self.string.cache_clear()
+        for column in self._columns.values():
+            column.release()
+        self._offsets.release()
+        self._view.release()
+        self._map.close()
+        return None
+
+    def _decode_string(self, code):
+        """Decode a string from the dictionary."""
+        start = self._strings_start + self._offsets[code]
+        end = self._strings_start + self._offsets[code + 1]
+        return str(self._map[start:end], 'utf-8')
+
+
+class FixedWidthColumn(object):
+    """This class defines the FixedWidthColumn class.
+
+    A read-only sequence of the fixed-width byte strings of a column, viewed
+    in place.
+
+    """
+    def __init__(self, view, width):
+        self.view = view
+        self.width = width
+
+    def __len__(self):
+        return len(self.view) // self.width
+
+    def __getitem__(self, index):
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        start = index * self.width
+        return self.view[start:start + self.width].tobytes()
+
+    def release(self):
+        """Release the view of the column."""
+        self.view.release()
+        return None
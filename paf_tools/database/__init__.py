@@ -3,9 +3,77 @@
 Contains configurable settings for the database tool, and initialises the 
 database itself.
 
+The engine and Session factory are only created when first used, through 
+get_engine or by accessing database.engine or database.Session, so that 
+importing the database package does not touch the database file.
+
+Engines for database files are created by create_file_engine, which 
+watches the file for replacement (for example, by rebuild_database in the 
+rebuild module). When a connection is taken from the pool after the file 
+has been replaced, the connection is discarded and a new one opened, so 
+that long-lived processes move to the new database without restarting.
+
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+#Define the path to the database file.
+DATABASE_PATH = './paf-tools.db'
+
+Base = declarative_base()
+
+_engine = None
+_session_factory = None
+
+def get_engine():
+    """Return the database engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = create_file_engine(DATABASE_PATH)
+    return _engine
+
+def get_session_factory():
+    """Return the Session factory, creating it on first use."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(bind=get_engine())
+    return _session_factory
+
+def create_file_engine(path):
+    """Create an engine for a SQLite database file, watching for replacement.
+
+    Keyword arguments:
+    path - the path to the database file
+
+    """
+    from sqlalchemy import create_engine, event, exc
+    engine = create_engine('sqlite:///{}'.format(path))
+
+    @event.listens_for(engine, 'connect')
+    def record_file(dbapi_connection, connection_record):
+        connection_record.info['file signature'] = file_signature(path)
+
+    @event.listens_for(engine, 'checkout')
+    def check_file(dbapi_connection, connection_record, connection_proxy):
+        if connection_record.info.get('file signature') != file_signature(path):
+            #The pool discards the connection and tries again.
+            raise exc.DisconnectionError("Database file has been replaced.")
+
+    return engine
+
+def file_signature(path):
+    """Return a value identifying a file, which changes if it is replaced."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino)
 
-engine = create_engine('sqlite:///./paf-tools.db')
-Session = sessionmaker(bind=engine)
+def __getattr__(name):
+    """Create the engine and Session factory lazily on attribute access."""
+    if name == 'engine':
+        return get_engine()
+    if name == 'Session':
+        return get_session_factory()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__,
+                                                                    name))
@@ -0,0 +1,178 @@
+"""Cache module.
+
+Provides the QueryCache class, a bounded cache of the results of database
+queries, for lookup traffic in which a small number of postcodes make up
+most of the queries.
+
+The cache is opt-in. Lookups go straight to the database unless a
+QueryCache is used, either directly (e.g. find_postcode) or by passing it
+to lookup.lookup_many or lookup.write_lookup_csv as the cache argument.
+
+Results are cached as immutable CachedAddress tuples (holding the lookup
+columns and the formatted label of each address) rather than as Address
+instances, so that a hit requires neither a query nor the construction and
+formatting of ORM objects, and a cached result may be shared safely between
+threads.
+
+Every cached result is tied to the release from which it was read. The
+release is identified by the signature of the database file - its device,
+inode, size and modification time - which changes both when the file is
+replaced (as by rebuild_database) and when it is written to in place (as
+by populate_address_data). The signature is checked on every lookup, and
+when it changes the whole cache is discarded, so stale addresses are never
+served.
+
+"""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from sqlalchemy.orm import sessionmaker
+from paf_tools import database
+from paf_tools.database.tables import Address
+from paf_tools.database.lookup import LOOKUP_COLUMNS
+from paf_tools.postcode import to_key
+
+#Define the default number of results cached.
+DEFAULT_CACHE_SIZE = 10000
+
+CachedAddress = namedtuple('CachedAddress',
+                           ['address_key'] + LOOKUP_COLUMNS + ['label'])
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions',
+                                     'invalidations', 'size', 'maxsize'])
+
+def release_version(path):
+    """Return a value identifying the release held in a database file.
+
+    Returns None if the file does not exist.
+
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class QueryCache(object):
+    """This class defines the QueryCache class.
+
+    The QueryCache holds the results of up to maxsize queries, discarding
+    the least recently used once full, along with counts of its hits,
+    misses, evictions and invalidations.
+
+    """
+    def __init__(self, database_path=None, maxsize=DEFAULT_CACHE_SIZE):
+        """Initialise QueryCache instance.
+
+        Keyword arguments:
+        database_path - the path to the database file (defaults to the
+                        configured database)
+        maxsize - the number of results cached (defaults to
+                  DEFAULT_CACHE_SIZE)
+
+        """
+        self.database_path = database_path or database.DATABASE_PATH
+        self.maxsize = maxsize
+        self.engine = database.create_file_engine(self.database_path)
+        self.Session = sessionmaker(bind=self.engine)
+        self.version = None
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def get(self, name, args, compute):
+        """Get the result of a query, computing and caching it if necessary.
+
+        The result is cached under the current release version, the name of
+        the query and its arguments.
+
+        Keyword arguments:
+        name - the name of the query
+        args - a tuple of the (hashable) arguments of the query
+        compute - a function taking a session and the arguments, which
+                  returns the (immutable) result of the query
+
+        """
+        version = release_version(self.database_path)
+        key = (version, name, args)
+        with self._lock:
+            if version != self.version:
+                if self._results:
+                    self.invalidations += 1
+                self._results.clear()
+                self.version = version
+            try:
+                result = self._results[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+        session = self.Session()
+        try:
+            result = compute(session, *args)
+        finally:
+            session.close()
+        with self._lock:
+            #Only cache the result if the release has not changed meanwhile.
+            if version == self.version:
+                self._results[key] = result
+                self._results.move_to_end(key)
+                while len(self._results) > self.maxsize:
+                    self._results.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    def find_postcode(self, postcode):
+        """Find the addresses within a postcode.
+
+        Returns a tuple of CachedAddresses, which is empty if the postcode
+        is not valid or not present.
+
+        Keyword arguments:
+        postcode - the postcode, in any form accepted by postcode.to_key
+
+        """
+        key = to_key(postcode)
+        if key is None:
+            return ()
+        return self.get('postcode', (key,), _find_postcode)
+
+    def info(self):
+        """Return the hits, misses, evictions, invalidations and size."""
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             self.invalidations, len(self._results),
+                             self.maxsize)
+
+    def clear(self):
+        """Discard every cached result, keeping the counts."""
+        with self._lock:
+            self._results.clear()
+        return None
+
+    def close(self):
+        """Discard every cached result and close the database engine."""
+        self.clear()
+        self.engine.dispose()
+        return None
+
+
+def _find_postcode(session, key):
+    """Read the addresses within a postcode (in key form) as a tuple."""
+    addresses = session.query(Address).filter(
+            Address.postcode == key
+            ).order_by(Address.id)
+    return tuple(cache_address(address) for address in addresses)
+
+def cache_address(address):
+    """Convert an Address instance to a CachedAddress."""
+    return CachedAddress(
+            address.address_key,
+            *[getattr(address, column) for column in LOOKUP_COLUMNS],
+            label=str(address)
+            )
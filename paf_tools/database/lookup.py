@@ -0,0 +1,230 @@
+"""Lookup module.
+
+Provides functions for looking up addresses held in the database.
+
+Large batches of postcodes may be looked up using the lookup_many function, 
+which sorts the batch and then merge-joins it against the addresses read 
+in postcode order. This requires a single pass over the relevant part of 
+the addresses table, rather than one query per postcode, and uses a 
+bounded amount of memory whatever the size of the batch. 
+
+Where the same postcodes are looked up again and again (e.g. small batches 
+of lookup traffic), a QueryCache (see the cache module) may be passed to 
+lookup_many instead, which then reads each postcode from the cache. The 
+cache is opt-in, and is never used unless passed.
+
+A batch held in a CSV file may be looked up from the command line:-
+
+    python -m paf_tools.database.lookup <input CSV> <output CSV> 
+        [--column <postcode column>] [--database <database file>]
+
+"""
+import sys
+import csv
+import argparse
+from operator import itemgetter
+from itertools import islice
+from sqlalchemy.orm import sessionmaker
+from paf_tools import database
+from paf_tools.database.tables import Address
+from paf_tools.postcode import normalise_batch
+from paf_tools.sorting import external_sort, DEFAULT_RUN_SIZE
+
+#Define the address columns added to each row by a batch lookup.
+LOOKUP_COLUMNS = [
+        'organisation', 'department', 'po_box_num', 'sub_building_name', 
+        'building_name', 'building_number', 'dependent_thoroughfare', 
+        'thoroughfare', 'double_dependent_locality', 'dependent_locality', 
+        'town', 'postcode',
+        ]
+#Define the prefix given to the address columns in lookup output.
+LOOKUP_PREFIX = 'paf_'
+
+def find_by_organisation(organisation, department=None, session=None):
+    """Find all addresses for an organisation.
+
+    Organisation names are stored in title case, so the search is made 
+    case-insensitive by converting the input in the same way. This allows 
+    the lookup to use the index on the organisation column.
+
+    Returns a list of Address instances.
+
+    Keyword arguments:
+    organisation - the name of the organisation to find
+    department - the name of a department to restrict the results to 
+                 (optional)
+    session - the database session to use (defaults to a new session)
+
+    """
+    session = session or database.Session()
+    query = session.query(Address).filter(
+            Address.organisation == organisation.strip().title()
+            )
+    if department is not None:
+        query = query.filter(Address.department == department.strip().title())
+    return query.order_by(Address.postcode, Address.id).all()
+
+def lookup_many(rows, postcode_field='postcode', session=None, 
+                run_size=DEFAULT_RUN_SIZE, cache=None):
+    """Look up the addresses for a batch of postcodes.
+
+    Generator function which yields a tuple of (row, address) for each 
+    address matching each row, where address is a dictionary of the 
+    LOOKUP_COLUMNS of the address. Rows with no matching addresses (including 
+    those with invalid postcodes) are yielded once, with an address of None.
+
+    Rows are yielded in postcode order, rather than the order given, with 
+    invalid postcodes first.
+
+    Keyword arguments:
+    rows - an iterable of dictionaries, such as those from a csv.DictReader
+    postcode_field - the key of the postcode in each row (defaults to 
+                     'postcode')
+    session - the database session to use (defaults to a new session)
+    run_size - the maximum number of rows to sort in memory at once 
+               (defaults to DEFAULT_RUN_SIZE)
+    cache - a QueryCache from which to read the addresses of each postcode, 
+            in place of the merge join and session (optional)
+
+    """
+    if cache is None:
+        session = session or database.Session()
+    keyed_rows = _keyed_rows(rows, postcode_field, run_size)
+    sorted_rows = external_sort(keyed_rows, key=itemgetter(0), 
+                                run_size=run_size)
+    addresses, pending_key, pending_addresses = None, None, []
+    current_key, current_addresses = None, []
+    for key, row in sorted_rows:
+        if key != current_key:
+            current_key = key
+            if cache is not None:
+                current_addresses = _cached_addresses(cache, key)
+            else:
+                if key and addresses is None:
+                    addresses = _address_groups(session, key)
+                    pending_key, pending_addresses = next(addresses, 
+                                                          (None, []))
+                #Advance through the addresses until reaching this postcode.
+                while key and pending_key is not None and pending_key < key:
+                    pending_key, pending_addresses = next(addresses, 
+                                                          (None, []))
+                current_addresses = (pending_addresses 
+                                     if key and pending_key == key else [])
+        if not current_addresses:
+            yield row, None
+        for address in current_addresses:
+            yield row, address
+
+def write_lookup_csv(input_file, output_file, postcode_field='postcode', 
+                     session=None, cache=None):
+    """Look up the postcodes in a CSV file, writing the results as CSV.
+
+    Each output row consists of the input row, followed by the 
+    LOOKUP_COLUMNS of a matching address (each prefixed with LOOKUP_PREFIX). 
+    Returns the number of rows written.
+
+    Keyword arguments:
+    input_file - an open file containing CSV data, with a header row
+    output_file - an open file to which to write the results
+    postcode_field - the name of the postcode column (defaults to 
+                     'postcode')
+    session - the database session to use (defaults to a new session)
+    cache - a QueryCache from which to read the addresses (optional, see 
+            lookup_many)
+
+    """
+    reader = csv.DictReader(input_file)
+    if postcode_field not in (reader.fieldnames or []):
+        raise ValueError("Error! Input has no {} column.".format(
+            postcode_field
+            ))
+    writer = csv.writer(output_file)
+    writer.writerow(reader.fieldnames + 
+                    [LOOKUP_PREFIX + column for column in LOOKUP_COLUMNS])
+    count = 0
+    for row, address in lookup_many(reader, postcode_field, session, 
+                                    cache=cache):
+        writer.writerow(
+                [row[x] for x in reader.fieldnames] + 
+                [address[x] if address else '' for x in LOOKUP_COLUMNS]
+                )
+        count += 1
+    return count
+
+def _keyed_rows(rows, postcode_field, chunk_size):
+    """Pair each row with the key form of its postcode.
+
+    Generator function which yields a tuple of (key, row) for each row, 
+    where the key is an empty string if the postcode is not valid. The 
+    postcodes are normalised in chunks, using normalise_batch.
+
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        keys = normalise_batch([row.get(postcode_field) for row in chunk]).keys
+        yield from zip(keys, chunk)
+
+def _cached_addresses(cache, key):
+    """Read the addresses of a postcode (in key form) from a QueryCache."""
+    if not key:
+        return []
+    return [{column: getattr(address, column) for column in LOOKUP_COLUMNS}
+            for address in cache.find_postcode(key)]
+
+def _address_groups(session, first_key):
+    """Read the addresses in postcode order, grouped by postcode.
+
+    Generator function which yields a tuple of (postcode, addresses) for 
+    each postcode from first_key onwards.
+
+    """
+    columns = [getattr(Address, column) for column in LOOKUP_COLUMNS]
+    query = session.query(*columns).filter(
+            Address.postcode >= first_key
+            ).order_by(Address.postcode, Address.id).yield_per(10000)
+    current_key, current_addresses = None, []
+    for address in query:
+        if address.postcode != current_key:
+            if current_addresses:
+                yield current_key, current_addresses
+            current_key, current_addresses = address.postcode, []
+        current_addresses.append(dict(zip(LOOKUP_COLUMNS, address)))
+    if current_addresses:
+        yield current_key, current_addresses
+
+def main(argv=None):
+    """Look up the postcodes in a CSV file from the command line."""
+    parser = argparse.ArgumentParser(
+            description="Look up the addresses for the postcodes in a CSV file."
+            )
+    parser.add_argument('input', help="input CSV file ('-' for stdin)")
+    parser.add_argument('output', help="output CSV file ('-' for stdout)")
+    parser.add_argument('--column', default='postcode', 
+                        help="name of the postcode column")
+    parser.add_argument('--database', 
+                        help="path to the database file (defaults to the "
+                             "configured database)")
+    args = parser.parse_args(argv)
+    session = None
+    if args.database:
+        engine = database.create_file_engine(args.database)
+        session = sessionmaker(bind=engine)()
+    input_file = (sys.stdin if args.input == '-' 
+                  else open(args.input, newline=''))
+    output_file = (sys.stdout if args.output == '-' 
+                   else open(args.output, 'w', newline=''))
+    try:
+        count = write_lookup_csv(input_file, output_file, args.column, session)
+    finally:
+        for open_file in (input_file, output_file):
+            if open_file not in (sys.stdin, sys.stdout):
+                open_file.close()
+    print("{:,d} rows written.".format(count), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""Matching module.
+
+Provides tools for matching free-form customer addresses to the PAF,
+resolving each to the Address Key of the delivery point it describes.
+
+Matching takes place in three stages:-
+
+    * Blocking - the postcode is extracted from the address and only the
+      addresses within that postcode are considered. If there are none (for
+      example, because the postcode has been mistyped), the addresses within
+      the postcode sector are considered instead;
+    * Scoring - each candidate is scored by comparing the tokens of its
+      building number, building and sub-building names, organisation and
+      thoroughfare against those of the input; and
+    * Selection - the highest scoring candidate is the match, provided its
+      score (the confidence of the match) reaches the threshold.
+
+Large batches may be matched across a pool of processes using match_many.
+
+"""
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import sessionmaker
+from paf_tools import database
+from paf_tools.database.tables import Address
+from paf_tools.tokens import tokenise
+
+#Define the pattern used to find a postcode within an address.
+POSTCODE_SEARCH = re.compile(
+        r"\b([A-Z]{1,2}[0-9][0-9A-Z]?)\s*([0-9][A-Z]{2})\b", re.IGNORECASE
+        )
+#Define the weight given to each component of the score.
+SCORE_WEIGHTS = {
+        'postcode': 0.15,
+        'number': 0.3,
+        'name': 0.3,
+        'thoroughfare': 0.15,
+        'numbers accounted for': 0.1,
+        }
+#Define the score given to a candidate found within the postcode sector,
+#rather than the postcode itself.
+SECTOR_SCORE = 0.5
+#Define the default minimum confidence required for a match.
+DEFAULT_THRESHOLD = 0.6
+#Define the number of addresses matched by a worker process at a time.
+DEFAULT_CHUNK_SIZE = 1000
+
+Match = namedtuple('Match', ['address_key', 'confidence', 'label'])
+Candidate = namedtuple('Candidate', ['address_key', 'label', 'number',
+                                     'name', 'thoroughfare', 'tokens'])
+
+#Matcher used by each worker process, created by the pool initialiser.
+_worker_matcher = None
+
+class AddressMatcher(object):
+    """This class defines the AddressMatcher class.
+
+    The AddressMatcher matches free-form addresses against the addresses in
+    the database. The candidates for each postcode are cached, as batches of
+    customer addresses frequently contain many addresses in the same
+    postcode.
+
+    """
+    def __init__(self, session=None, threshold=DEFAULT_THRESHOLD,
+                 cache_size=10000):
+        """Initialise AddressMatcher instance.
+
+        Keyword arguments:
+        session - the database session to use (defaults to a new session)
+        threshold - the minimum confidence required for a match (defaults
+                    to DEFAULT_THRESHOLD)
+        cache_size - the number of postcodes for which candidates are cached
+                     (defaults to 10000)
+
+        """
+        self.session = session or database.Session()
+        self.threshold = threshold
+        self._candidates = lru_cache(cache_size)(self._find_candidates)
+
+    def match(self, address):
+        """Match a free-form address.
+
+        Returns a Match containing the Address Key, the confidence of the
+        match (from 0 to 1) and the formatted PAF address. If no match is
+        found, the Address Key and label are None.
+
+        Keyword arguments:
+        address - the address to match, as a single string
+
+        """
+        postcode_match = None
+        for postcode_match in POSTCODE_SEARCH.finditer(address):
+            pass
+        if not postcode_match:
+            return Match(None, 0.0, None)
+        outward, inward = (x.upper() for x in postcode_match.groups())
+        key = outward.ljust(4) + inward
+        text = address[:postcode_match.start()] + address[postcode_match.end():]
+        tokens = tokenise(text)
+        candidates, postcode_score = self._candidates(key), 1.0
+        if not candidates:
+            candidates, postcode_score = self._candidates(key[:5]), SECTOR_SCORE
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            score = score_candidate(candidate, tokens, postcode_score)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < self.threshold:
+            return Match(None, round(best_score, 3), None)
+        return Match(best.address_key, round(best_score, 3), best.label)
+
+    def _find_candidates(self, postcode):
+        """Find the candidate addresses for a postcode or postcode sector.
+
+        A full postcode is given in key form; anything shorter is treated as
+        a postcode sector. Returns a tuple of Candidates.
+
+        """
+        query = self.session.query(Address)
+        if len(postcode) == 7:
+            query = query.filter(Address.postcode == postcode)
+        else:
+            query = query.filter(Address.postcode.between(postcode,
+                                                          postcode + '~'))
+        return tuple(make_candidate(x) for x in query)
+
+
+def make_candidate(address):
+    """Prepare an Address for scoring against input addresses."""
+    name = tokenise(' '.join(filter(None, (
+            address.sub_building_name, address.building_name,
+            address.organisation, address.po_box_num
+            ))))
+    thoroughfare = tokenise(' '.join(filter(None, (
+            address.dependent_thoroughfare, address.thoroughfare
+            ))))
+    number = str(address.building_number) if address.building_number else None
+    return Candidate(
+            address_key=address.address_key,
+            label=str(address).replace('\n', ', '),
+            number=number,
+            name=frozenset(name),
+            thoroughfare=frozenset(thoroughfare),
+            tokens=frozenset(name + thoroughfare + ([number] if number else [])),
+            )
+
+def score_candidate(candidate, tokens, postcode_score=1.0):
+    """Score a candidate against the tokens of an input address.
+
+    Each component of the score is between 0 and 1, and components which
+    do not apply to the candidate (e.g. the building number, if it has none)
+    are left out. Returns the weighted average of the components.
+
+    Keyword arguments:
+    candidate - the Candidate to score
+    tokens - the tokens of the input address, excluding the postcode
+    postcode_score - the score for the postcode (defaults to 1.0)
+
+    """
+    token_set = set(tokens)
+    scores = {'postcode': postcode_score}
+    if candidate.number:
+        scores['number'] = 1.0 if candidate.number in token_set else 0.0
+    if candidate.name:
+        scores['name'] = (len(candidate.name & token_set) /
+                          len(candidate.name))
+    if candidate.thoroughfare:
+        scores['thoroughfare'] = (len(candidate.thoroughfare & token_set) /
+                                  len(candidate.thoroughfare))
+    #Penalise candidates which leave numbers in the input unexplained, such
+    #as a flat number, so that the most specific candidate is preferred.
+    numbers = {x for x in token_set if x[0].isdigit()}
+    if numbers:
+        scores['numbers accounted for'] = (len(numbers & candidate.tokens) /
+                                           len(numbers))
+    total_weight = sum(SCORE_WEIGHTS[x] for x in scores)
+    return sum(SCORE_WEIGHTS[x] * score for x, score in scores.items()
+               ) / total_weight
+
+def match_many(addresses, workers=None, database_path=None,
+               threshold=DEFAULT_THRESHOLD, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Match a batch of free-form addresses across a pool of processes.
+
+    Generator function which yields a Match for each address, in the order
+    given. Only a limited number of chunks of addresses are in progress at
+    any time, so the batch may be of any size.
+
+    Keyword arguments:
+    addresses - an iterable of addresses, each a single string
+    workers - the number of worker processes (defaults to the number of CPUs)
+    database_path - the path to the database file (defaults to the
+                    configured database)
+    threshold - the minimum confidence required for a match (defaults to
+                DEFAULT_THRESHOLD)
+    chunk_size - the number of addresses sent to a worker at a time
+                 (defaults to DEFAULT_CHUNK_SIZE)
+
+    """
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(database_path, threshold)) as executor:
+        max_pending = (workers or os.cpu_count() or 1) * 2
+        pending = []
+        chunk = []
+        for address in addresses:
+            chunk.append(address)
+            if len(chunk) == chunk_size:
+                pending.append(executor.submit(_match_chunk, chunk))
+                chunk = []
+                if len(pending) >= max_pending:
+                    yield from pending.pop(0).result()
+        if chunk:
+            pending.append(executor.submit(_match_chunk, chunk))
+        for future in pending:
+            yield from future.result()
+
+def _init_worker(database_path, threshold):
+    """Initialise a worker process with its own database session."""
+    global _worker_matcher
+    session = None
+    if database_path:
+        engine = database.create_file_engine(database_path)
+        session = sessionmaker(bind=engine)()
+    _worker_matcher = AddressMatcher(session, threshold)
+    return None
+
+def _match_chunk(addresses):
+    """Match a chunk of addresses in a worker process."""
+    return [_worker_matcher.match(address) for address in addresses]
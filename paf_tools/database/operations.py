@@ -3,90 +3,90 @@
 Provides various helper functions for carrying out database operations.
 
 """
-import re
-from sqlalchemy import MetaData
-from paf_tools.database import engine
+from sqlalchemy import MetaData, text
+from paf_tools.database import get_engine
 from paf_tools.database.tables import Base
+#The formatting functions are defined in the formatting module, which does 
+#not depend on SQLAlchemy, and are imported here for compatibility.
+from paf_tools.formatting import format_address, format_building_components
 
 #############################
 # Database helper functions #
 #############################
 
-def erase_database():
-    """Erase contents of database and start over."""
-    metadata = MetaData(engine)
-    metadata.reflect()
-    metadata.drop_all()
+def erase_database(engine=None):
+    """Erase contents of database and start over.
+
+    Keyword arguments:
+    engine - the database engine to erase (defaults to the configured 
+             database)
+
+    """
+    #Imported here to avoid a circular import via the tables module.
+    from paf_tools.database.search import SEARCH_TABLE
+    engine = engine or get_engine()
+    #The search table must be dropped before reflecting, as reflection 
+    #would otherwise pick up its internal tables individually.
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS {}".format(SEARCH_TABLE)))
+    metadata = MetaData()
+    metadata.reflect(bind=engine)
+    metadata.drop_all(bind=engine)
     Base.metadata.create_all(engine)
     return None
 
-#############################
-# Data formatting functions #
-#############################
+def check_schema(engine=None):
+    """Check that the tables of a database have every column now defined.
+
+    Tables are never altered in place, so a database built before a table 
+    or column was added (e.g. the streets table and the component key 
+    columns of the addresses table) must be rebuilt, with rebuild_database 
+    or by populating it with erase_existing. Raises a ValueError naming 
+    what is missing.
 
-def format_address(**args):
-    """Properly format an address according to the Royal Mail's recommendations.
+    Keyword arguments:
+    engine - the database engine to check (defaults to the configured 
+             database)
 
-    The rules are convoluted but explained from page 27 of the Programmers' 
-    Guide to the PAF: http://www.royalmail.com/sites/default/files/docs/pdf/programmers_guide_edition_7_v5.pdf
-        
     """
-    #Begin with the organisation and PO Box number, if applicable.
-    address = ''.join([args[entry] + '\n' 
-                       for entry in ['organisation', 'PO box']
-                       if args.get(entry)])
-    #Format building name/number components.
-    address += format_building_components(*[args.get(x) for x in 
-                                            ['sub-building name', 
-                                             'building name', 
-                                             'building number',
-                                             'concatenation indicator']])
-   #Add thoroughfare (if present), locality/town and postcode.
-    address += ''.join([args[entry] + '\n' 
-                        for entry in ['dependent thoroughfare', 
-                                      'thoroughfare',
-                                      'double dependent locality',
-                                      'dependent locality',
-                                      'town',
-                                      'postcode']
-                        if args.get(entry)])
-    return address.strip()
+    from sqlalchemy import inspect
+    engine = engine or get_engine()
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            raise ValueError("Error! Database has no {} table, and must be "
+                             "rebuilt.".format(table.name))
+        present = {column['name'] for column in 
+                   inspector.get_columns(table.name)}
+        missing = [column.name for column in table.columns 
+                   if column.name not in present]
+        if missing:
+            raise ValueError("Error! Database {} table has no {} column, "
+                             "and must be rebuilt.".format(
+                                 table.name, ', '.join(missing)))
+    return None
+
+def check_labels(session=None, limit=None):
+    """Check the stored labels of addresses against the live formatter.
 
-def format_building_components(sub_building_name=None, 
-                               building_name=None, 
-                               building_number=None,
-                               concatenation_indicator=False):
-    """Properly format building name/number components.
+    Returns a list of (address key, stored label, formatted label) tuples 
+    for each address whose stored label differs from that now given by 
+    formatting its components. Addresses with no stored label are skipped.
 
-    Follows the rules laid down in the Royal Mail's Programmers' Guide.
+    Keyword arguments:
+    session - the database session to use (defaults to a new session)
+    limit - the maximum number of addresses to check (defaults to all)
 
     """
-    #Check if sub- and building name and building number
-    if not (sub_building_name or building_name or building_number):
-        return ""
-    #Check if concatenation indicator is True. If so, simply concat and return.
-    if concatenation_indicator:
-        return str(building_number or '') + sub_building_name + ' '
-    #Define exception to usual rule of newline for building name.
-    #See p. 27 of PAF Guide for details.
-    return_str = ""
-    exception_rule = re.compile("^\d.*\d$|^\d.*\d[A-Za-z]$|^.$")
-    for x in (sub_building_name, building_name):
-        if x:
-            #If the entry is filled, check for exception
-            if re.match(exception_rule, x):
-                return_str += x + ', ' if x.isalpha() else x + ' '
-            else:
-                #Check if final portion of string is numeric/alphanumeric.
-                #If so, split and apply exception to that section only.
-                final_portion = x.split(' ')[-1]
-                if (re.match(exception_rule, final_portion) and not
-                    building_number and not
-                    re.match('^\d*$', final_portion)):
-                    x = ' '.join(x.split(' ')[:-1])
-                    return_str += x + '\n' + final_portion + ' '
-                else:
-                    return_str += x + '\n'
-    return_str += str(building_number) + ' ' if building_number else ''
-    return return_str
- 
+    from paf_tools import database
+    from paf_tools.database.tables import Address
+    session = session or database.Session()
+    query = session.query(Address).filter(Address.label.isnot(None))
+    if limit:
+        query = query.limit(limit)
+    mismatches = []
+    for address in query.yield_per(10000):
+        formatted = address.format_label()
+        if formatted != address.label:
+            mismatches.append((address.address_key, address.label, formatted))
+    return mismatches
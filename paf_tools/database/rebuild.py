@@ -0,0 +1,132 @@
+"""Rebuild module.
+
+Provides a blue/green rebuild of the database, so that lookups may continue
+against the current release while the next is loaded.
+
+The new release is built in a side file alongside the live database, in
+the following stages:-
+
+    * the release is validated (see the validate module), and the rebuild
+      abandoned if it is not valid;
+    * the tables are created without their indexes, and the addresses are
+      loaded, which is much faster than maintaining the indexes row by row;
+    * the database is checked, by comparing the number of rows loaded with
+      the number of rows present and running SQLite's integrity check;
+    * the indexes are built, and ANALYZE is run so that the query planner
+      has statistics for the new data; and
+    * the side file is renamed over the live database, which replaces it
+      atomically.
+
+Processes using an engine created by database.create_file_engine (as the
+default engine is) detect the replacement as they next take a connection
+from the pool, and reconnect to the new file. Queries in progress at the
+time of the switch complete against the old release.
+
+"""
+import os
+from sqlalchemy import text
+from sqlalchemy.schema import CreateTable
+from paf_tools import database
+from paf_tools.database.tables import Base
+from paf_tools.populate.populate import populate_address_data
+
+#Define the suffix of the side file in which a release is built.
+BUILD_SUFFIX = '.building'
+
+class RebuildError(Exception):
+    """Raised when a new release fails validation or checks."""
+    pass
+
+
+def rebuild_database(paf_path, database_path=None, search_index=False,
+                     memory_limit=None, validate=True, labels=False,
+                     tmpdir=None):
+    """Build a new release in a side file, then switch it in atomically.
+
+    Returns the number of addresses loaded. Raises a RebuildError, leaving
+    the live database untouched, if the release is not valid or the new
+    database fails its checks.
+
+    Keyword arguments:
+    paf_path - the full path to the folder containing PAF data
+    database_path - the path to the live database file (defaults to the
+                    configured database)
+    search_index - boolean confirming whether the full-text search index is
+                   to be built (defaults to False)
+    memory_limit - if given, the approximate amount of memory (in bytes) to
+                   use in flattening the data (see populate_address_data)
+    validate - boolean confirming whether the release is validated before
+               it is loaded (defaults to True)
+    labels - boolean confirming whether the formatted label of each address
+             is to be stored (defaults to False)
+    tmpdir - the folder in which to write temporary files when flattening
+             under a memory limit (defaults to the system temporary folder)
+
+    """
+    database_path = database_path or database.DATABASE_PATH
+    build_path = database_path + BUILD_SUFFIX
+    if validate:
+        from paf_tools.populate.validate import validate_release
+        print("=== Validating release... ===")
+        report = validate_release(paf_path)
+        if not report:
+            raise RebuildError("Release is not valid.\n{}".format(report))
+    _remove_database_file(build_path)
+    engine = database.create_file_engine(build_path)
+    try:
+        _create_tables(engine)
+        count = populate_address_data(paf_path, erase_existing=False,
+                                      search_index=search_index,
+                                      memory_limit=memory_limit,
+                                      engine=engine, labels=labels,
+                                      tmpdir=tmpdir)
+        _check_database(engine, count)
+        print("=== Building indexes... ===")
+        _create_indexes(engine)
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+    except BaseException:
+        engine.dispose()
+        _remove_database_file(build_path)
+        raise
+    engine.dispose()
+    os.replace(build_path, database_path)
+    print("=== New release switched in. ===")
+    return count
+
+def _create_tables(engine):
+    """Create the tables of the database, without their indexes."""
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            connection.execute(CreateTable(table))
+    return None
+
+def _create_indexes(engine):
+    """Create the indexes of every table of the database."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine)
+    return None
+
+def _check_database(engine, count):
+    """Check a newly loaded database, raising a RebuildError on failure."""
+    from paf_tools.database.tables import Address
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT count(*) FROM {}".format(
+            Address.__tablename__
+            ))).scalar()
+        integrity = connection.execute(text("PRAGMA integrity_check")
+                                       ).scalar()
+    if not count or rows != count:
+        raise RebuildError("Expected {:,d} addresses, found {:,d}.".format(
+            count, rows))
+    if integrity != 'ok':
+        raise RebuildError("Integrity check failed: {}".format(integrity))
+    return None
+
+def _remove_database_file(path):
+    """Remove a database file and its journal, if present."""
+    for filename in (path, path + '-journal', path + '-wal', path + '-shm'):
+        if os.path.exists(filename):
+            os.remove(filename)
+    return None
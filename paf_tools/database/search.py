@@ -0,0 +1,141 @@
+"""Search module.
+
+Provides a full-text search index over the flattened address data, using
+the FTS5 extension built into SQLite. This allows free-text queries such as
+"10 downing st london" to be answered entirely within the existing database.
+
+The index is a contentless FTS5 table whose rowids are the ids of the
+matching rows in the addresses table, so the text itself is only stored
+once.
+
+"""
+import re
+from sqlalchemy import text
+from paf_tools import database
+from paf_tools.database.tables import Address
+
+SEARCH_TABLE = "addresses_search"
+#Map the columns of the search table to the SQL terms used to populate each
+#from the addresses table, which are joined by spaces. Postcodes are indexed
+#both with and without their space, so that "OX4 1AA" and "OX41AA" each
+#match.
+SEARCH_COLUMNS = [
+        ('organisation', ["organisation", "department"]),
+        ('sub_building_name', ["sub_building_name"]),
+        ('building_name', ["building_name"]),
+        ('building_number', ["building_number"]),
+        ('dependent_thoroughfare', ["dependent_thoroughfare"]),
+        ('thoroughfare', ["thoroughfare"]),
+        ('double_dependent_locality', ["double_dependent_locality"]),
+        ('dependent_locality', ["dependent_locality"]),
+        ('town', ["town"]),
+        ('postcode', ["postcode", "replace(postcode, ' ', '')"]),
+        ]
+
+def create_search_index(session):
+    """Create the (empty) search table, replacing any existing table."""
+    drop_search_index(session)
+    session.execute(text(
+        "CREATE VIRTUAL TABLE {} USING fts5({}, content='', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')".format(
+            SEARCH_TABLE,
+            ', '.join(name for name, _ in SEARCH_COLUMNS)
+            )
+        ))
+    return None
+
+def drop_search_index(session):
+    """Drop the search table, if present."""
+    session.execute(text("DROP TABLE IF EXISTS {}".format(SEARCH_TABLE)))
+    return None
+
+def has_search_index(session):
+    """Return True if the search table is present."""
+    return session.execute(
+        text("SELECT count(*) FROM sqlite_master WHERE name = :name"),
+        {'name': SEARCH_TABLE}
+        ).scalar() > 0
+
+def index_addresses(session, after_id=0):
+    """Add addresses to the search table.
+
+    Indexes every address whose id is greater than after_id, allowing the
+    index to be built incrementally in step with the bulk insert of the
+    addresses themselves.
+
+    Returns the highest address id now indexed.
+
+    Keyword arguments:
+    session - the session in which the addresses were inserted
+    after_id - the highest id already present in the index (defaults to 0)
+
+    """
+    session.execute(
+        text("INSERT INTO {}(rowid, {}) SELECT id, {} FROM {} "
+             "WHERE id > :after_id".format(
+                 SEARCH_TABLE,
+                 ', '.join(name for name, _ in SEARCH_COLUMNS),
+                 ', '.join(_column_sql(terms)
+                           for _, terms in SEARCH_COLUMNS),
+                 Address.__tablename__,
+                 )),
+        {'after_id': after_id}
+        )
+    max_id = session.execute(
+        text("SELECT max(id) FROM {}".format(Address.__tablename__))
+        ).scalar()
+    return max_id or after_id
+
+def search_addresses(query, limit=10, session=None):
+    """Search the address data for free text.
+
+    Every word in the query must match, with the final word treated as a
+    prefix so that partially typed queries still return results. Matches
+    are ranked using the BM25 algorithm built into FTS5.
+
+    Returns a list of Address instances, best match first.
+
+    Keyword arguments:
+    query - the free text to search for
+    limit - the maximum number of addresses to return (defaults to 10)
+    session - the database session to use (defaults to a new session)
+
+    """
+    match = _build_match_expression(query)
+    if not match:
+        return []
+    session = session or database.Session()
+    statement = text(
+            "SELECT {addresses}.* FROM {search} "
+            "JOIN {addresses} ON {addresses}.id = {search}.rowid "
+            "WHERE {search} MATCH :match ORDER BY rank LIMIT :limit".format(
+                addresses=Address.__tablename__,
+                search=SEARCH_TABLE,
+                ))
+    return session.query(Address).from_statement(statement).params(
+            match=match,
+            limit=limit,
+            ).all()
+
+def _column_sql(terms):
+    """Return the SQL joining the terms of a search column by spaces.
+
+    Each term is coalesced separately, so that a NULL term (e.g. a missing
+    department) does not make the whole column NULL.
+
+    """
+    return " || ' ' || ".join("coalesce({}, '')".format(term)
+                              for term in terms)
+
+def _build_match_expression(query):
+    """Build an FTS5 MATCH expression from a free-text query.
+
+    Each word is quoted to stop it being interpreted as FTS5 syntax, and the
+    final word is made a prefix query.
+
+    """
+    words = re.findall(r"\w+", query)
+    terms = ['"{}"'.format(word) for word in words]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
@@ -0,0 +1,584 @@
+"""Sharding module.
+
+Provides a sharded build of the database, in which the addresses of each
+postcode area (e.g. OX or SW) are written to a SQLite file of their own.
+
+SQLite allows only one writer to a database file at a time, so a build into
+a single file is limited to a single core however fast the inserts are.
+The sharded build instead divides the postcode areas between a number of
+worker processes, each of which flattens and writes the addresses of its own
+areas, so that no two processes ever write to the same file. The build
+runs as follows:-
+
+    * the component tables are loaded once, in the parent process, while
+      the parent counts the addresses of each area in the Address Files;
+    * the areas are divided between the workers by those counts, largest
+      first, so that each worker has a similar number of addresses;
+    * each worker reads the Address Files, skipping the lines of other
+      areas before they are parsed, and flattens the addresses of its own
+      areas (the workers are forked where possible, so that they share the
+      parent's component tables rather than loading their own); and
+    * the addresses are inserted with executemany, bypassing the ORM, in
+      batches which are flushed whenever the rows buffered by a worker reach
+      its share of ROW_BUDGET, however many areas they are spread across.
+
+Once loaded, each shard is checked and indexed in the same way as a rebuild
+(see the rebuild module).
+
+Where a memory limit is given, the component tables are not held in memory
+at all, and the release is instead flattened by ExternalPAFData and written
+in this process. (Worker processes may not be requested along with a
+memory limit.)
+
+Each address is stored with the id it would be given by
+populate_address_data - its position in the order in which the release is
+read - rather than an id local to its shard.
+
+The shards are written to a folder, along with a manifest (manifest.json)
+listing the file and number of addresses of each area. The ShardRouter
+class reads the manifest and directs postcode lookups to the right shard.
+
+Where a single database file is wanted, merge_shards copies the shards into
+one file using ATTACH, which is much faster than loading the release again
+as the data is copied between files by SQLite itself. As the ids are kept,
+the merged database holds the addresses with the same ids, and in the same
+order, as a database loaded by populate_address_data.
+
+"""
+import os
+import json
+import heapq
+import queue
+import multiprocessing
+from operator import itemgetter
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from paf_tools import database
+from paf_tools.database import streets
+from paf_tools.database.tables import Address
+from paf_tools.database.rebuild import (BUILD_SUFFIX, RebuildError,
+                                        _create_tables, _create_indexes,
+                                        _check_database, _remove_database_file)
+from paf_tools.formatting import format_label
+from paf_tools.populate.archive import open_paf_file_binary
+from paf_tools.postcode import to_key, to_area
+from paf_tools.structure import ADDRESS_COMPONENTS
+
+#Define the name of the manifest written to the shard folder.
+MANIFEST_FILENAME = "manifest.json"
+#Define the version of the manifest format. (Shards of version 1 held ids
+#local to each shard, which may not be merged.)
+MANIFEST_VERSION = 2
+#Define the number of addresses buffered across all workers before insert.
+ROW_BUDGET = 100000
+#Define the width of the postcode field of the Address Files.
+POSTCODE_WIDTH = ADDRESS_COMPONENTS[0]
+#Define the name of the shard holding addresses with no valid postcode area.
+UNKNOWN_AREA = "_"
+#Define the field of the flattened addresses stored in each address column.
+COLUMN_FIELDS = {
+        'postcode': 'postcode',
+        'address_key': 'address key',
+        'organisation_key': 'organisation key',
+        'postcode_type': 'postcode type',
+        'delivery_point_suffix': 'delivery point suffix',
+        'building_number': 'building number',
+        'concatenation_indicator': 'concatenation indicator',
+        'po_box_num': 'po box',
+        'town': 'post town',
+        'dependent_locality': 'dependent locality',
+        'double_dependent_locality': 'double dependent locality',
+        'building_name': 'building name',
+        'organisation': 'organisation name',
+        'department': 'department name',
+        'sub_building_name': 'sub-building name',
+        'thoroughfare': 'thoroughfare',
+        'dependent_thoroughfare': 'dependent thoroughfare',
+        'label': 'label',
+        'locality_key': 'locality key',
+        'thoroughfare_key': 'thoroughfare key',
+        'thoroughfare_descriptor_key': 'thoroughfare descriptor key',
+        'dependent_thoroughfare_key': 'dependent thoroughfare key',
+        'dependent_thoroughfare_descriptor_key':
+            'dependent thoroughfare descriptor key',
+        }
+
+#The release data shared with forked workers, by the path of the release.
+_shared_data = {}
+
+def build_shards(paf_path, shard_path, workers=None, memory_limit=None,
+                 labels=False):
+    """Build a database shard for each postcode area, in parallel.
+
+    Any existing shards in the folder are replaced. Returns the total number
+    of addresses loaded.
+
+    Keyword arguments:
+    paf_path - the full path to the folder containing PAF data
+    shard_path - the folder in which to write the shards and manifest
+    workers - the number of processes flattening and writing shards
+              (defaults to the number of CPUs, and 0 writes the shards in
+              this process)
+    memory_limit - if given, the approximate amount of memory (in bytes) to
+                   use in flattening the data (see populate_address_data),
+                   in which case the shards are written in this process,
+                   and a ValueError is raised if workers are also given
+    labels - boolean confirming whether the formatted label of each address
+             is to be stored (defaults to False)
+
+    """
+    from paf_tools.populate.data_store import PAFData
+    from paf_tools.populate.external import ExternalPAFData
+    if memory_limit and workers:
+        raise ValueError("Error! Workers may not be given with a memory "
+                         "limit, as the shards are then written in this "
+                         "process.")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(shard_path, exist_ok=True)
+    _remove_shards(shard_path)
+    print("=== Building shards... ===")
+    if memory_limit:
+        writer = _ShardWriter(shard_path, labels, ROW_BUDGET)
+        addresses = ExternalPAFData(paf_path, memory_limit)
+        for address_id, address in enumerate(addresses, 1):
+            writer.add(address_id, shard_area(address['postcode']), address)
+        counts = writer.finish()
+    else:
+        data = PAFData(paf_path, binary=True)
+        if workers:
+            counts = _write_in_workers(data, shard_path, workers, labels)
+        else:
+            writer = _ShardWriter(shard_path, labels, ROW_BUDGET)
+            for address_id, area, address in _area_addresses(data):
+                writer.add(address_id, area, address)
+            counts = writer.finish()
+    _write_manifest(shard_path, counts)
+    total = sum(counts.values())
+    print("{:,d} total records added to {:,d} shards.".format(total,
+                                                             len(counts)))
+    return total
+
+def merge_shards(shard_path, database_path=None, search_index=False):
+    """Merge the shards of a sharded build into a single database file.
+
+    The database is built in a side file and switched in once indexed, as
+    by rebuild_database. The addresses keep their ids, so are held in the
+    order in which the release was read, whatever the order of the areas.
+    Returns the number of addresses merged.
+
+    Keyword arguments:
+    shard_path - the folder containing the shards and manifest
+    database_path - the path to the database file (defaults to the
+                    configured database)
+    search_index - boolean confirming whether the full-text search index is
+                   to be built (defaults to False)
+
+    """
+    from paf_tools.database import search
+    database_path = database_path or database.DATABASE_PATH
+    build_path = database_path + BUILD_SUFFIX
+    manifest = read_manifest(shard_path)
+    columns = ', '.join(column.name for column in Address.__table__.columns)
+    _remove_database_file(build_path)
+    engine = database.create_file_engine(build_path)
+    try:
+        _create_tables(engine)
+        with engine.connect() as connection:
+            for area, shard in sorted(manifest['shards'].items()):
+                print("Merging {} shard...".format(area))
+                #ATTACH may not be used within a transaction, so the insert
+                #is committed before the shard is detached.
+                connection.exec_driver_sql(
+                        "ATTACH DATABASE ? AS shard",
+                        (os.path.join(shard_path, shard['file']),)
+                        )
+                connection.execute(text(
+                    "INSERT INTO {table} ({columns}) SELECT {columns} "
+                    "FROM shard.{table} ORDER BY id".format(
+                        table=Address.__tablename__, columns=columns)
+                    ))
+                connection.commit()
+                connection.exec_driver_sql("DETACH DATABASE shard")
+        count = sum(shard['addresses'] for shard in
+                    manifest['shards'].values())
+        _check_database(engine, count)
+        session = Session(bind=engine)
+        streets.build_street_table(session)
+        if search_index:
+            search.create_search_index(session)
+            search.index_addresses(session)
+        session.commit()
+        session.close()
+        print("=== Building indexes... ===")
+        _create_indexes(engine)
+        with engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+    except BaseException:
+        engine.dispose()
+        _remove_database_file(build_path)
+        raise
+    engine.dispose()
+    os.replace(build_path, database_path)
+    print("=== Shards merged. ===")
+    return count
+
+def read_manifest(shard_path):
+    """Read the manifest of a shard folder.
+
+    Raises a RebuildError if the manifest is missing or of another version.
+
+    """
+    try:
+        with open(os.path.join(shard_path, MANIFEST_FILENAME)) as manifest:
+            manifest = json.load(manifest)
+    except (OSError, ValueError) as error:
+        raise RebuildError("Error! Unable to read shard manifest: {}"
+                           .format(error))
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise RebuildError("Error! Unsupported shard manifest version.")
+    return manifest
+
+def shard_area(postcode):
+    """Return the area of the shard holding a postcode (in key form)."""
+    return to_area(postcode or '') or UNKNOWN_AREA
+
+def _count_areas(reader):
+    """Count the addresses of each postcode area in the Address Files."""
+    counts = {}
+    for area, line in _line_areas(reader):
+        #Only lines with no valid postcode may be headers or footers.
+        if area == UNKNOWN_AREA and not reader.is_record(line):
+            continue
+        counts[area] = counts.get(area, 0) + 1
+    return counts
+
+def _assign_areas(counts, workers):
+    """Divide the postcode areas between a number of workers.
+
+    Each area is assigned in turn, largest first, to the worker with the
+    fewest addresses so far. Returns a list of the set of areas of each
+    worker, leaving out any worker with no areas.
+
+    """
+    loads = [(0, worker) for worker in range(workers)]
+    assignments = [set() for _ in range(workers)]
+    for area, count in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
+        load, worker = heapq.heappop(loads)
+        assignments[worker].add(area)
+        heapq.heappush(loads, (load + count, worker))
+    return [areas for areas in assignments if areas]
+
+def _line_areas(reader):
+    """Read the raw lines of the Address Files, with the area of each.
+
+    Generator function which yields a tuple of (area, line) for every line
+    of the files, including any headers and footers. As the files are
+    sorted by postcode, the area is only found once for each run of lines
+    with the same postcode, so that lines may be filtered by area far more
+    cheaply than they are parsed.
+
+    """
+    last_postcode = area = None
+    for filename in reader.filelist:
+        with open_paf_file_binary(filename) as paf_file:
+            for line in paf_file:
+                postcode = line[:POSTCODE_WIDTH]
+                if postcode != last_postcode:
+                    last_postcode = postcode
+                    area = shard_area(postcode.decode('ascii', 'replace'))
+                yield area, line
+
+def _area_addresses(data, areas=None):
+    """Flatten the addresses of a set of postcode areas.
+
+    Generator function which yields a tuple of (id, area, address) for each
+    address of the areas given (or of every area, if areas is None), in the
+    order of the Address Files, where id is the position of the address in
+    that order. Lines of other areas are skipped unparsed.
+
+    Keyword arguments:
+    data - a PAFData instance, parsing in binary mode
+    areas - the set of areas to flatten (defaults to None)
+
+    """
+    reader = data.paf_readers['ADDRESS']
+    #Wait for the component tables (which forked workers already have).
+    data.paf_data
+    address_id = 0
+    for area, line in _line_areas(reader):
+        if area == UNKNOWN_AREA and not reader.is_record(line):
+            continue
+        address_id += 1
+        if areas is not None and area not in areas:
+            continue
+        raw_entry = reader._parse_binary_line(line)
+        yield address_id, area, data._flatten_address_entry(raw_entry)
+
+def _write_in_workers(data, shard_path, workers, labels):
+    """Flatten and write the shards of each area in worker processes.
+
+    The areas are counted and divided between the workers while the
+    component tables load. Where processes may be forked, the workers share
+    the component tables of data, and otherwise each loads its own.
+
+    Returns a dictionary of the number of addresses written, by area.
+
+    """
+    if workers > 1:
+        counts = _count_areas(data.paf_readers['ADDRESS'])
+        assignments = _assign_areas(counts, workers)
+    else:
+        assignments = [None]
+    if not assignments:
+        return {}
+    #Wait for the component tables, so that forked workers share them.
+    data.paf_data
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    #Each worker buffers its share of the rows, wherever they are in flight.
+    row_budget = max(ROW_BUDGET // len(assignments), 1)
+    results = context.Queue()
+    processes = [context.Process(target=_shard_worker,
+                                 args=(data.path, shard_path, labels, areas,
+                                       row_budget, results))
+                 for areas in assignments]
+    counts = {}
+    _shared_data[data.path] = data
+    try:
+        for process in processes:
+            process.start()
+        _shared_data.pop(data.path)
+        for process in processes:
+            worker_counts = _get(processes, results)
+            if isinstance(worker_counts, BaseException):
+                raise worker_counts
+            counts.update(worker_counts)
+    finally:
+        _shared_data.pop(data.path, None)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            if process.pid is not None:
+                process.join()
+    return counts
+
+def _get(processes, results):
+    """Get a result from the workers, checking they are still alive."""
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            for process in processes:
+                if not process.is_alive() and process.exitcode:
+                    raise RebuildError("Error! Shard worker exited with code "
+                                       "{}.".format(process.exitcode))
+
+def _shard_worker(paf_path, shard_path, labels, areas, row_budget,
+                  results):
+    """Flatten and write the shards of a set of postcode areas.
+
+    Run in a worker process. Puts a dictionary of the number of addresses
+    written by area on the results queue, or the exception raised if the
+    shards could not be written.
+
+    """
+    from paf_tools.populate.data_store import PAFData
+    writer = _ShardWriter(shard_path, labels, row_budget)
+    try:
+        data = _shared_data.get(paf_path)
+        if data is None:
+            data = PAFData(paf_path, binary=True, workers=0)
+        for address_id, area, address in _area_addresses(data, areas):
+            writer.add(address_id, area, address)
+        results.put(writer.finish())
+    except Exception as error:
+        writer.close()
+        results.put(RebuildError("Error! Unable to write shards: {!r}"
+                                 .format(error)))
+    return None
+
+def _write_manifest(shard_path, counts):
+    """Write the manifest of a shard folder."""
+    manifest = {
+            'version': MANIFEST_VERSION,
+            'shards': {area: {'file': _shard_filename(area),
+                              'addresses': count}
+                       for area, count in sorted(counts.items())},
+            }
+    with open(os.path.join(shard_path, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return None
+
+def _remove_shards(shard_path):
+    """Remove the manifest and shards of a previous build, if present."""
+    try:
+        manifest = read_manifest(shard_path)
+    except RebuildError:
+        return None
+    os.remove(os.path.join(shard_path, MANIFEST_FILENAME))
+    for shard in manifest['shards'].values():
+        _remove_database_file(os.path.join(shard_path, shard['file']))
+    return None
+
+def _shard_filename(area):
+    """Return the filename of the shard for an area."""
+    return "{}.db".format(area)
+
+
+class _ShardWriter(object):
+    """Writes flattened addresses to the shard of their area.
+
+    Addresses are buffered by area, and the buffers of every area are
+    inserted once row_budget addresses are waiting in total.
+
+    """
+
+    def __init__(self, shard_path, labels=False, row_budget=ROW_BUDGET):
+        self.shard_path = shard_path
+        self.labels = labels
+        self.row_budget = row_budget
+        self.engines = {}
+        self.counts = {}
+        self.pending = {}
+        self.buffered = 0
+        self._columns = list(COLUMN_FIELDS)
+        self._fields = itemgetter(*COLUMN_FIELDS.values())
+
+    def add(self, address_id, area, address):
+        """Buffer an address, with its id, for the shard of an area."""
+        address['label'] = format_label(address) if self.labels else None
+        rows = self.pending.get(area)
+        if rows is None:
+            rows = self.pending[area] = []
+        row = dict(zip(self._columns, self._fields(address)))
+        row['id'] = address_id
+        rows.append(row)
+        self.buffered += 1
+        if self.buffered >= self.row_budget:
+            self.flush()
+        return None
+
+    def flush(self):
+        """Insert the buffered addresses of every area."""
+        insert = Address.__table__.insert()
+        for area, rows in self.pending.items():
+            with self._engine(area).begin() as connection:
+                connection.execute(insert, rows)
+            self.counts[area] += len(rows)
+        self.pending = {}
+        self.buffered = 0
+        return None
+
+    def finish(self):
+        """Check and index every shard written, returning the counts."""
+        self.flush()
+        for area, engine in self.engines.items():
+            _check_database(engine, self.counts[area])
+            session = Session(bind=engine)
+            streets.build_street_table(session)
+            session.commit()
+            session.close()
+            _create_indexes(engine)
+            with engine.begin() as connection:
+                connection.execute(text("ANALYZE"))
+        self.close()
+        return self.counts
+
+    def close(self):
+        """Close the engine of every shard written."""
+        for engine in self.engines.values():
+            engine.dispose()
+        return None
+
+    def _engine(self, area):
+        """Return the engine of an area's shard, creating the shard if new."""
+        engine = self.engines.get(area)
+        if engine is None:
+            path = os.path.join(self.shard_path, _shard_filename(area))
+            _remove_database_file(path)
+            engine = self.engines[area] = database.create_file_engine(path)
+            _create_tables(engine)
+            self.counts[area] = 0
+        return engine
+
+
+class ShardRouter(object):
+    """This class defines the ShardRouter class.
+
+    The ShardRouter directs lookups to the shard holding the postcode area,
+    creating an engine for each shard as it is first used.
+
+    """
+    def __init__(self, shard_path):
+        """Initialise ShardRouter instance.
+
+        Keyword arguments:
+        shard_path - the folder containing the shards and manifest
+
+        """
+        self.shard_path = shard_path
+        self.shards = read_manifest(shard_path)['shards']
+        self._engines = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def areas(self):
+        """Return the postcode areas held, in order."""
+        return sorted(self.shards)
+
+    def engine(self, postcode):
+        """Return the engine of the shard holding a postcode.
+
+        Returns None if the postcode is not valid, or its area has no shard.
+
+        Keyword arguments:
+        postcode - the postcode, in any form accepted by postcode.to_key
+
+        """
+        area = to_area(postcode)
+        if area not in self.shards:
+            return None
+        engine = self._engines.get(area)
+        if engine is None:
+            path = os.path.join(self.shard_path, self.shards[area]['file'])
+            engine = self._engines[area] = database.create_file_engine(path)
+        return engine
+
+    def session(self, postcode):
+        """Return a new session on the shard holding a postcode, or None."""
+        engine = self.engine(postcode)
+        if engine is None:
+            return None
+        return Session(bind=engine)
+
+    def find_postcode(self, postcode):
+        """Find the addresses within a postcode.
+
+        Returns a list of Address instances, in the order loaded, which is
+        empty if the postcode is not valid or not present.
+
+        """
+        session = self.session(postcode)
+        if session is None:
+            return []
+        with session:
+            addresses = session.query(Address).filter(
+                    Address.postcode == to_key(postcode)
+                    ).order_by(Address.id).all()
+            session.expunge_all()
+        return addresses
+
+    def close(self):
+        """Close the engine of every shard used."""
+        for engine in self._engines.values():
+            engine.dispose()
+        self._engines = {}
+        return None
@@ -0,0 +1,116 @@
+"""Streets module.
+
+Provides functions for finding every address on a street, which may span
+many postcodes (e.g. every delivery point on Cowley Road, Oxford).
+
+A street is identified by the keys of its thoroughfare, dependent
+thoroughfare (and their descriptors) and locality, as held in the Address
+File, which are stored alongside each address. The addresses table has a
+composite index on these keys and the building number, so the addresses of
+a street - or of a range of building numbers on it - are read directly
+from the index rather than by scanning the table.
+
+Streets are found by name through the streets table, a summary of each
+distinct street in the addresses table which is built once the addresses
+are loaded (see build_street_table).
+
+"""
+from sqlalchemy import text, or_
+from paf_tools import database
+from paf_tools.database.tables import Address, Street
+
+#Define the columns identifying a street, shared by both tables.
+STREET_KEYS = [
+        'thoroughfare_key', 'thoroughfare_descriptor_key',
+        'dependent_thoroughfare_key', 'dependent_thoroughfare_descriptor_key',
+        'locality_key',
+        ]
+#Define the columns of the streets table taken from the addresses table.
+STREET_NAMES = [
+        'thoroughfare', 'dependent_thoroughfare', 'double_dependent_locality',
+        'dependent_locality', 'town',
+        ]
+
+def build_street_table(session):
+    """Build the streets table from the addresses table.
+
+    Replaces any existing content of the streets table. Addresses without a
+    thoroughfare (e.g. those with only a PO box) are not part of a street.
+    Returns the number of streets.
+
+    Keyword arguments:
+    session - the session in which the addresses were inserted
+
+    """
+    session.execute(text("DELETE FROM {}".format(Street.__tablename__)))
+    session.execute(text(
+        "INSERT INTO {streets} ({keys}, {names}, delivery_points) "
+        "SELECT {keys}, {aggregates}, count(*) FROM {addresses} "
+        "WHERE thoroughfare_key > 0 OR dependent_thoroughfare_key > 0 "
+        "GROUP BY {keys}".format(
+            streets=Street.__tablename__,
+            addresses=Address.__tablename__,
+            keys=', '.join(STREET_KEYS),
+            names=', '.join(STREET_NAMES),
+            aggregates=', '.join("max({})".format(x) for x in STREET_NAMES),
+            )
+        ))
+    return session.query(Street).count()
+
+def find_streets(name, town=None, session=None):
+    """Find the streets with a name.
+
+    The name is matched against both the thoroughfare and the dependent
+    thoroughfare of each street, ignoring case and spacing. Where no town
+    is given, the name may end with the post town after a comma (e.g.
+    "Cowley Road, Oxford").
+
+    Returns a list of Street instances, largest first.
+
+    Keyword arguments:
+    name - the name of the street (e.g. "Cowley Road")
+    town - the post town of the street (optional; if given, the name is
+           matched as it stands)
+    session - the database session to use (defaults to a new session)
+
+    """
+    session = session or database.Session()
+    if town is None and ',' in name:
+        name, town = name.rsplit(',', 1)
+    name = ' '.join(name.split()).title()
+    query = session.query(Street).filter(or_(
+            Street.thoroughfare == name,
+            Street.dependent_thoroughfare == name,
+            ))
+    if town is not None:
+        query = query.filter(Street.town == ' '.join(town.split()).title())
+    return query.order_by(Street.delivery_points.desc(), Street.id).all()
+
+def find_street_addresses(street, min_number=None, max_number=None,
+                          session=None):
+    """Find the addresses on a street.
+
+    Addresses are returned in building number order (with those without a
+    number first), and then by building and sub-building name.
+
+    Returns a list of Address instances.
+
+    Keyword arguments:
+    street - the street, as a Street instance or any other object with the
+             attributes of STREET_KEYS (e.g. an Address on the street)
+    min_number - the lowest building number to return (optional)
+    max_number - the highest building number to return (optional)
+    session - the database session to use (defaults to a new session)
+
+    """
+    session = session or database.Session()
+    query = session.query(Address).filter(*[
+            getattr(Address, key) == getattr(street, key)
+            for key in STREET_KEYS
+            ])
+    if min_number is not None:
+        query = query.filter(Address.building_number >= min_number)
+    if max_number is not None:
+        query = query.filter(Address.building_number <= max_number)
+    return query.order_by(Address.building_number, Address.building_name,
+                          Address.sub_building_name, Address.id).all()
@@ -3,9 +3,9 @@
 Defines the SQLAlchemy tables as declarative_base classes. 
 
 """
-from sqlalchemy import Column, Integer, String, Sequence, Boolean
+from sqlalchemy import Column, Integer, String, Sequence, Boolean, Index
 from paf_tools.database import Base
-from paf_tools.database.operations import format_address
+from paf_tools.formatting import format_address, address_elements
 
 class Address(Base):
     __tablename__ = "addresses"
@@ -16,14 +16,35 @@ class Address(Base):
     building_number = Column(Integer)
     dependent_thoroughfare = Column(String(80))
     thoroughfare = Column(String(80))
-    postcode = Column(String(7))
+    postcode = Column(String(7), index=True)
     double_dependent_locality = Column(String(35))
     dependent_locality = Column(String(35))
     town = Column(String(30))
     department = Column(String(60))
-    organisation = Column(String(60))
+    organisation = Column(String(60), index=True)
     concatenation_indicator = Column(Boolean)
     po_box_num = Column(String(6))
+    address_key = Column(Integer, index=True)
+    organisation_key = Column(Integer)
+    postcode_type = Column(String(1))
+    delivery_point_suffix = Column(String(2))
+    #The formatted label, if computed when the database was built.
+    label = Column(String(400))
+    #The keys of the locality and thoroughfares, from the Address File.
+    locality_key = Column(Integer)
+    thoroughfare_key = Column(Integer)
+    thoroughfare_descriptor_key = Column(Integer)
+    dependent_thoroughfare_key = Column(Integer)
+    dependent_thoroughfare_descriptor_key = Column(Integer)
+
+    #Index the addresses of each street in building number order, so that 
+    #a street (and a range of numbers on it) is found without a table scan.
+    __table_args__ = (
+            Index('ix_addresses_street', 'thoroughfare_key', 
+                  'thoroughfare_descriptor_key', 'dependent_thoroughfare_key',
+                  'dependent_thoroughfare_descriptor_key', 'locality_key',
+                  'building_number'),
+            )
 
     def __init__(self, **address):
         """Initialise AddressFlat class.
@@ -45,39 +66,88 @@ class Address(Base):
         self.organisation = address.get('organisation name', '')
         self.concatenation_indicator = address.get('concatenation indicator', False)
         self.po_box_num = address.get('po box', '')
+        self.address_key = address.get('address key')
+        self.organisation_key = address.get('organisation key')
+        self.postcode_type = address.get('postcode type')
+        self.delivery_point_suffix = address.get('delivery point suffix')
+        self.label = address.get('label')
+        self.locality_key = address.get('locality key')
+        self.thoroughfare_key = address.get('thoroughfare key')
+        self.thoroughfare_descriptor_key = address.get(
+                'thoroughfare descriptor key')
+        self.dependent_thoroughfare_key = address.get(
+                'dependent thoroughfare key')
+        self.dependent_thoroughfare_descriptor_key = address.get(
+                'dependent thoroughfare descriptor key')
 
     def __repr__(self):
-        return "<Address: {}>".format(
-                format_address(**self._get_elements()).replace('\n', ', ')
-                )
+        return "<Address: {}>".format(str(self).replace('\n', ', '))
 
     def __str__(self):
-        """String representation of Address."""
-        return format_address(**self._get_elements()) 
+        """String representation of Address.
+
+        Uses the stored label where one was computed when the database was 
+        built, and otherwise formats the address.
+
+        """
+        if self.label is not None:
+            return self.label
+        return self.format_label()
+
+    def format_label(self):
+        """Format the address, ignoring any stored label."""
+        return format_address(**self._get_elements())
 
     def _get_elements(self):
         """Get address elements for string representation."""
-        address_elements = {
-                'organisation': "{}{}".format(
-                                self.organisation if self.organisation else "",
-                                '\n' + self.department if self.department else "",
-                                ),
-                'sub-building name': self.sub_building_name,
-                'building name': self.building_name,
-                'building number': self.building_number,
-                'PO box': self.po_box_num,
-                'dependent thoroughfare': self.dependent_thoroughfare,
-                'thoroughfare': self.thoroughfare,
-                'double dependent locality': self.double_dependent_locality,
-                'dependent locality': self.dependent_locality,
-                'town': self.town,
-                'postcode': "{} {}".format(
-                    self.postcode[:-3], 
-                    self.postcode[-3:]
-                    ),
-                'concatenation indicator': self.concatenation_indicator
-                }
-        return address_elements
+        return address_elements(
+                organisation=self.organisation,
+                department=self.department,
+                sub_building_name=self.sub_building_name,
+                building_name=self.building_name,
+                building_number=self.building_number,
+                po_box=self.po_box_num,
+                dependent_thoroughfare=self.dependent_thoroughfare,
+                thoroughfare=self.thoroughfare,
+                double_dependent_locality=self.double_dependent_locality,
+                dependent_locality=self.dependent_locality,
+                town=self.town,
+                postcode=self.postcode,
+                concatenation_indicator=self.concatenation_indicator,
+                )
+
+
+class Street(Base):
+    """A street, and the number of delivery points on it.
+
+    Each street is a distinct combination of thoroughfare, dependent 
+    thoroughfare and locality, summarised from the addresses table by 
+    streets.build_street_table.
+
+    """
+    __tablename__ = "streets"
+
+    id = Column(Integer, primary_key=True)
+    thoroughfare_key = Column(Integer)
+    thoroughfare_descriptor_key = Column(Integer)
+    dependent_thoroughfare_key = Column(Integer)
+    dependent_thoroughfare_descriptor_key = Column(Integer)
+    locality_key = Column(Integer)
+    thoroughfare = Column(String(80), index=True)
+    dependent_thoroughfare = Column(String(80), index=True)
+    double_dependent_locality = Column(String(35))
+    dependent_locality = Column(String(35))
+    town = Column(String(30))
+    delivery_points = Column(Integer)
+
+    def __repr__(self):
+        return "<Street: {}>".format(str(self))
+
+    def __str__(self):
+        return ', '.join(x for x in (self.dependent_thoroughfare, 
+                                     self.thoroughfare,
+                                     self.double_dependent_locality,
+                                     self.dependent_locality, self.town) if x)
 
 """
 class Address(Base):
@@ -54,7 +54,7 @@ with no whitespace between the key and value.
 
 """
 import os
-from paf_tools.structure import *
+from paf_tools import structure
 
 #Define the valid file types for parsing.
 VALID_FILETYPES = [
@@ -114,7 +114,7 @@ def filetype_data(filetype, data):
     #Check for validity of filetype and data input.
     validate_filetype(filetype)
     validate_datatype(data)
-    output_data = globals()["{}_{}".format(filetype, data)]
+    output_data = getattr(structure, "{}_{}".format(filetype, data))
     if isinstance(output_data, str):
         output_data = [output_data]
     return output_data
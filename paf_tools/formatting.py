@@ -0,0 +1,158 @@
+"""Formatting module.
+
+Contains functions for formatting addresses according to the Royal Mail's
+recommendations.
+
+These functions depend only on the flattened address data, and so may be
+used without the database package (or SQLAlchemy).
+
+Labels for many addresses may be formatted in one pass by format_labels. 
+The building components of an address are formatted through a cache, as 
+the same combinations of building names and numbers recur throughout the 
+PAF.
+
+"""
+import re
+from functools import lru_cache
+
+#Define the exception to the usual rule of a newline after a building name.
+#See p. 27 of PAF Guide for details.
+EXCEPTION_RULE = re.compile(r"^\d.*\d$|^\d.*\d[A-Za-z]$|^.$")
+#Define the pattern of a wholly numeric string.
+NUMERIC_RULE = re.compile(r"^\d*$")
+#Define the number of building component combinations cached.
+BUILDING_CACHE_SIZE = 65536
+
+def address_elements(organisation=None, department=None, 
+                     sub_building_name=None, building_name=None, 
+                     building_number=None, po_box=None, 
+                     dependent_thoroughfare=None, thoroughfare=None, 
+                     double_dependent_locality=None, dependent_locality=None, 
+                     town=None, postcode=None, concatenation_indicator=False):
+    """Get the elements of an address, as passed to format_address.
+
+    Keyword arguments:
+    postcode - the postcode, in the 7 character form held in the PAF
+    (all others) - the address components of the same names
+
+    """
+    return {
+            'organisation': "{}{}".format(
+                            organisation if organisation else "",
+                            '\n' + department if department else "",
+                            ),
+            'sub-building name': sub_building_name,
+            'building name': building_name,
+            'building number': building_number,
+            'PO box': po_box,
+            'dependent thoroughfare': dependent_thoroughfare,
+            'thoroughfare': thoroughfare,
+            'double dependent locality': double_dependent_locality,
+            'dependent locality': dependent_locality,
+            'town': town,
+            'postcode': "{} {}".format(
+                postcode[:-3], 
+                postcode[-3:]
+                ),
+            'concatenation indicator': concatenation_indicator
+            }
+
+def format_label(address):
+    """Format the label of a flattened address, as produced by PAFData.
+
+    Gives the same result as formatting the Address row created from the 
+    flattened address.
+
+    """
+    return format_address(**address_elements(
+            organisation=address.get('organisation name', ''),
+            department=address.get('department name', ''),
+            sub_building_name=address.get('sub-building name', ''),
+            building_name=address.get('building name', ''),
+            building_number=address.get('building number', ''),
+            po_box=address.get('po box', ''),
+            dependent_thoroughfare=address.get('dependent thoroughfare', ''),
+            thoroughfare=address.get('thoroughfare', ''),
+            double_dependent_locality=address.get('double dependent locality', 
+                                                  ''),
+            dependent_locality=address.get('dependent locality', ''),
+            town=address.get('post town', ''),
+            postcode=address.get('postcode', ''),
+            concatenation_indicator=address.get('concatenation indicator', 
+                                                False),
+            ))
+
+def format_labels(addresses):
+    """Add a formatted label to each of a series of flattened addresses.
+
+    Generator function which yields each address with its label added 
+    under the 'label' key.
+
+    """
+    for address in addresses:
+        address['label'] = format_label(address)
+        yield address
+
+def format_address(**args):
+    """Properly format an address according to the Royal Mail's recommendations.
+
+    The rules are convoluted but explained from page 27 of the Programmers' 
+    Guide to the PAF: http://www.royalmail.com/sites/default/files/docs/pdf/programmers_guide_edition_7_v5.pdf
+        
+    """
+    #Begin with the organisation and PO Box number, if applicable.
+    address = ''.join([args[entry] + '\n' 
+                       for entry in ['organisation', 'PO box']
+                       if args.get(entry)])
+    #Format building name/number components.
+    address += format_building_components(*[args.get(x) for x in 
+                                            ['sub-building name', 
+                                             'building name', 
+                                             'building number',
+                                             'concatenation indicator']])
+   #Add thoroughfare (if present), locality/town and postcode.
+    address += ''.join([args[entry] + '\n' 
+                        for entry in ['dependent thoroughfare', 
+                                      'thoroughfare',
+                                      'double dependent locality',
+                                      'dependent locality',
+                                      'town',
+                                      'postcode']
+                        if args.get(entry)])
+    return address.strip()
+
+@lru_cache(BUILDING_CACHE_SIZE)
+def format_building_components(sub_building_name=None, 
+                               building_name=None, 
+                               building_number=None,
+                               concatenation_indicator=False):
+    """Properly format building name/number components.
+
+    Follows the rules laid down in the Royal Mail's Programmers' Guide.
+
+    """
+    #Check if sub- and building name and building number
+    if not (sub_building_name or building_name or building_number):
+        return ""
+    #Check if concatenation indicator is True. If so, simply concat and return.
+    if concatenation_indicator:
+        return str(building_number or '') + sub_building_name + ' '
+    return_str = ""
+    for x in (sub_building_name, building_name):
+        if x:
+            #If the entry is filled, check for exception
+            if EXCEPTION_RULE.match(x):
+                return_str += x + ', ' if x.isalpha() else x + ' '
+            else:
+                #Check if final portion of string is numeric/alphanumeric.
+                #If so, split and apply exception to that section only.
+                final_portion = x.split(' ')[-1]
+                if (EXCEPTION_RULE.match(final_portion) and not
+                    building_number and not
+                    NUMERIC_RULE.match(final_portion)):
+                    x = ' '.join(x.split(' ')[:-1])
+                    return_str += x + '\n' + final_portion + ' '
+                else:
+                    return_str += x + '\n'
+    return_str += str(building_number) + ' ' if building_number else ''
+    return return_str
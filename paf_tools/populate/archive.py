@@ -0,0 +1,198 @@
+"""Archive module.
+
+Contains tools for reading PAF component files directly from the
+compressed archives in which they are delivered, without first extracting
+them to disk.
+
+The PAF component files are named by their full path, as though they had
+been extracted into the folder given to the PAFReader. Each file is then
+resolved as follows:-
+
+    * if the file exists, it is read directly (or decompressed, if its name
+      ends in .gz);
+    * if the folder is in fact a zip archive, the file is read from the
+      archive member with a matching name, in any subfolder of the archive;
+    * otherwise the folder is searched for a gzip or zip compressed copy of
+      the file (e.g. fpmainfl.c02.gz), and then for a zip archive
+      containing it.
+
+Filenames are matched without regard to case, as deliveries commonly use
+upper case filenames.
+
+Decompression takes place in a background thread, which reads ahead in
+large chunks so that it overlaps with the parsing of the data. (The zlib
+module releases the GIL while decompressing, so a thread is sufficient.)
+
+The gzip and zipfile modules are only imported when a compressed file is 
+opened, as they are slow to import relative to the time taken to parse a 
+small file.
+
+"""
+import io
+import os
+import queue
+import threading
+
+#Define the size of each read from an underlying file.
+CHUNK_SIZE = 1 << 20
+#Define the number of chunks which may be decompressed ahead of the reader.
+READ_AHEAD_CHUNKS = 8
+
+def open_paf_file(filename, encoding=None, errors='replace'):
+    """Open a PAF component file for reading as text.
+
+    Keyword arguments:
+    filename - the full path of the file, as if it had been extracted
+    encoding - the text encoding (defaults to the locale's encoding)
+    errors - the decoding error policy (defaults to 'replace')
+
+    """
+    return io.TextIOWrapper(open_paf_file_binary(filename),
+                            encoding=encoding, errors=errors)
+
+def open_paf_file_binary(filename):
+    """Open a PAF component file for reading as bytes.
+
+    Raises a FileNotFoundError if the file cannot be found either directly
+    or within an archive.
+
+    Keyword arguments:
+    filename - the full path of the file, as if it had been extracted
+
+    """
+    if os.path.isfile(filename):
+        if filename.lower().endswith('.gz'):
+            import gzip
+            return _threaded(gzip.open(filename, 'rb'))
+        return open(filename, 'rb', buffering=CHUNK_SIZE)
+    import gzip
+    import zipfile
+    folder, name = os.path.split(filename)
+    if zipfile.is_zipfile(folder):
+        stream = _open_zip_member(folder, name)
+        if stream is not None:
+            return stream
+    elif os.path.isdir(folder):
+        entries = {entry.lower(): os.path.join(folder, entry)
+                   for entry in os.listdir(folder)}
+        if name.lower() in entries:
+            return open_paf_file_binary(entries[name.lower()])
+        if name.lower() + '.gz' in entries:
+            return _threaded(gzip.open(entries[name.lower() + '.gz'], 'rb'))
+        archives = sorted(path for entry, path in entries.items()
+                          if entry.endswith('.zip'))
+        #Prefer an archive named for the file, before searching the rest.
+        if name.lower() + '.zip' in entries:
+            archives.insert(0, entries[name.lower() + '.zip'])
+        for archive in archives:
+            stream = _open_zip_member(archive, name)
+            if stream is not None:
+                return stream
+    raise FileNotFoundError("PAF file {} not found.".format(filename))
+
+def _open_zip_member(archive_name, name):
+    """Open the member of a zip archive with a matching filename.
+
+    Returns None if the archive contains no such member.
+
+    """
+    import zipfile
+    archive = zipfile.ZipFile(archive_name)
+    for member in archive.namelist():
+        if os.path.basename(member.rstrip('/')).lower() == name.lower():
+            return _threaded(archive.open(member), archive)
+    archive.close()
+    return None
+
+def _threaded(stream, *resources):
+    """Wrap a decompressing stream so that it is read in a separate thread."""
+    return io.BufferedReader(ThreadedReader(stream, *resources),
+                             buffer_size=CHUNK_SIZE)
+
+
+class ThreadedReader(io.RawIOBase):
+    """This class defines the ThreadedReader class.
+
+    The ThreadedReader reads an underlying binary stream in a background
+    thread, passing chunks of data to the reading thread through a bounded
+    queue. This limits memory use while allowing the reads (and any
+    decompression they involve) to run concurrently with the consumer.
+
+    """
+    def __init__(self, stream, *resources):
+        """Initialise ThreadedReader instance.
+
+        Keyword arguments:
+        stream - the binary stream to read from
+        resources - any further objects to close along with the stream
+
+        """
+        self._stream = stream
+        self._resources = resources
+        self._chunks = queue.Queue(READ_AHEAD_CHUNKS)
+        self._current = memoryview(b'')
+        self._finished = False
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._read_ahead, daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """Read data into a pre-allocated buffer.
+
+        Returns the number of bytes read, or 0 at the end of the stream.
+
+        """
+        if not self._current:
+            if self._finished:
+                return 0
+            chunk = self._chunks.get()
+            if isinstance(chunk, Exception):
+                self._finished = True
+                raise chunk
+            if not chunk:
+                self._finished = True
+                return 0
+            self._current = memoryview(chunk)
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def close(self):
+        """Stop the background thread and close the underlying stream."""
+        if not self.closed:
+            self._stopping.set()
+            #Empty the queue, in case the thread is waiting to add to it.
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get_nowait()
+                except queue.Empty:
+                    pass
+                self._thread.join(0.01)
+            self._stream.close()
+            for resource in self._resources:
+                resource.close()
+        super().close()
+
+    def _read_ahead(self):
+        """Read chunks from the stream until it is exhausted or closed."""
+        try:
+            while not self._stopping.is_set():
+                chunk = self._stream.read(CHUNK_SIZE)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, item):
+        """Add an item to the queue, giving up if the reader is closed."""
+        while not self._stopping.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
@@ -4,9 +4,95 @@ Defines the PAFData class, which uses the PAFReader class to import data
 from the postcode address files, and then carries out required substitutions 
 to turn the "relational" data into one set of non-relational address records.
 
+The component files are independent of one another, and so are loaded 
+concurrently in a pool of worker processes. Each worker returns its table 
+in a compact form - a list of keys and a single string of joined values - 
+which is much cheaper to pass between processes than a dictionary of 
+tuples.
+
 """
-from paf_tools.structure import *
+import os
+from concurrent.futures import ProcessPoolExecutor
+from paf_tools.structure import VALID_FILETYPES
 from paf_tools.populate.files_parser import PAFReader 
+from paf_tools.populate.organisations import OrganisationIndex
+
+#Define the component data referenced by each address entry, as tuples of 
+#(name, Address File field index, filetype, default if not present).
+ADDRESS_REFERENCES = [
+        ('locality', 2, 'LOCALITY', ('','','','','')),
+        ('thoroughfare', 3, 'THOROUGHFARE', ('',)),
+        ('thoroughfare descriptor', 4, 'THOROUGHFARE_DESCRIPTOR', ('','')),
+        ('dependent thoroughfare', 5, 'THOROUGHFARE', ('',)),
+        ('dependent thoroughfare descriptor', 6, 'THOROUGHFARE_DESCRIPTOR', 
+         ('','')),
+        ('building name', 8, 'BUILDING_NAME', ('',)),
+        ('sub-building name', 9, 'SUB_BUILDING_NAME', ('',)),
+        ('organisation', 11, 'ORGANISATION', ('','')),
+        ]
+#Define the component filetypes loaded by PAFData.
+COMPONENT_FILETYPES = [x for x in VALID_FILETYPES if x != "ADDRESS"]
+#Define the component filetypes needed to flatten the address entries.
+REQUIRED_FILETYPES = sorted({x[2] for x in ADDRESS_REFERENCES})
+#Define the separators used to join component values for transfer between 
+#processes. (Neither occurs within the PAF data.)
+FIELD_SEPARATOR = '\x1f'
+RECORD_SEPARATOR = '\x1e'
+
+def flatten_address(raw_entry, components, decode):
+    """Flatten raw address data.
+
+    Combines a raw address entry with the component data it references, 
+    to give a dictionary containing key/value pairs of the datatype, and 
+    the data parsed from the PAF.
+
+    Keyword arguments:
+    raw_entry - the parsed Address File entry
+    components - a dictionary of the component data referenced by the 
+                 entry, keyed by the names in ADDRESS_REFERENCES
+    decode - a function decoding the text fields of the entry (which 
+             returns values not parsed in binary mode unchanged)
+
+    """
+    locality = components['locality']
+    thoroughfare = components['thoroughfare']
+    th_descriptor = components['thoroughfare descriptor']
+    dependent_thoroughfare = components['dependent thoroughfare']
+    dep_th_descriptor = components['dependent thoroughfare descriptor']
+    organisation = components['organisation']
+    return {
+        'postcode': decode(raw_entry[0]),
+        'address key': int(raw_entry[1]),
+        'organisation key': int(raw_entry[11]),
+        'postcode type': decode(raw_entry[12]),
+        'delivery point suffix': decode(raw_entry[14]),
+        'building number': int(raw_entry[7]) if int(raw_entry[7]) else None,
+        'concatenation indicator': raw_entry[13] in ("Y", b"Y"),
+        'po box': decode(raw_entry[16]) if raw_entry[16] else None,
+        #Component keys, identifying the street and locality
+        'locality key': int(raw_entry[2]),
+        'thoroughfare key': int(raw_entry[3]),
+        'thoroughfare descriptor key': int(raw_entry[4]),
+        'dependent thoroughfare key': int(raw_entry[5]),
+        'dependent thoroughfare descriptor key': int(raw_entry[6]),
+        #Relational Substitutions
+        'post town': locality[2].title(),
+        'dependent locality': locality[3].title(),
+        'double dependent locality': locality[4].title(),
+        'building name': components['building name'][0].title(),
+        'organisation name': organisation[0].title(),
+        'department name': organisation[1].title(),
+        'sub-building name': components['sub-building name'][0].title(),
+        'thoroughfare': '{} {}'.format(
+            thoroughfare[0],
+            th_descriptor[0],
+            ).strip().title(),
+        'dependent thoroughfare': '{} {}'.format(
+            dependent_thoroughfare[0],
+            dep_th_descriptor[0],
+            ).strip().title(),
+        }
+
 
 class PAFData(object):
     """This class defines the PAFData class.
@@ -14,13 +100,32 @@ class PAFData(object):
     This class is used to flatten and clean-up the relational data extracted 
     from the PAF component files.
 
+    The component tables are loaded in the background from the moment the 
+    instance is created. The first address entry is produced as soon as the 
+    tables it depends on are ready, without waiting for the rest (e.g. the 
+    Mailsort File, which is not needed to flatten the addresses).
+
     """
-    def __init__(self, paf_path):
-        """Initialise PAFData instance."""
+    def __init__(self, paf_path, binary=False, workers=None):
+        """Initialise PAFData instance.
+
+        Keyword arguments:
+        paf_path - the full path to the folder containing PAF data
+        binary - boolean confirming whether the PAF files are to be parsed 
+                 in binary mode (defaults to False)
+        workers - the number of processes used to load the component files 
+                  (defaults to one per file, up to the number of CPUs; if 
+                  0, or if there is only one CPU, the files are loaded one 
+                  after another in this process)
+
+        """
         self.path = paf_path
-        self.paf_readers = {filetype: PAFReader(self.path, filetype)
+        self.binary = binary
+        self.paf_readers = {filetype: PAFReader(self.path, filetype, binary)
                             for filetype in VALID_FILETYPES}
-        self._get_non_address_data()
+        self._tables = {}
+        self._pending = {}
+        self._get_non_address_data(workers)
 
     def __iter__(self):
         return self
@@ -33,10 +138,18 @@ class PAFData(object):
 
         """
         raw_entry = next(self.paf_readers['ADDRESS'])
+        if self._pending:
+            self._wait_for(REQUIRED_FILETYPES)
         flattened_entry = self._flatten_address_entry(raw_entry)
         #Define relational entries per address entry:
         return flattened_entry
 
+    @property
+    def paf_data(self):
+        """Return the component tables, waiting for any still loading."""
+        self._wait_for(COMPONENT_FILETYPES)
+        return self._tables
+
     def _flatten_address_entry(self, raw_entry):
         """Flatten raw address data.
 
@@ -44,55 +157,118 @@ class PAFData(object):
         within raw parsed file data.
 
         Returns a dictionary containing key/value pairs of the datatype, and 
-        the data parsed from the PAF.armando
+        the data parsed from the PAF.
+
+        In binary mode, the text fields of the address entry are only decoded 
+        here, as they are emitted. (The component data is decoded as it is 
+        loaded, so that each value is decoded only once.)
 
         """
-        paf = self.paf_data
-        locality = paf['LOCALITY'].get(raw_entry[2], ('','','','',''))
-        building_name = paf['BUILDING_NAME'].get(raw_entry[8], ('',))
-        sub_building_name = paf['SUB_BUILDING_NAME'].get(raw_entry[9], ('',))
-        organisation = paf['ORGANISATION'].get(raw_entry[11], ('','','',''))
-        thoroughfare = paf['THOROUGHFARE'].get(raw_entry[3], ('',))
-        th_descriptor = paf['THOROUGHFARE_DESCRIPTOR'].get(raw_entry[4], ('',''))
-        dependent_thoroughfare = paf['THOROUGHFARE'].get(raw_entry[5], ('',))
-        dep_th_descriptor = paf['THOROUGHFARE_DESCRIPTOR'].get(raw_entry[6], ('',''))
-        return {
-            'postcode': raw_entry[0],
-            'building number': int(raw_entry[7]) if int(raw_entry[7]) else None,
-            'concatenation indicator': raw_entry[13] == "Y",
-            'po box': raw_entry[16] if raw_entry[16] else None,
-            #Relational Substitutions
-            'post town': locality[2].title(),
-            'dependent locality': locality[3].title(),
-            'double dependent locality': locality[4].title(),
-            'building name': building_name[0].title(),
-            'organisation name': organisation[1].title(),
-            'department name': organisation[2].title(),
-            'sub-building name': sub_building_name[0].title(),
-            'thoroughfare': '{} {}'.format(
-                thoroughfare[0],
-                th_descriptor[0],
-                ).strip().title(),
-            'dependent thoroughfare': '{} {}'.format(
-                dependent_thoroughfare[0],
-                dep_th_descriptor[0],
-                ).strip().title(),
-            }
-
-    def _get_non_address_data(self):
+        paf = self._tables
+        components = {
+                name: paf[filetype].get(raw_entry[index], default)
+                for name, index, filetype, default in ADDRESS_REFERENCES
+                if filetype != "ORGANISATION"
+                }
+        components['organisation'] = paf['ORGANISATION'].get(raw_entry[11], 
+                                                              raw_entry[12])
+        return flatten_address(raw_entry, components, 
+                               self.paf_readers['ADDRESS'].decode)
+
+    def _get_non_address_data(self, workers=None):
         """Get non-address data from the PAFReaders.
 
-        Creates a series of dictionaries which contain all the data parsed 
-        by the PAFReaders, restructured into dictionary form whereby the 
+        Starts loading each component file into a dictionary whereby the 
         key for each datatype is the dictionary key, and the values are 
-        stored in tuples.
+        stored in tuples. Files are loaded in worker processes (unless 
+        workers is 0), largest first, and _wait_for collects the results.
+
+        Organisations are instead held in an OrganisationIndex, as their keys 
+        are only unique in combination with the postcode type.
+
+        In binary mode, the keys are integers and the values are decoded as 
+        they are loaded.
 
         """
-        self.paf_data = {}
-        for filetype in filter(lambda x: x != "ADDRESS", VALID_FILETYPES):
-            print("Populating {} data...".format(filetype))
-            self.paf_data[filetype] = {
-                    entry[0]: entry[1:]
-                    for entry in self.paf_readers[filetype]
-                    }
-            print("{} population complete!".format(filetype))
+        if workers is None:
+            workers = min(len(COMPONENT_FILETYPES), os.cpu_count() or 1)
+            #With a single CPU, the worker would only add overhead.
+            workers = workers if workers > 1 else 0
+        if workers == 0:
+            for filetype in COMPONENT_FILETYPES:
+                print("Populating {} data...".format(filetype))
+                self._tables[filetype] = _load_component(
+                        self.path, filetype, self.binary, pack=False
+                        )
+                print("{} population complete!".format(filetype))
+            return None
+        print("Populating component data...")
+        executor = ProcessPoolExecutor(max_workers=workers)
+        for filetype in sorted(COMPONENT_FILETYPES, key=self._file_size,
+                               reverse=True):
+            self._pending[filetype] = executor.submit(
+                    _load_component, self.path, filetype, self.binary
+                    )
+        #Allow the pool to shut down once the submitted files are loaded.
+        executor.shutdown(wait=False)
+        return None
+
+    def _wait_for(self, filetypes):
+        """Wait for component tables to finish loading."""
+        for filetype in filetypes:
+            if filetype in self._pending:
+                table = self._pending.pop(filetype).result()
+                self._tables[filetype] = _unpack_table(table)
+                print("{} population complete!".format(filetype))
+        return None
+
+    def _file_size(self, filetype):
+        """Return the size of a component file, or 0 if it is compressed."""
+        try:
+            return sum(os.path.getsize(x) for x in 
+                       self.paf_readers[filetype].filelist)
+        except OSError:
+            return 0
+
+
+def _load_component(paf_path, filetype, binary, pack=True):
+    """Load a component file, by default into its compact transfer form.
+
+    Run in a worker process. Returns an OrganisationIndex for the 
+    Organisations File, and otherwise a tuple of the list of keys and a 
+    string of the joined values of each entry. (Where the values include 
+    numeric fields, as for the Mailsort File, a list of the values of each 
+    entry is returned instead, so that their types are preserved.) If pack 
+    is False, a dictionary of the values of each entry is returned.
+
+    """
+    reader = PAFReader(paf_path, filetype, binary)
+    entries = reader
+    if binary:
+        entries = ((entry[0],) + tuple(map(reader.decode, entry[1:]))
+                   for entry in reader)
+    if filetype == "ORGANISATION":
+        return OrganisationIndex(entries)
+    if not pack:
+        return {entry[0]: entry[1:] for entry in entries}
+    keys, values = [], []
+    for entry in entries:
+        keys.append(entry[0])
+        values.append(entry[1:])
+    if any(x > 0 for x in reader._filetype_data("numeric")):
+        return keys, values
+    return keys, RECORD_SEPARATOR.join(map(FIELD_SEPARATOR.join, values))
+
+def _unpack_table(table):
+    """Unpack a component table from its compact transfer form."""
+    if isinstance(table, OrganisationIndex):
+        return table
+    keys, values = table
+    if isinstance(values, str):
+        values = values.split(RECORD_SEPARATOR)
+        if FIELD_SEPARATOR in values[0]:
+            values = map(tuple, (x.split(FIELD_SEPARATOR) for x in values))
+        else:
+            #Each entry has a single value, so zip gives the 1-tuples.
+            values = zip(values)
+    return dict(zip(keys, values))
@@ -0,0 +1,186 @@
+"""External module.
+
+Defines the ExternalPAFData class, an alternative to the PAFData class for
+use where there is not enough memory to hold the PAF component files in
+dictionaries.
+
+Rather than looking up each reference in memory, the address entries are
+sorted on each reference in turn (locality, thoroughfare, and so on) using
+an external merge sort, and then merge-joined against the relevant
+component file, sorted in the same way. Once every reference has been
+resolved, the entries are sorted back into their original order and
+flattened exactly as by PAFData.
+
+Each sort holds at most one run of entries in memory, and its runs are
+written to temporary files. As each stage reads lazily from the one
+before, only one stage is building a run at any time, but the merges of
+every sort are in progress at once. Half of the memory limit is therefore
+given to the run being built, and the other half is shared between the
+merges, which bounds the block size and number of runs merged at once by
+each (see the sorting module).
+
+"""
+from paf_tools.populate.files_parser import PAFReader
+from paf_tools.populate.organisations import composite_key
+from paf_tools.populate.data_store import ADDRESS_REFERENCES, flatten_address
+from paf_tools.sorting import external_sort
+
+#Define the default memory limit, in bytes.
+DEFAULT_MEMORY_LIMIT = 256 * 1024 ** 2
+#Define the approximate memory used by an address entry part way through
+#the joins, in bytes, used to convert the memory limit to a run size.
+ENTRY_SIZE_ESTIMATE = 2048
+#Define the number of sorts whose merges are in progress at once: those of
+#the entries and the component file for each reference, and the final sort
+#back into the original order.
+CONCURRENT_SORTS = 2 * len(ADDRESS_REFERENCES) + 1
+#Define the key given to references which cannot be parsed, which never
+#matches a component entry.
+INVALID_KEY = -1
+
+class ExternalPAFData(object):
+    """This class defines the ExternalPAFData class.
+
+    This class yields the same flattened address entries as PAFData, but
+    resolves the relational data using external sort-merge joins under a
+    configurable memory limit.
+
+    """
+    def __init__(self, paf_path, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 tmpdir=None):
+        """Initialise ExternalPAFData instance.
+
+        Keyword arguments:
+        paf_path - the full path to the folder containing PAF data
+        memory_limit - the approximate amount of memory to use for sorting,
+                       in bytes (defaults to DEFAULT_MEMORY_LIMIT)
+        tmpdir - the folder in which to create temporary files (defaults to
+                 the system temporary folder)
+
+        """
+        self.path = paf_path
+        entries = memory_limit // ENTRY_SIZE_ESTIMATE
+        self.run_size = max(1000, entries // 2)
+        self.merge_size = max(100, entries // 2 // CONCURRENT_SORTS)
+        self.tmpdir = tmpdir
+        self.address_reader = PAFReader(self.path, "ADDRESS", binary=True)
+        self.entries = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """Define next method.
+
+        Builds the pipeline of joins when first called, and then yields
+        each flattened address entry in turn.
+
+        """
+        if self.entries is None:
+            self.entries = self._flattened_entries()
+        return next(self.entries)
+
+    def _flattened_entries(self):
+        """Resolve and flatten every address entry.
+
+        Generator function which numbers each address entry, so that its
+        original order may be restored, and then joins it against each
+        component file in turn. Resolved component data is appended to each
+        entry as a tuple of (sequence number, raw entry, component data...).
+
+        """
+        entries = ((number, raw_entry) for number, raw_entry in
+                   enumerate(self.address_reader))
+        for reference in ADDRESS_REFERENCES:
+            entries = self._join(entries, reference)
+        decode = self.address_reader.decode
+        for entry in self._sort(entries, key=lambda entry: entry[0]):
+            components = {reference[0]: value for reference, value in
+                          zip(ADDRESS_REFERENCES, entry[2:])}
+            yield flatten_address(entry[1], components, decode)
+
+    def _join(self, entries, reference):
+        """Join address entries against a component file.
+
+        Generator function which sorts the entries and the component file on
+        the key of the reference, and then merges them, appending the
+        referenced data (or the default, if there is none) to each entry.
+        Where a key is repeated in the component file, the last entry read 
+        is used, as by PAFData.
+
+        """
+        name, index, filetype, default = reference
+        entry_key = lambda entry: self._reference_key(entry[1], index, 
+                                                      filetype)
+        components = _last_of_each_key(self._sort(
+                self._component_entries(filetype),
+                key=lambda component: component[0]
+                ))
+        component = next(components, None)
+        for entry in self._sort(entries, key=entry_key):
+            key = entry_key(entry)
+            while component is not None and component[0] < key:
+                component = next(components, None)
+            if component is not None and component[0] == key:
+                yield entry + (component[1],)
+            else:
+                yield entry + (default,)
+
+    def _component_entries(self, filetype):
+        """Read a component file as tuples of (key, decoded values).
+
+        Organisation keys are combined with their postcode type, and their
+        values consist of only the organisation and department names, as for
+        the OrganisationIndex. Entries with invalid keys are skipped.
+
+        """
+        reader = PAFReader(self.path, filetype, binary=True)
+        for entry in reader:
+            values = tuple(map(reader.decode, entry[1:]))
+            try:
+                if filetype == "ORGANISATION":
+                    yield composite_key(entry[0], entry[1]), values[1:3]
+                elif isinstance(entry[0], int):
+                    yield entry[0], values
+            except ValueError:
+                continue
+
+    def _reference_key(self, raw_entry, index, filetype):
+        """Get the key of a reference made by a raw address entry."""
+        key = raw_entry[index]
+        if not isinstance(key, int):
+            return INVALID_KEY
+        if filetype == "ORGANISATION":
+            try:
+                return composite_key(key, raw_entry[12])
+            except ValueError:
+                return INVALID_KEY
+        return key
+
+    def _sort(self, iterable, key):
+        """Sort using the memory limit and temporary folder configured.
+
+        Every sort is made to use temporary files, as several sorts are in 
+        progress at once and each must hold no more than its share of the 
+        merge memory.
+
+        """
+        return external_sort(iterable, key=key, run_size=self.run_size,
+                             tmpdir=self.tmpdir, keep_in_memory=False,
+                             merge_size=self.merge_size)
+
+
+def _last_of_each_key(components):
+    """Keep the last of each run of component entries with the same key.
+
+    Generator function taking component entries sorted (stably) on their 
+    keys, so that the last of each run is the last read from the file.
+
+    """
+    previous = None
+    for component in components:
+        if previous is not None and component[0] != previous[0]:
+            yield previous
+        previous = component
+    if previous is not None:
+        yield previous
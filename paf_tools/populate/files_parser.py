@@ -50,9 +50,17 @@ The other component files consist of entries in the format:-
 
 with no whitespace between the key and value.
 
+The component files may be read from a folder of extracted files, or 
+directly from the compressed archives in which they are delivered (see the 
+archive module for details).
+
 """
 import os
-from paf_tools.structure import *
+import struct
+from operator import itemgetter
+from paf_tools import structure
+from paf_tools.structure import VALID_FILETYPES, VALID_DATATYPES
+from paf_tools.populate.archive import open_paf_file, open_paf_file_binary
 
 class PAFReader(object):
     """This class defines the PAFReader class.
@@ -61,19 +69,45 @@ class PAFReader(object):
     files to allow this data to be used for whatever purpose is required.
 
     Details of the structure of the PAF component files is found in 
-    structure.py, and each filetype is defined by two separate variables:
+    structure.py, and each filetype is defined by four separate variables:
 
         * <filetype>_FILENAME, which defines the filename(s) containing the 
-          PAF data; and
+          PAF data;
         * <filetype>_COMPONENTS, which defines the structure of each line 
           of the relevant file in the form of a list of integers, each 
-          representing the length of one field of data.
+          representing the length of one field of data;
+        * <filetype>_NUMERIC, which lists the fields containing only 
+          digits; and
+        * <filetype>_ENCODING, which defines the encoding and error policy 
+          used to decode the text fields.
+
+    In binary mode, lines are read and split as bytes. Numeric fields are 
+    converted directly to integers, and text fields are only decoded when 
+    passed to the decode method. As the Address Files consist almost 
+    entirely of numeric keys, this avoids most of the cost of decoding them.
 
     """
-    def __init__(self, path, filetype):
-        """Initialise PAFReader instance."""
+    def __init__(self, path, filetype, binary=False, encoding=None, 
+                 errors=None):
+        """Initialise PAFReader instance.
+
+        Keyword arguments:
+        path - the path to the folder (or archive) containing PAF files
+        filetype - the type of file to read
+        binary - boolean confirming whether to parse in binary mode 
+                 (defaults to False)
+        encoding - the encoding of the text fields (defaults to the 
+                   <filetype>_ENCODING setting)
+        errors - the decoding error policy (defaults to the 
+                 <filetype>_ENCODING setting)
+
+        """
         self.path = path
         self.filetype = filetype
+        self.binary = binary
+        default_encoding, default_errors = self._filetype_data("encoding")
+        self.encoding = encoding or default_encoding
+        self.errors = errors or default_errors
         self.filedata = self.open_component_file()
 
     def __iter__(self):
@@ -93,18 +127,68 @@ class PAFReader(object):
 
     def open_component_file(self):
         """Open the PAF component file for reading."""
-        filelist = [os.path.join(self.path, x) 
-                    for x in self._filetype_data("filename")]
-        for entry in filelist:
-            with open(entry, errors='replace') as paf_file:
-                for line in paf_file:
-                    #Skip headers and footers.
-                    parsed_line = self._parse_line(line)
-                    if (parsed_line[0] and 
-                        not (parsed_line[0] == "0" * len(parsed_line[0]) or 
-                             parsed_line[0] == "9" * len(parsed_line[0]))):
-                        yield parsed_line
+        for entry in self.filelist:
+            for _, _, parsed_line in self.read_records(entry):
+                yield parsed_line
+
+    def read_records(self, filename):
+        """Read the records of a single PAF component file.
+
+        Generator function which skips the header and footer records, and 
+        yields a tuple of (line number, raw line, parsed line) for every 
+        other line in the file.
+
+        In binary mode, the numeric fields of each parsed line are integers 
+        and the remaining fields are undecoded bytes, which may be decoded 
+        using the decode method when needed. Otherwise, every field is a 
+        string.
+
+        Keyword arguments:
+        filename - the full path of the file to read
+
+        """
+        if self.binary:
+            paf_file = open_paf_file_binary(filename)
+            parse_line = self._parse_binary_line
+        else:
+            paf_file = open_paf_file(filename, self.encoding, self.errors)
+            parse_line = self._parse_line
+        is_record = self.is_record
+        with paf_file:
+            for line_number, line in enumerate(paf_file, 1):
+                #Skip headers and footers.
+                if is_record(line):
+                    yield line_number, line, parse_line(line)
+
+    def is_record(self, line):
+        """Check whether a raw line (text or bytes) is a data record.
+
+        Header and footer records are identified by a key consisting 
+        entirely of zeroes or nines, respectively. Blank lines are also not 
+        data records.
+
+        """
+        key = line[:self._splits[0][1]].strip()
+        if isinstance(key, bytes):
+            return bool(key and key.strip(b'0') and key.strip(b'9'))
+        return bool(key and key.strip('0') and key.strip('9'))
 
+    def decode(self, value):
+        """Decode a text field parsed in binary mode.
+
+        Values which are not bytes are returned unchanged, so that fields 
+        parsed in either mode may be passed in.
+
+        """
+        if isinstance(value, bytes):
+            return value.decode(self.encoding, self.errors)
+        return value
+
+    @property
+    def filelist(self):
+        """Return the full paths of the files for this filetype."""
+        return [os.path.join(self.path, x) 
+                for x in self._filetype_data("filename")]
 
     def _parse_line(self, line):
         """Parse line of Address File.
@@ -113,13 +197,40 @@ class PAFReader(object):
         tuple containing these components.
     
         """
-        #Calculate indices at which splits occur.
-        splits_indices = [0]
-        for x in self._filetype_data("components"):
-            splits_indices.append(x + splits_indices[-1]) 
-        split_line = (line[splits_indices[x]:splits_indices[x+1]].strip()
-                      for x in range(len(splits_indices)-1))
-        return tuple(split_line)
+        return tuple(line[start:end].strip() for start, end in self._splits)
+
+    def _parse_binary_line(self, line):
+        """Parse line of Address File read in binary mode.
+
+        Splits the input line into separate components as for _parse_line, 
+        but converts numeric fields directly from bytes to integers. 
+
+        The line is split by a precompiled struct, and the numeric and text 
+        fields are then each converted in one pass before being put back in 
+        order. Any line which is short or has a value other than digits in 
+        a numeric field is instead split field by field, leaving such values 
+        as bytes. (The digits are checked first, as int would also accept 
+        signs, underscores and surrounding spaces.)
+
+        """
+        try:
+            fields = self._struct.unpack_from(line)
+        except struct.error:
+            pass
+        else:
+            numeric = self._numeric_getter(fields)
+            if b''.join(numeric).isdigit() or not numeric:
+                return self._reorder(
+                        list(map(int, numeric)) + 
+                        list(map(bytes.strip, self._text_getter(fields)))
+                        )
+        fields = []
+        for x, (start, end) in enumerate(self._splits):
+            field = line[start:end].strip()
+            if x in self._numeric_fields and field.isdigit():
+                field = int(field)
+            fields.append(field)
+        return tuple(fields)
 
     @property
     def filetype(self):
@@ -131,7 +242,8 @@ class PAFReader(object):
         """Set the filetype for this PAFReader.
         
         Validate parameters against available filetypes. Used to ensure 
-        that filetype parameter contents are valid.
+        that filetype parameter contents are valid. Also calculates the 
+        positions of the fields of each line of the filetype.
     
         Keyword arguments:
         filetype - the input filetype value to validate against
@@ -142,6 +254,34 @@ class PAFReader(object):
             raise ValueError("Error! Invalid filetype specified. (Must be one "
                              "of {}.)".format(', '.join(VALID_FILETYPES)))
         self.__filetype = filetype
+        #Calculate indices at which splits occur.
+        splits_indices = [0]
+        for x in self._filetype_data("components"):
+            splits_indices.append(x + splits_indices[-1])
+        self._splits = list(zip(splits_indices, splits_indices[1:]))
+        #Precompile the struct and getters used to parse binary lines.
+        components = self._filetype_data("components")
+        self._numeric_fields = self._filetype_data("numeric")
+        text_fields = [x for x in range(len(components)) 
+                       if x not in self._numeric_fields]
+        field_order = self._numeric_fields + text_fields
+        self._struct = struct.Struct(
+                ''.join("{}s".format(x) for x in components)
+                )
+        self._numeric_getter = self._getter(self._numeric_fields)
+        self._text_getter = self._getter(text_fields)
+        self._reorder = self._getter(
+                [field_order.index(x) for x in range(len(components))]
+                )
+
+    @staticmethod
+    def _getter(indices):
+        """Return a function getting a tuple of the given items from a list."""
+        if not indices:
+            return lambda fields: ()
+        if len(indices) == 1:
+            return lambda fields: (fields[indices[0]],)
+        return itemgetter(*indices)
 
     def _validate_datatype(self, datatype):
         """Validate parameters against available datatypes.
@@ -158,20 +298,22 @@ class PAFReader(object):
     def _filetype_data(self, datatype):
         """Obtain specified data for a given filetype.
     
-        Each filetype is defined by a filename, and the (ordered) length of 
-        the components of each line. This function returns the requested data 
-        for the specified filetype.
+        Each filetype is defined by a filename, the (ordered) length of the 
+        components of each line, the fields which are numeric and the text 
+        encoding. This function returns the requested data for the specified 
+        filetype.
     
         Keyword arguments:
         filetype - the type of file to obtain data for
-        datatype - the type of data required (filename or components)
+        datatype - the type of data required (filename, components, 
+                   numeric or encoding)
     
         """
         filetype, data = self.filetype.upper(), datatype.upper()
         #Check for validity of filetype and data input.
         if not self._validate_datatype(data):
             raise ValueError("Invalid datatype specified.")
-        output_data = globals()["{}_{}".format(filetype, data)]
+        output_data = getattr(structure, "{}_{}".format(filetype, data))
         if isinstance(output_data, str):
             output_data = [output_data]
         return output_data
@@ -0,0 +1,318 @@
+"""Key Index module.
+
+Contains tools for building an on-disk index of the PAF component files,
+allowing individual records to be fetched by key without re-scanning the
+files.
+
+As every file holds fixed-width records, a record may be read given only
+the file containing it and the byte offset at which it starts. The index
+for each filetype is a single file, named <filetype>.idx, laid out as:-
+
+    * a header of the magic bytes b"PAFKIDX1" and the number of entries;
+    * the keys of the records, as a sorted array of unsigned 32-bit
+      integers (organisations are keyed by their composite key, as for the
+      OrganisationIndex); and
+    * the location of each record, as an array of unsigned 64-bit
+      integers, each holding the position of the file within the filelist
+      of the filetype in the upper 16 bits, and the byte offset of the
+      record in the lower 48 bits.
+
+The index files and PAF files are memory-mapped when opened, so a lookup
+consists of a binary search over the keys followed by a slice of the
+relevant file, and no more than the pages touched are ever read.
+
+The PAF files must have been extracted (i.e. not compressed) to be indexed.
+The Mailsort File, which has no numeric key, is not indexed.
+
+"""
+import os
+import mmap
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+from paf_tools.structure import VALID_FILETYPES
+from paf_tools.sorting import external_sort
+from paf_tools.populate.files_parser import PAFReader
+from paf_tools.populate.organisations import composite_key
+from paf_tools.populate.data_store import ADDRESS_REFERENCES, flatten_address
+
+#Define the magic bytes at the start of every index file.
+INDEX_MAGIC = b"PAFKIDX1"
+#Define the layout of the header of an index file.
+INDEX_HEADER = struct.Struct("=8sQ")
+#Define the number of bits of each location used for the byte offset.
+OFFSET_BITS = 48
+#Define the filetypes indexed. (Mailsort File records are keyed by postcode
+#sector, rather than by a numeric key, so are not indexed.)
+INDEXED_FILETYPES = [x for x in VALID_FILETYPES if x != "MAILSORT"]
+
+def index_filename(index_path, filetype):
+    """Return the full path of the index file for a filetype."""
+    return os.path.join(index_path, "{}.idx".format(filetype.lower()))
+
+def build_key_index(paf_path, index_path=None, tmpdir=None):
+    """Build an index of the records in each of the PAF component files.
+
+    Returns a dictionary of the number of records indexed, by filetype
+    (one of INDEXED_FILETYPES).
+
+    Keyword arguments:
+    paf_path - the full path to the folder containing PAF data
+    index_path - the folder in which to write the index files (defaults to
+                 paf_path)
+    tmpdir - the folder in which to create temporary files (defaults to the
+             system temporary folder)
+
+    """
+    index_path = index_path or paf_path
+    counts = {}
+    for filetype in INDEXED_FILETYPES:
+        print("Indexing {} data...".format(filetype))
+        reader = PAFReader(paf_path, filetype, binary=True)
+        entries = external_sort(_record_locations(reader), tmpdir=tmpdir)
+        counts[filetype] = _write_index(index_filename(index_path, filetype),
+                                        entries, tmpdir)
+        print("{:,d} {} records indexed.".format(counts[filetype], filetype))
+    return counts
+
+def _record_locations(reader):
+    """Get the key and location of every record read by a PAFReader.
+
+    Generator function yielding tuples of (key, location). Records with
+    keys which are not valid are skipped.
+
+    """
+    for file_number, filename in enumerate(reader.filelist):
+        offset = 0
+        with open(_extracted_file(filename), 'rb') as paf_file:
+            for line in paf_file:
+                if reader.is_record(line):
+                    key = _record_key(reader, reader._parse_binary_line(line))
+                    if key is not None:
+                        yield key, (file_number << OFFSET_BITS) | offset
+                offset += len(line)
+
+def _record_key(reader, entry):
+    """Get the index key of a parsed record, or None if it is not valid."""
+    if reader.filetype == "ADDRESS":
+        key = entry[1]
+    elif reader.filetype == "ORGANISATION":
+        try:
+            return composite_key(entry[0], entry[1])
+        except ValueError:
+            return None
+    else:
+        key = entry[0]
+    return key if isinstance(key, int) else None
+
+def _write_index(filename, entries, tmpdir):
+    """Write a sorted iterable of (key, location) tuples to an index file.
+
+    The keys are written directly to the index file, while the locations are
+    held in a temporary file until the number of entries is known. Returns
+    the number of entries written.
+
+    """
+    count = 0
+    with open(filename, 'wb') as index_file, \
+         tempfile.TemporaryFile(dir=tmpdir) as locations_file:
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+        keys, locations = array('I'), array('Q')
+        for key, location in entries:
+            keys.append(key)
+            locations.append(location)
+            count += 1
+            if len(keys) == 65536:
+                keys.tofile(index_file)
+                locations.tofile(locations_file)
+                keys, locations = array('I'), array('Q')
+        keys.tofile(index_file)
+        locations.tofile(locations_file)
+        #Align the locations to 8 bytes, then append them.
+        if count % 2:
+            index_file.write(b"\0" * 4)
+        locations_file.seek(0)
+        while True:
+            chunk = locations_file.read(1 << 20)
+            if not chunk:
+                break
+            index_file.write(chunk)
+        index_file.seek(0)
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, count))
+    return count
+
+def _extracted_file(filename):
+    """Find an extracted PAF file, matching its name without regard to case.
+
+    Raises a ValueError if the file is not present in extracted form.
+
+    """
+    if os.path.isfile(filename):
+        return filename
+    folder, name = os.path.split(filename)
+    if os.path.isdir(folder):
+        for entry in os.listdir(folder):
+            if entry.lower() == name.lower():
+                return os.path.join(folder, entry)
+    raise ValueError("Error! {} must be extracted to be indexed."
+                     .format(filename))
+
+
+class KeyIndex(object):
+    """This class defines the KeyIndex class.
+
+    The KeyIndex is used to fetch individual records from the PAF component
+    files by key, using the index files written by build_key_index.
+
+    The index and PAF files are opened and memory-mapped once, as each is
+    first needed, and remain open until the KeyIndex is closed.
+
+    """
+    def __init__(self, paf_path, index_path=None):
+        """Initialise KeyIndex instance.
+
+        Keyword arguments:
+        paf_path - the full path to the folder containing PAF data
+        index_path - the folder containing the index files (defaults to
+                     paf_path)
+
+        """
+        self.path = paf_path
+        self.index_path = index_path or paf_path
+        self.readers = {}
+        self._indexes = {}
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, address_key):
+        return self._find("ADDRESS", address_key) is not None
+
+    def fetch(self, address_key):
+        """Fetch and flatten the address with the specified Address Key.
+
+        Returns a dictionary in the same form as the entries produced by
+        PAFData. Raises a KeyError if there is no such address.
+
+        Keyword arguments:
+        address_key - the Address Key of the address
+
+        """
+        raw_entry = self.fetch_raw("ADDRESS", address_key)
+        components = {}
+        for name, index, filetype, default in ADDRESS_REFERENCES:
+            if filetype == "ORGANISATION":
+                try:
+                    key = composite_key(raw_entry[index], raw_entry[12])
+                except ValueError:
+                    key = None
+            else:
+                key = raw_entry[index]
+            try:
+                entry = self.fetch_raw(filetype, key)
+            except KeyError:
+                components[name] = default
+                continue
+            decode = self.readers[filetype].decode
+            if filetype == "ORGANISATION":
+                components[name] = (decode(entry[2]), decode(entry[3]))
+            else:
+                components[name] = tuple(map(decode, entry[1:]))
+        return flatten_address(raw_entry, components,
+                               self.readers["ADDRESS"].decode)
+
+    def fetch_raw(self, filetype, key):
+        """Fetch the record with the specified key from a component file.
+
+        Returns the record as parsed by a PAFReader in binary mode. Raises a
+        KeyError if there is no such record, or a ValueError if the filetype
+        is not indexed.
+
+        Keyword arguments:
+        filetype - the type of file containing the record
+        key - the key of the record (the composite key, for organisations)
+
+        """
+        filetype = filetype.upper()
+        if filetype not in INDEXED_FILETYPES:
+            raise ValueError("Error! Invalid filetype specified. (Must be "
+                             "one of {}.)".format(
+                                 ', '.join(INDEXED_FILETYPES)))
+        location = self._find(filetype, key)
+        if location is None:
+            raise KeyError(key)
+        file_number = location >> OFFSET_BITS
+        offset = location & ((1 << OFFSET_BITS) - 1)
+        paf_file = self._paf_file(filetype, file_number)
+        reader = self.readers[filetype]
+        end = paf_file.find(b"\n", offset)
+        return reader._parse_binary_line(
+                paf_file[offset:end if end >= 0 else len(paf_file)]
+                )
+
+    def close(self):
+        """Close all open index and PAF files."""
+        for keys, locations, index_map in self._indexes.values():
+            keys.release()
+            locations.release()
+            index_map.close()
+        for paf_file in self._files.values():
+            paf_file.close()
+        self._indexes = {}
+        self._files = {}
+        return None
+
+    def _find(self, filetype, key):
+        """Find the location of a record, or None if it is not present.
+
+        Where a key is repeated, the location of the last record read is
+        returned, as for the dictionaries of PAFData.
+
+        """
+        if not isinstance(key, int) or key < 0:
+            return None
+        keys, locations, _ = self._index(filetype)
+        position = bisect_right(keys, key) - 1
+        if position >= 0 and keys[position] == key:
+            return locations[position]
+        return None
+
+    def _index(self, filetype):
+        """Open and memory-map the index file for a filetype."""
+        if filetype not in self._indexes:
+            filename = index_filename(self.index_path, filetype)
+            with open(filename, 'rb') as index_file:
+                index_map = mmap.mmap(index_file.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            magic, count = INDEX_HEADER.unpack_from(index_map)
+            if magic != INDEX_MAGIC:
+                index_map.close()
+                raise ValueError("Error! {} is not a valid index file."
+                                 .format(filename))
+            view = memoryview(index_map)
+            start = INDEX_HEADER.size
+            keys = view[start:start + count * 4].cast('I')
+            start += (count + count % 2) * 4
+            locations = view[start:start + count * 8].cast('Q')
+            view.release()
+            self._indexes[filetype] = (keys, locations, index_map)
+            self.readers[filetype] = PAFReader(self.path, filetype,
+                                               binary=True)
+        return self._indexes[filetype]
+
+    def _paf_file(self, filetype, file_number):
+        """Open and memory-map a PAF file."""
+        if (filetype, file_number) not in self._files:
+            filename = _extracted_file(
+                    self.readers[filetype].filelist[file_number]
+                    )
+            with open(filename, 'rb') as paf_file:
+                self._files[filetype, file_number] = mmap.mmap(
+                        paf_file.fileno(), 0, access=mmap.ACCESS_READ
+                        )
+        return self._files[filetype, file_number]
@@ -0,0 +1,95 @@
+"""Organisations module.
+
+Defines the OrganisationIndex class, used to look up organisation details
+from the PAF Organisations File.
+
+Organisation keys are only unique in combination with the postcode type
+(S for Small User, L for Large User), since the Organisations File holds
+separate series of keys for each type of user. The index therefore stores
+each entry against a composite of both values.
+
+"""
+from array import array
+from bisect import bisect_left
+
+#Define the postcode types, in the order used to build composite keys.
+POSTCODE_TYPES = ['S', 'L']
+
+def composite_key(key, postcode_type):
+    """Combine an organisation key and postcode type into one integer.
+
+    Raises a ValueError if either value is invalid. Values parsed in binary 
+    mode may be passed in directly.
+
+    """
+    if isinstance(postcode_type, bytes):
+        postcode_type = postcode_type.decode('ascii', 'replace')
+    return int(key) * len(POSTCODE_TYPES) + POSTCODE_TYPES.index(
+            postcode_type.upper()
+            )
+
+class OrganisationIndex(object):
+    """This class defines the OrganisationIndex class.
+
+    Entries are stored in a sorted array of composite integer keys, with the
+    organisation and department names held in parallel tuples. This uses a
+    fraction of the memory of a dictionary of tuples, and lookups are made
+    by binary search.
+
+    """
+    def __init__(self, entries=()):
+        """Initialise OrganisationIndex instance.
+
+        Keyword arguments:
+        entries - an iterable of parsed Organisations File entries, each a
+                  tuple of (key, postcode type, organisation name,
+                  department name, ...)
+
+        """
+        #Sort on the composite key only; the sort is stable, so where a key
+        #is repeated the last entry read is the one retained.
+        rows = sorted(
+                ((composite_key(entry[0], entry[1]), entry[2], entry[3])
+                 for entry in entries),
+                key=lambda row: row[0]
+                )
+        rows = [row for i, row in enumerate(rows)
+                if i + 1 == len(rows) or rows[i + 1][0] != row[0]]
+        self.keys = array('Q', (row[0] for row in rows))
+        self.organisation_names = tuple(row[1] for row in rows)
+        self.department_names = tuple(row[2] for row in rows)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return self._find(*key) is not None
+
+    def get(self, key, postcode_type, default=('', '')):
+        """Get organisation details.
+
+        Returns a tuple of (organisation name, department name) for the
+        specified key and postcode type, or default if there is no such
+        organisation.
+
+        Keyword arguments:
+        key - the organisation key
+        postcode_type - the postcode type, either S or L
+        default - the value to return if no organisation is found
+
+        """
+        index = self._find(key, postcode_type)
+        if index is None:
+            return default
+        return (self.organisation_names[index], self.department_names[index])
+
+    def _find(self, key, postcode_type):
+        """Find the position of an entry, or None if it is not present."""
+        try:
+            search_key = composite_key(key, postcode_type)
+        except ValueError:
+            return None
+        index = bisect_left(self.keys, search_key)
+        if index < len(self.keys) and self.keys[index] == search_key:
+            return index
+        return None
@@ -5,12 +5,18 @@ This module contains functions for populating a database with PAF data.
 The data is split across a number of files (as explained elsewhere), and so 
 each file must be parsed and the data inserted into the database.
 
+The database package (and so SQLAlchemy) is only imported when the 
+database is populated, so that importing this module is cheap for processes 
+which only parse the PAF files.
+
 """
-from paf_tools import database
-from paf_tools.database.tables import Address
 from paf_tools.populate.data_store import PAFData
+from paf_tools.populate.external import ExternalPAFData
+from paf_tools.formatting import format_labels
 
-def populate_address_data(paf_path, erase_existing=True):
+def populate_address_data(paf_path, erase_existing=True, search_index=False, 
+                          memory_limit=None, engine=None, labels=False, 
+                          tmpdir=None):
     """Populate address table in the database.
 
     Uses the PAFData class to extract and clean the data from the postcode 
@@ -21,14 +27,54 @@ def populate_address_data(paf_path, erase_existing=True):
     Keyword arguments:
     paf_path - the full path to the folder containing PAF data
     erase_existing - boolean confirming whether existing database is to be 
-                     erased before populating (defaults to True)
+                     erased before populating (defaults to True); if False, 
+                     the database must already have the current schema, 
+                     and a ValueError is raised before loading otherwise 
+                     (see operations.check_schema)
+    search_index - boolean confirming whether the full-text search index is 
+                   to be built alongside the address table (defaults to 
+                   False; an existing index is always extended with the 
+                   addresses added, where erase_existing is False)
+    memory_limit - if given, the approximate amount of memory (in bytes) to 
+                   use in flattening the data, which is then carried out 
+                   using external sorts by the ExternalPAFData class 
+                   (defaults to None, in which case the component data is 
+                   held in memory by the PAFData class)
+    engine - the database engine to populate (defaults to the configured 
+             database)
+    labels - boolean confirming whether the formatted label of each 
+             address is to be computed and stored (defaults to False)
+    tmpdir - the folder in which the external sorts of a memory limited 
+             build write their temporary files (defaults to the system 
+             temporary folder)
 
     """
+    from sqlalchemy import func
+    from sqlalchemy.orm import Session
+    from paf_tools import database
+    from paf_tools.database import operations, search, streets
+    from paf_tools.database.tables import Address, Street
+    engine = engine or database.get_engine()
      #Check if existing database is to be erased, then do so if true.
     if erase_existing:
-        database.operations.erase_database()
-    data_generator = PAFData(paf_path)
-    session = database.Session()
+        operations.erase_database(engine)
+    else:
+        operations.check_schema(engine)
+    if memory_limit:
+        data_generator = ExternalPAFData(paf_path, memory_limit, tmpdir)
+    else:
+        data_generator = PAFData(paf_path)
+    if labels:
+        data_generator = format_labels(data_generator)
+    session = Session(bind=engine)
+    indexed_id = 0
+    if search_index:
+        search.create_search_index(session)
+    elif search.has_search_index(session):
+        #Keep an existing search table in step with the addresses added, 
+        #so that searches do not silently miss them.
+        search_index = True
+        indexed_id = session.query(func.max(Address.id)).scalar() or 0
     count = 0
     print("=== Populating {} table... ===".format(Address.__name__))
     for row in data_generator:
@@ -36,11 +82,20 @@ def populate_address_data(paf_path, erase_existing=True):
         count += 1
         #Only commit after 100000 additions
         if not count % 100000:
+            session.flush()
+            if search_index:
+                indexed_id = search.index_addresses(session, indexed_id)
             session.commit()
             print("{:,d} records added...".format(count))
     else:
+        session.flush()
+        if search_index:
+            search.index_addresses(session, indexed_id)
         session.commit()
         print("{:,d} total records added.".format(count))
+    print("=== Populating {} table... ===".format(Street.__name__))
+    streets.build_street_table(session)
+    session.commit()
     return count
 
 
@@ -0,0 +1,308 @@
+"""Statistics module.
+
+Computes counts of delivery points and households across the postcode
+hierarchy of a PAF release, for capacity planning.
+
+Counts are made at each level of the postcode hierarchy - area (e.g. OX),
+district (OX4), sector (OX4 1) and unit (OX4 1AA) - and by post town. As
+different post towns may share a name (e.g. Newport, in the NP and PO
+areas), each post town is identified by its name and postcode area, as in
+"Newport, NP". Delivery points whose locality is missing from the Locality
+File are counted at every other level, but not by post town. The
+number of households at a delivery point is taken from the Number of
+Households field of the Address File, where 0 or 1 indicates a single
+household.
+
+The Address Files are read in a single pass, in parallel, with each worker
+process counting the delivery points and households of every postcode
+unit and locality in one file. The units are then rolled up to the higher
+levels, and the localities to their post towns.
+
+As this requires reading the whole release, the results are cached to
+disk along with a signature of the release files, and are only computed
+again when the release changes. The cache is written to the release folder
+or, for a release held in an archive, beside the archive. If the cache
+cannot be written (e.g. as the folder is read-only), the statistics are
+computed on every run. The module may be run directly to print
+the statistics for a postcode:-
+
+    python -m paf_tools.populate.statistics <path to PAF data> <postcode>
+
+"""
+import os
+import re
+import sys
+import pickle
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from paf_tools.structure import ADDRESS_FILENAME, LOCALITY_FILENAME
+from paf_tools.postcode import to_key, to_display
+from paf_tools.populate.files_parser import PAFReader
+
+#Define the levels at which counts are made, from broadest to narrowest.
+LEVELS = ['area', 'district', 'sector', 'unit', 'post town']
+#Define the default name of the cache file, written to the PAF folder.
+CACHE_FILENAME = "paf-statistics.pickle"
+#Define the version of the cache file format.
+CACHE_VERSION = 2
+
+Counts = namedtuple('Counts', ['delivery_points', 'households'])
+
+
+class PostcodeStatistics(object):
+    """This class defines the PostcodeStatistics class.
+
+    Holds the counts of delivery points and households at each level, in
+    dictionaries keyed by the display form of the postcode, area, district
+    or sector, or by the post town name and area (e.g. "Oxford, OX").
+
+    """
+    def __init__(self, levels, signature=None):
+        """Initialise PostcodeStatistics instance.
+
+        Keyword arguments:
+        levels - a dictionary of dictionaries of Counts, keyed by level
+        signature - the signature of the release counted (optional)
+
+        """
+        self.levels = levels
+        self.signature = signature
+
+    def get(self, level, name):
+        """Get the counts for a single area, district, sector, unit or town.
+
+        Returns Counts of zero if there are no delivery points in the
+        specified area. Raises a ValueError for an unknown level, or for a
+        post town name without an area which is shared by several towns.
+
+        Keyword arguments:
+        level - the level of the hierarchy (one of LEVELS)
+        name - the area, district, sector, postcode or post town, in any
+               case and spacing (a post town may be given with its area,
+               as in "Newport, NP", and must be where its name is shared)
+
+        """
+        if level not in LEVELS:
+            raise ValueError("Error! Invalid level specified. (Must be one "
+                             "of {}.)".format(', '.join(LEVELS)))
+        name = _normalise(level, name)
+        if level == 'post town' and ',' not in name:
+            matches = sorted(x for x in self.levels[level]
+                             if x.rsplit(',', 1)[0] == name)
+            if len(matches) > 1:
+                raise ValueError("Error! Post town {} is ambiguous. (Must be "
+                                 "one of {}.)".format(name,
+                                                      '; '.join(matches)))
+            name = matches[0] if matches else name
+        return self.levels[level].get(name, Counts(0, 0))
+
+    def summary(self, postcode):
+        """Get the counts for each level of the hierarchy above a postcode.
+
+        Returns a dictionary of Counts, keyed by level, or None if the
+        postcode is not valid.
+
+        """
+        key = to_key(postcode)
+        if key is None:
+            return None
+        names = _hierarchy(key)
+        return {level: self.get(level, name) for level, name in names.items()}
+
+    def top(self, level, count=10):
+        """Get the largest areas of a level by number of delivery points.
+
+        Returns a list of (name, Counts) tuples.
+
+        """
+        return sorted(self.levels[level].items(),
+                      key=lambda item: (-item[1].delivery_points, item[0])
+                      )[:count]
+
+
+def compute_statistics(paf_path, workers=None):
+    """Count the delivery points and households of a PAF release.
+
+    Returns a PostcodeStatistics instance.
+
+    Keyword arguments:
+    paf_path - the full path to the folder containing PAF data
+    workers - the number of processes used to read the Address Files
+              (defaults to the number of CPUs)
+
+    """
+    address_files = PAFReader(paf_path, "ADDRESS").filelist
+    print("Counting address files...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_count_address_file,
+                                    [paf_path] * len(address_files),
+                                    address_files))
+    units, localities = {}, {}
+    for file_units, file_localities in results:
+        _add_counts(units, file_units)
+        _add_counts(localities, file_localities)
+    levels = {level: {} for level in LEVELS}
+    for key, counts in units.items():
+        for level, name in _hierarchy(key).items():
+            _add_counts(levels[level], {name: counts})
+    print("Reading LOCALITY data...")
+    locality_reader = PAFReader(paf_path, "LOCALITY", binary=True)
+    towns = {entry[0]: locality_reader.decode(entry[3]).title()
+             for entry in locality_reader}
+    for (key, area), counts in localities.items():
+        if key in towns:
+            name = "{}, {}".format(towns[key], area)
+            _add_counts(levels['post town'], {name: counts})
+    levels = {level: {name: Counts(*counts) for name, counts in
+                      names.items()}
+              for level, names in levels.items()}
+    return PostcodeStatistics(levels, release_signature(paf_path))
+
+def load_statistics(paf_path, cache_file=None, workers=None):
+    """Load the statistics of a PAF release, computing them if necessary.
+
+    The statistics are read from the cache file if it was written for the
+    same release, and are otherwise computed and written to it.
+
+    Keyword arguments:
+    paf_path - the full path to the folder containing PAF data
+    cache_file - the path to the cache file (defaults to the path given by
+                 default_cache_file)
+    workers - the number of processes used to read the Address Files
+              (defaults to the number of CPUs)
+
+    """
+    cache_file = cache_file or default_cache_file(paf_path)
+    signature = release_signature(paf_path)
+    try:
+        with open(cache_file, 'rb') as cache:
+            version, statistics = pickle.load(cache)
+        if version == CACHE_VERSION and statistics.signature == signature:
+            return statistics
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+    statistics = compute_statistics(paf_path, workers)
+    try:
+        with open(cache_file, 'wb') as cache:
+            pickle.dump((CACHE_VERSION, statistics), cache,
+                        pickle.HIGHEST_PROTOCOL)
+    except OSError as error:
+        print("Unable to write statistics cache: {}".format(error))
+    return statistics
+
+def default_cache_file(paf_path):
+    """Get the default path of the cache file for a PAF release.
+
+    This is CACHE_FILENAME within the PAF folder, or for an archive, a file
+    beside the archive named after it (e.g. "release-paf-statistics.pickle"
+    for "release.zip").
+
+    """
+    if os.path.isfile(paf_path):
+        return "{}-{}".format(os.path.splitext(paf_path)[0], CACHE_FILENAME)
+    return os.path.join(paf_path, CACHE_FILENAME)
+
+def release_signature(paf_path):
+    """Get a signature identifying the files of a PAF release.
+
+    The signature consists of the name, size and modification time of each
+    Address File and Locality File, whether extracted or compressed, and of
+    any archives in the folder.
+
+    """
+    if os.path.isfile(paf_path):
+        entries = [paf_path]
+    else:
+        names = [x.lower() for x in ADDRESS_FILENAME + [LOCALITY_FILENAME]]
+        entries = [os.path.join(paf_path, entry) for entry in
+                   sorted(os.listdir(paf_path))
+                   if entry.lower().endswith('.zip') or
+                   any(entry.lower().startswith(x) for x in names)]
+    signature = []
+    for entry in entries:
+        stat = os.stat(entry)
+        signature.append((os.path.basename(entry), stat.st_size,
+                          stat.st_mtime_ns))
+    return tuple(signature)
+
+def _count_address_file(paf_path, filename):
+    """Count the delivery points and households of a single Address File.
+
+    Run in a worker process. Returns a tuple of two dictionaries, of counts
+    by postcode (in key form) and by (locality key, postcode area), where
+    each count is a list of [delivery points, households].
+
+    """
+    reader = PAFReader(paf_path, "ADDRESS", binary=True)
+    units, localities = {}, {}
+    for _, _, entry in reader.read_records(filename):
+        households = entry[10] if isinstance(entry[10], int) else 0
+        households = max(households, 1)
+        #The area is at most the first two characters of the postcode.
+        for counts, key in ((units, entry[0]),
+                            (localities, (entry[2], entry[0][:2]))):
+            try:
+                counts[key][0] += 1
+                counts[key][1] += households
+            except KeyError:
+                counts[key] = [1, households]
+    areas = {}
+    for (key, prefix), counts in localities.items():
+        area = re.match(r"[A-Z]*", reader.decode(prefix)).group(0)
+        _add_counts(areas, {(key, area): counts})
+    return ({reader.decode(key): counts for key, counts in units.items()},
+            areas)
+
+def _add_counts(totals, counts):
+    """Add a dictionary of [delivery points, households] counts to totals."""
+    for key, (delivery_points, households) in counts.items():
+        total = totals.setdefault(key, [0, 0])
+        total[0] += delivery_points
+        total[1] += households
+    return None
+
+def _hierarchy(key):
+    """Get the area, district, sector and unit of a postcode in key form."""
+    district = key[:-3].strip()
+    return {
+            'area': re.match(r"[A-Z]*", district).group(0),
+            'district': district,
+            'sector': "{} {}".format(district, key[-3]),
+            'unit': to_display(key),
+            }
+
+def _normalise(level, name):
+    """Normalise a name to the form in which it is held for a level."""
+    if level == 'post town':
+        town, comma, area = name.rpartition(',')
+        if not comma:
+            return ' '.join(name.split()).title()
+        return "{}, {}".format(' '.join(town.split()).title(),
+                               area.strip().upper())
+    name = re.sub(r"[^0-9A-Za-z]", "", name).upper()
+    if level == 'sector' and len(name) > 1:
+        return "{} {}".format(name[:-1], name[-1])
+    if level == 'unit':
+        key = to_key(name)
+        return to_display(key) if key else name
+    return name
+
+def main(argv=None):
+    """Print the statistics for the postcode given on the command line."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: python -m paf_tools.populate.statistics <paf path> "
+              "<postcode>")
+        return 2
+    summary = load_statistics(argv[0]).summary(argv[1])
+    if summary is None:
+        print("Invalid postcode: {}".format(argv[1]))
+        return 1
+    for level, counts in summary.items():
+        print("{:<10} {:>12,d} delivery points {:>12,d} households".format(
+              level, counts.delivery_points, counts.households))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""Validate module.
+
+Checks the referential integrity of a PAF release before it is loaded.
+
+Every key referenced from the Address Files is checked against the keys
+present in the relevant component file, and every component file is
+checked for duplicate keys and malformed lines. The Address Files are
+checked for duplicate delivery points, which are identified by the
+combination of Address Key, Organisation Key and Postcode Type.
+
+The component keys are held in bitsets, rather than dictionaries, so that
+they may be cheaply copied to a pool of worker processes which check the
+Address Files in parallel.
+
+The module may be run directly to validate a release:-
+
+    python -m paf_tools.populate.validate <path to PAF data>
+
+"""
+import sys
+import heapq
+from itertools import repeat
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from paf_tools.structure import VALID_FILETYPES
+from paf_tools.populate.files_parser import PAFReader
+from paf_tools.populate.organisations import POSTCODE_TYPES, composite_key
+
+#Define the references from the Address Files to the other components, as
+#tuples of (name, Address File field index, component filetype).
+REFERENCES = [
+        ('locality', 2, 'LOCALITY'),
+        ('thoroughfare', 3, 'THOROUGHFARE'),
+        ('thoroughfare descriptor', 4, 'THOROUGHFARE_DESCRIPTOR'),
+        ('dependent thoroughfare', 5, 'THOROUGHFARE'),
+        ('dependent thoroughfare descriptor', 6, 'THOROUGHFARE_DESCRIPTOR'),
+        ('building name', 8, 'BUILDING_NAME'),
+        ('sub-building name', 9, 'SUB_BUILDING_NAME'),
+        ('organisation', 11, 'ORGANISATION'),
+        ]
+#Define the references which must always be present. For all others, a key
+#of 0 indicates that there is no entry.
+REQUIRED_REFERENCES = ['locality']
+#Define the maximum number of examples of each problem to report.
+MAX_EXAMPLES = 10
+
+#Key sets shared with each worker process by the pool initialiser.
+_worker_keysets = None
+
+class KeySet(object):
+    """This class defines the KeySet class.
+
+    A KeySet is a bitset of integer keys, with one bit per possible key
+    between 0 and the highest key present.
+
+    """
+    def __init__(self, sorted_keys):
+        """Initialise KeySet from a sorted array of keys."""
+        self.bits = bytearray((sorted_keys[-1] >> 3) + 1 if sorted_keys else 0)
+        for key in sorted_keys:
+            self.bits[key >> 3] |= 1 << (key & 7)
+
+    def __contains__(self, key):
+        index = key >> 3
+        return index < len(self.bits) and bool(self.bits[index] &
+                                               (1 << (key & 7)))
+
+
+class ValidationReport(object):
+    """This class defines the ValidationReport class.
+
+    Holds counts of each type of problem found in a release, along with a
+    limited number of examples of each. Examples are tuples beginning with
+    the filename and line number at which the problem was found.
+
+    """
+    def __init__(self):
+        """Initialise ValidationReport instance."""
+        self.records = Counter()
+        self.orphans = Counter()
+        self.duplicates = Counter()
+        self.malformed = Counter()
+        self.examples = defaultdict(list)
+
+    def __bool__(self):
+        """Return True if the release is valid."""
+        return not (self.orphans or self.duplicates or self.malformed)
+
+    def __str__(self):
+        lines = ["{:,d} records read from {} files.".format(
+                    sum(self.records.values()), len(self.records)
+                    )]
+        for title, counter in (("Orphaned", self.orphans),
+                               ("Duplicate", self.duplicates),
+                               ("Malformed", self.malformed)):
+            for name, count in sorted(counter.items()):
+                lines.append("{} {}: {:,d}".format(title, name, count))
+                lines.extend("    {}".format(example) for example in
+                             self.examples[(title.lower(), name)])
+        lines.append("Release is valid." if self else "Release is NOT valid.")
+        return '\n'.join(lines)
+
+    def add(self, problem, name, example, count=1):
+        """Record a problem found in the release.
+
+        Keyword arguments:
+        problem - the type of problem (orphaned, duplicate or malformed)
+        name - the name of the reference, filetype or file concerned
+        example - an example of the problem, for reporting
+        count - the number of occurrences to record (defaults to 1)
+
+        """
+        counter = {'orphaned': self.orphans,
+                   'duplicate': self.duplicates,
+                   'malformed': self.malformed}[problem]
+        counter[name] += count
+        examples = self.examples[(problem, name)]
+        if len(examples) < MAX_EXAMPLES:
+            examples.append(example)
+        return None
+
+    def update(self, other):
+        """Merge the contents of another report into this one."""
+        self.records.update(other.records)
+        for counter in ('orphans', 'duplicates', 'malformed'):
+            getattr(self, counter).update(getattr(other, counter))
+        for key, examples in other.examples.items():
+            self.examples[key].extend(
+                    examples[:MAX_EXAMPLES - len(self.examples[key])]
+                    )
+        return None
+
+
+def validate_release(paf_path, workers=None):
+    """Validate the referential integrity of a PAF release.
+
+    Returns a ValidationReport, which is truthy if no problems are found.
+
+    Keyword arguments:
+    paf_path - the full path to the folder containing PAF data
+    workers - the number of processes used to check the Address Files
+              (defaults to the number of CPUs)
+
+    """
+    report = ValidationReport()
+    keysets = {}
+    for filetype in filter(lambda x: x != "ADDRESS", VALID_FILETYPES):
+        print("Reading {} keys...".format(filetype))
+        keys = _read_component_keys(PAFReader(paf_path, filetype, True), 
+                                    report)
+        if filetype != "MAILSORT":
+            keysets[filetype] = KeySet(keys)
+    address_files = PAFReader(paf_path, "ADDRESS").filelist
+    print("Checking address files...")
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(keysets,)) as executor:
+        results = list(executor.map(_check_address_file,
+                                    [paf_path] * len(address_files),
+                                    address_files))
+    delivery_points = []
+    for file_index, (file_report, file_keys, line_numbers) in enumerate(
+            results):
+        report.update(file_report)
+        delivery_points.append(zip(file_keys, repeat(file_index),
+                                   line_numbers))
+    #Each file's delivery points are already sorted, so duplicates across
+    #files are found by merging them. Ties are broken by file and line, so
+    #each duplicate is reported where it occurs again in reading order.
+    previous = None
+    for delivery_point, file_index, line_number in heapq.merge(
+            *delivery_points):
+        if delivery_point == previous:
+            report.add('duplicate', 'ADDRESS',
+                       (address_files[file_index], line_number,
+                        "Address Key {}".format(delivery_point // 10 ** 9)))
+        previous = delivery_point
+    return report
+
+def _read_component_keys(reader, report):
+    """Read and check the keys of a component file.
+
+    Records any malformed lines or duplicate keys in report, and returns a
+    sorted array of the keys present. Organisation keys are combined with
+    their postcode type. Mailsort keys are postcode sectors, rather than
+    numbers, and so are returned as a sorted list.
+
+    """
+    width = sum(reader._filetype_data("components"))
+    numeric_fields = reader._filetype_data("numeric")
+    keys = []
+    for filename in reader.filelist:
+        for line_number, line, parsed_line in reader.read_records(filename):
+            report.records[filename] += 1
+            if not _well_formed(reader, line, parsed_line, width,
+                                numeric_fields):
+                report.add('malformed', filename, (
+                    filename, line_number, reader.decode(line.rstrip(b'\r\n'))
+                    ))
+            elif reader.filetype == "ORGANISATION":
+                keys.append((composite_key(*parsed_line[:2]), filename,
+                             line_number))
+            elif reader.filetype == "MAILSORT":
+                keys.append((reader.decode(parsed_line[0]), filename,
+                             line_number))
+            else:
+                keys.append((parsed_line[0], filename, line_number))
+    keys.sort()
+    for i in range(1, len(keys)):
+        if keys[i][0] == keys[i - 1][0]:
+            report.add('duplicate', reader.filetype,
+                       (keys[i][1], keys[i][2], keys[i][0]))
+    if reader.filetype == "MAILSORT":
+        return [key for key, _, _ in keys]
+    return array('Q', (key for key, _, _ in keys))
+
+def _well_formed(reader, line, parsed_line, width, numeric_fields):
+    """Check that a line read in binary mode is of the correct form."""
+    if len(line.rstrip(b'\r\n')) > width:
+        return False
+    #Numeric fields are only parsed as integers if they contain only digits.
+    if not all(isinstance(parsed_line[i], int) for i in numeric_fields):
+        return False
+    if reader.filetype == "ADDRESS":
+        return reader.decode(parsed_line[12]) in POSTCODE_TYPES
+    if reader.filetype == "ORGANISATION":
+        return reader.decode(parsed_line[1]) in POSTCODE_TYPES
+    return True
+
+def _init_worker(keysets):
+    """Initialise a worker process with the component key sets."""
+    global _worker_keysets
+    _worker_keysets = keysets
+    return None
+
+def _check_address_file(paf_path, filename):
+    """Check the references made by a single Address File.
+
+    Run in a worker process. Returns a tuple of a ValidationReport for the
+    file, a sorted array of the delivery points it contains, each combined
+    into a single integer, and an array of the line number of each.
+
+    """
+    report = ValidationReport()
+    reader = PAFReader(paf_path, "ADDRESS", True)
+    width = sum(reader._filetype_data("components"))
+    numeric_fields = reader._filetype_data("numeric")
+    delivery_points = []
+    for line_number, line, parsed_line in reader.read_records(filename):
+        report.records[filename] += 1
+        if not _well_formed(reader, line, parsed_line, width, numeric_fields):
+            report.add('malformed', filename, (
+                filename, line_number, reader.decode(line.rstrip(b'\r\n'))
+                ))
+            continue
+        organisation = composite_key(parsed_line[11], parsed_line[12])
+        for name, index, filetype in REFERENCES:
+            if filetype == "ORGANISATION":
+                key = organisation if parsed_line[index] else 0
+            else:
+                key = parsed_line[index]
+            if not key and name not in REQUIRED_REFERENCES:
+                continue
+            if key not in _worker_keysets[filetype]:
+                report.add('orphaned', name,
+                           (filename, line_number, parsed_line[index]))
+        delivery_points.append((parsed_line[1] * 10 ** 9 + organisation,
+                                line_number))
+    delivery_points.sort()
+    return (report, array('Q', (x[0] for x in delivery_points)),
+            array('L', (x[1] for x in delivery_points)))
+
+def main(argv=None):
+    """Validate the release at the path given on the command line."""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python -m paf_tools.populate.validate <paf path>")
+        return 2
+    report = validate_release(argv[0])
+    print(report)
+    return 0 if report else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
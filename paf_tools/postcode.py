@@ -0,0 +1,152 @@
+"""Postcode module.
+
+Contains helper functions for normalising and splitting UK postcodes.
+
+Within the PAF, postcodes are held in a fixed 7 character field, made up
+of the outward code padded with spaces to 4 characters, followed by the
+3 character inward code (e.g. "OX4 1AA", "M1  1AA" or "SW1A2AA"). This is
+referred to here as the key form of a postcode, as it sorts in the same
+order as the PAF data. The display form is the outward and inward codes
+separated by a single space (e.g. "M1 1AA").
+
+Large batches of postcodes (e.g. a column of customer input) may be
+normalised with normalise_batch. The batch is joined into a single string,
+which is cleaned and validated as a whole - with bytes.translate removing
+punctuation and a single regular expression blanking each invalid line -
+before being split again. Only the cleaning and validation are done over
+the whole batch: the key and display forms and the components are then
+built by a list comprehension over the postcodes, as without numpy there
+is no array operation to do so. This is about 2.5 to 3 times faster than
+calling to_key for each postcode, at about 1.2 to 1.4 million postcodes
+per second on a single core (see benchmarks/postcode_batch.py).
+
+"""
+import re
+from functools import cached_property
+
+#Define the pattern of a valid postcode, once spaces have been removed.
+POSTCODE_PATTERN = re.compile(r"^([A-Z]{1,2}[0-9][0-9A-Z]?)([0-9][A-Z]{2})$")
+#Define the separator of the postcodes of a batch, once joined.
+BATCH_SEPARATOR = '\n'
+#Define the bytes removed from a batch (all but digits, capitals and the
+#separator).
+BATCH_DELETE = bytes(x for x in range(256) if x not in
+                     b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ\n")
+#Define the pattern of a line of a cleaned batch which is not a postcode.
+BATCH_INVALID = re.compile(r"^(?![A-Z]{1,2}[0-9][0-9A-Z]?[0-9][A-Z]{2}$).+$",
+                           re.M)
+#Define the pattern of the part of each line of a batch following the area.
+BATCH_AFTER_AREA = re.compile(r"[0-9][^\n]*")
+
+def to_key(postcode):
+    """Convert a postcode to its key form.
+
+    Accepts postcodes in any case and with any spacing or punctuation.
+    Returns None if the postcode is not valid.
+
+    Keyword arguments:
+    postcode - the postcode to convert
+
+    """
+    match = POSTCODE_PATTERN.match(re.sub(r"[^0-9A-Za-z]", "", postcode).upper())
+    if not match:
+        return None
+    return match.group(1).ljust(4) + match.group(2)
+
+def to_display(key):
+    """Convert a postcode in key form to its display form."""
+    return "{} {}".format(key[:-3].strip(), key[-3:])
+
+def to_area(postcode):
+    """Return the area of a postcode (e.g. "OX" for "OX4 1AA").
+
+    Accepts postcodes in any form accepted by to_key. Returns None if the
+    postcode is not valid.
+
+    """
+    key = to_key(postcode)
+    if key is None:
+        return None
+    return re.match(r"[A-Z]*", key).group(0)
+
+def normalise_batch(postcodes):
+    """Normalise and validate a batch of postcodes.
+
+    Returns a PostcodeBatch, giving the key form, display form, validity
+    and components of each postcode.
+
+    Keyword arguments:
+    postcodes - an iterable of postcodes (strings, or None), in any case
+                and with any spacing or punctuation
+
+    """
+    return PostcodeBatch(postcodes)
+
+
+class PostcodeBatch(object):
+    """This class defines the PostcodeBatch class.
+
+    Each attribute is a list with an entry for every postcode of the batch,
+    in the order given, and is only computed when first read:-
+
+        * keys - the key form of each postcode (e.g. "M1  1AA");
+        * display - the display form of each postcode (e.g. "M1 1AA");
+        * valid - True for each valid postcode, and False otherwise; and
+        * area, district and sector - the components of each postcode
+          (e.g. "M", "M1" and "M1 1").
+
+    The entries for postcodes which are not valid are empty strings. Other
+    than valid and area, each attribute is built from the cleaned postcodes
+    one entry at a time.
+
+    """
+    def __init__(self, postcodes):
+        """Initialise PostcodeBatch instance, cleaning and validating."""
+        postcodes = [x or '' for x in postcodes]
+        self.size = len(postcodes)
+        text = BATCH_SEPARATOR.join(postcodes)
+        if text.count(BATCH_SEPARATOR) > max(self.size - 1, 0):
+            #A postcode contains the separator itself, so remove it first.
+            text = BATCH_SEPARATOR.join(
+                    x.replace(BATCH_SEPARATOR, '') for x in postcodes
+                    )
+        #Characters outside ASCII are removed, as by to_key.
+        text = text.encode('ascii', 'ignore').upper().translate(None,
+                                                                BATCH_DELETE)
+        self._text = BATCH_INVALID.sub('', text.decode('ascii'))
+
+    def __len__(self):
+        return self.size
+
+    @cached_property
+    def _compact(self):
+        """The postcodes without spaces, or empty strings if not valid."""
+        if not self.size:
+            return []
+        return self._text.split(BATCH_SEPARATOR)
+
+    @cached_property
+    def keys(self):
+        return [x[:-3].ljust(4) + x[-3:] if x else x for x in self._compact]
+
+    @cached_property
+    def display(self):
+        return [x[:-3] + ' ' + x[-3:] if x else x for x in self._compact]
+
+    @cached_property
+    def valid(self):
+        return list(map(bool, self._compact))
+
+    @cached_property
+    def area(self):
+        if not self.size:
+            return []
+        return BATCH_AFTER_AREA.sub('', self._text).split(BATCH_SEPARATOR)
+
+    @cached_property
+    def district(self):
+        return [x[:-3] for x in self._compact]
+
+    @cached_property
+    def sector(self):
+        return [x[:-2] for x in self.display]
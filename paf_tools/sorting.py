@@ -0,0 +1,128 @@
+"""Sorting module.
+
+Provides an external merge sort, allowing data sets larger than the
+available memory to be sorted.
+
+Items are sorted in runs of a fixed maximum size, and each sorted run is
+written to a temporary file. The runs are then merged as they are read
+back, a block of items at a time from each run.
+
+The number of items held in memory while merging is bounded by the merge
+size: the block size and the number of runs merged at once (the fan-in)
+are both derived from it. Where there are more runs than can be merged at
+once, groups of runs are merged into longer runs on disk, in as many
+passes as needed, before the final merge.
+
+"""
+import heapq
+import pickle
+import tempfile
+from itertools import islice
+
+#Define the default maximum number of items held in memory at once.
+DEFAULT_RUN_SIZE = 500000
+#Define the largest number of items pickled together when writing runs.
+BLOCK_SIZE = 1024
+#Define the smallest number of runs merged at once.
+MIN_FAN_IN = 2
+
+def external_sort(iterable, key=None, run_size=DEFAULT_RUN_SIZE, tmpdir=None,
+                  keep_in_memory=True, merge_size=None):
+    """Sort items using temporary files for intermediate storage.
+
+    Generator function which yields the items of iterable in sorted order.
+    Items must be picklable. The sort is stable. If all items fit within a
+    single run, they are sorted in memory and no temporary file is used, 
+    unless keep_in_memory is False.
+
+    Keyword arguments:
+    iterable - the items to sort
+    key - a function returning the sort key for each item (optional)
+    run_size - the maximum number of items to sort in memory at once
+               (defaults to DEFAULT_RUN_SIZE)
+    tmpdir - the folder in which to create temporary files (defaults to the
+             system temporary folder)
+    keep_in_memory - boolean confirming whether a single run may be kept in 
+                     memory while it is yielded (defaults to True)
+    merge_size - the approximate maximum number of items held in memory 
+                 while merging runs (defaults to run_size)
+
+    """
+    block_size, fan_in = merge_parameters(merge_size or run_size)
+    iterator = iter(iterable)
+    runs = []
+    #Every run file opened, closed once the sort ends.
+    run_files = []
+    try:
+        while True:
+            run = list(islice(iterator, run_size))
+            if not run:
+                break
+            run.sort(key=key)
+            if keep_in_memory and not runs and len(run) < run_size:
+                #Everything fits in memory, so there is nothing to merge.
+                yield from run
+                return
+            runs.append(_write_run(run, tmpdir, block_size))
+            run_files.append(runs[-1])
+            del run
+        #Merge groups of runs into longer runs until they may all be merged
+        #at once. Groups are of consecutive runs, so the sort stays stable.
+        while len(runs) > fan_in:
+            groups = [runs[x:x + fan_in] for x in range(0, len(runs), fan_in)]
+            runs = []
+            for group in groups:
+                runs.append(_write_run(_merge(group, key), tmpdir,
+                                       block_size))
+                run_files.append(runs[-1])
+                for run_file in group:
+                    run_file.close()
+        yield from _merge(runs, key)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+def merge_parameters(merge_size):
+    """Return the block size and fan-in used to merge within merge_size.
+
+    While merging, a block is held for each run being merged, along with 
+    a block being written where runs are merged to disk.
+
+    """
+    block_size = min(BLOCK_SIZE, max(1, merge_size // (MIN_FAN_IN + 1)))
+    fan_in = max(MIN_FAN_IN, merge_size // block_size - 1)
+    return block_size, fan_in
+
+def _merge(runs, key):
+    """Merge sorted run files, yielding their items in order."""
+    return heapq.merge(*[_read_run(x) for x in runs], key=key)
+
+def _write_run(items, tmpdir, block_size=BLOCK_SIZE):
+    """Write sorted items to a temporary file, returning the open file.
+
+    Items are pickled in blocks, which is much faster than pickling each 
+    item separately while holding only one block in memory when read back.
+
+    """
+    run_file = tempfile.TemporaryFile(dir=tmpdir)
+    items = iter(items)
+    while True:
+        block = list(islice(items, block_size))
+        if not block:
+            break
+        pickle.dump(block, run_file, pickle.HIGHEST_PROTOCOL)
+    run_file.seek(0)
+    return run_file
+
+def _read_run(run_file):
+    """Read the items of a sorted run back from its temporary file."""
+    while True:
+        try:
+            block = pickle.load(run_file)
+        except EOFError:
+            return
+        #Yield from a reversed list, dropping each item as it is yielded, so
+        #that only the items not yet yielded are held.
+        block.reverse()
+        while block:
+            yield block.pop()
@@ -43,7 +43,7 @@ VALID_FILETYPES = [
         'THOROUGHFARE_DESCRIPTOR', #'WELSH_ADDRESS'
         ]
 VALID_DATATYPES = [
-        'FILENAME', 'COMPONENTS'
+        'FILENAME', 'COMPONENTS', 'NUMERIC', 'ENCODING'
         ]
 
 ########################
@@ -117,3 +117,32 @@ THOROUGHFARE_DESCRIPTOR_COMPONENTS = [
         20, #Thoroughfare Descriptor
         6,  #Approved Abbreviation
         ]
+
+#############################
+# NUMERIC FIELD DEFINITIONS #
+#############################
+#Indices of the fields of each filetype which contain only digits, and may 
+#therefore be parsed directly into integers.
+ADDRESS_NUMERIC = list(range(1, 12)) #Address Key to Organisation Key
+BUILDING_NAME_NUMERIC = [0]
+LOCALITY_NUMERIC = [0]
+MAILSORT_NUMERIC = [1]
+ORGANISATION_NUMERIC = [0]
+SUB_BUILDING_NAME_NUMERIC = [0]
+THOROUGHFARE_NUMERIC = [0]
+THOROUGHFARE_DESCRIPTOR_NUMERIC = [0]
+
+########################
+# ENCODING DEFINITIONS #
+########################
+#The (encoding, error policy) used to decode the text fields of each 
+#filetype.
+DEFAULT_ENCODING = ("utf-8", "replace")
+ADDRESS_ENCODING = DEFAULT_ENCODING
+BUILDING_NAME_ENCODING = DEFAULT_ENCODING
+LOCALITY_ENCODING = DEFAULT_ENCODING
+MAILSORT_ENCODING = DEFAULT_ENCODING
+ORGANISATION_ENCODING = DEFAULT_ENCODING
+SUB_BUILDING_NAME_ENCODING = DEFAULT_ENCODING
+THOROUGHFARE_ENCODING = DEFAULT_ENCODING
+THOROUGHFARE_DESCRIPTOR_ENCODING = DEFAULT_ENCODING
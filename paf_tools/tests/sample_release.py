@@ -0,0 +1,90 @@
+"""Sample release module.
+
+Writes a tiny PAF Mainfile release to disk for use in tests, laid out in
+the fixed-width format defined in structure.py.
+
+"""
+import os
+from paf_tools.structure import *
+
+LOCALITIES = [
+        ('1', '', '', 'OXFORD', 'COWLEY', ''),
+        ('2', '', '', 'LONDON', '', ''),
+        ]
+THOROUGHFARES = [
+        ('1', 'COWLEY'),
+        ('2', 'DOWNING'),
+        ('3', 'BARTLEMAS'),
+        ]
+THOROUGHFARE_DESCRIPTORS = [
+        ('1', 'ROAD', 'RD'),
+        ('2', 'STREET', 'ST'),
+        ('3', 'CLOSE', 'CL'),
+        ]
+BUILDING_NAMES = [
+        ('1', 'COWLEY HOUSE'),
+        ]
+SUB_BUILDING_NAMES = [
+        ('1', 'FLAT 1'),
+        ]
+ORGANISATIONS = [
+        ('1', 'S', 'ACME WIDGETS', 'SALES', ''),
+        ('1', 'L', 'BIG BANK PLC', '', ''),
+        ]
+MAILSORTS = [
+        ('OX4 1', '12345'),
+        ('SW1A2', '54321'),
+        ]
+#Address entries, split across the address files by filename.
+ADDRESSES = {
+        'fpmainfl.c02': [
+            ('OX4 1AA', '1', '1', '1', '1', '0', '0', '0', '1', '1', '0',
+             '0', 'S', '', '1A', '', ''),
+            ('OX4 1AA', '2', '1', '1', '1', '0', '0', '12', '0', '0', '3',
+             '1', 'S', '', '1B', 'Y', ''),
+            ('OX4 1AB', '3', '1', '1', '1', '3', '3', '14', '0', '0', '0',
+             '0', 'S', '', '1A', '', ''),
+            ],
+        'fpmainfl.c03': [
+            ('SW1A2AA', '4', '2', '2', '2', '0', '0', '10', '0', '0', '0',
+             '1', 'L', '', '1A', '', ''),
+            ],
+        }
+
+def write_sample_release(path):
+    """Write the sample release to the folder at path."""
+    component_data = {
+            'BUILDING_NAME': BUILDING_NAMES,
+            'LOCALITY': LOCALITIES,
+            'MAILSORT': MAILSORTS,
+            'ORGANISATION': ORGANISATIONS,
+            'SUB_BUILDING_NAME': SUB_BUILDING_NAMES,
+            'THOROUGHFARE': THOROUGHFARES,
+            'THOROUGHFARE_DESCRIPTOR': THOROUGHFARE_DESCRIPTORS,
+            }
+    for filetype, entries in component_data.items():
+        _write_file(os.path.join(path, globals()[filetype + "_FILENAME"]),
+                    filetype, entries)
+    for filename in ADDRESS_FILENAME:
+        _write_file(os.path.join(path, filename), 'ADDRESS',
+                    ADDRESSES.get(filename, []))
+    return None
+
+def format_record(filetype, entry):
+    """Format a single entry as a fixed-width line of a component file."""
+    components = globals()[filetype + "_COMPONENTS"]
+    numeric = globals()[filetype + "_NUMERIC"]
+    return ''.join(
+            value.rjust(width, '0') if i in numeric
+            else value.ljust(width)
+            for i, (value, width) in enumerate(zip(entry, components))
+            )
+
+def _write_file(filename, filetype, entries):
+    """Write a component file, including its header and footer records."""
+    width = sum(globals()[filetype + "_COMPONENTS"])
+    with open(filename, 'w') as paf_file:
+        paf_file.write('0' * width + '\n')
+        for entry in entries:
+            paf_file.write(format_record(filetype, entry) + '\n')
+        paf_file.write('9' * width + '\n')
@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release
+from paf_tools.address_store import AddressStore
+from paf_tools.populate.data_store import PAFData
+
+class TestAddressStore(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.addresses = list(PAFData(cls.path))
+        #Use small blocks, so that the postcodes span several blocks.
+        cls.store = AddressStore(reversed(cls.addresses), block_size=2,
+                                 run_size=2)
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.path)
+
+    def test_get(self):
+        assert_equal(len(self.store), 3)
+        assert_equal(self.store.address_count, 4)
+        assert_equal(len(self.store.blocks), 2)
+        assert_equal(sorted(self.store.get('ox41aa'),
+                            key=lambda x: x['address key']),
+                     self.addresses[:2])
+        assert_equal(self.store.get('OX4 1AB'), [self.addresses[2]])
+        assert_equal(self.store.get('SW1A 2AA'), [self.addresses[3]])
+
+    def test_missing(self):
+        assert_equal(self.store.get('OX4 9ZZ'), [])
+        assert_equal(self.store.get('invalid'), [])
+        assert_true('SW1A2AA' in self.store)
+        assert_false('SW1A2AB' in self.store)
+
+    def test_cache(self):
+        self.store.get('SW1A 2AA')
+        hits = self.store.cache_info().hits
+        result = self.store.get('SW1A 2AA')
+        result[0]['post town'] = 'Changed'
+        assert_equal(self.store.cache_info().hits, hits + 1)
+        assert_equal(self.store.get('SW1A 2AA'), [self.addresses[3]])
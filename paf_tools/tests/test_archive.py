@@ -0,0 +1,52 @@
+import os
+import gzip
+import shutil
+import zipfile
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release
+from paf_tools.populate.data_store import PAFData
+from paf_tools.populate.archive import open_paf_file
+
+class TestArchives(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.root = tempfile.mkdtemp()
+        cls.plain = os.path.join(cls.root, 'plain')
+        os.mkdir(cls.plain)
+        write_sample_release(cls.plain)
+        cls.expected = list(PAFData(cls.plain))
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.root)
+
+    def test_zip_archive(self):
+        archive = os.path.join(self.root, 'release.zip')
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as paf_zip:
+            for name in os.listdir(self.plain):
+                paf_zip.write(os.path.join(self.plain, name),
+                              'PAF MAIN FILE/' + name.upper())
+        assert_equal(list(PAFData(archive)), self.expected)
+
+    def test_gzip_folder(self):
+        folder = os.path.join(self.root, 'gzipped')
+        os.mkdir(folder)
+        for name in os.listdir(self.plain):
+            with open(os.path.join(self.plain, name), 'rb') as source:
+                with gzip.open(os.path.join(folder, name + '.gz'), 'wb') as gz:
+                    shutil.copyfileobj(source, gz)
+        assert_equal(list(PAFData(folder)), self.expected)
+
+    def test_large_member(self):
+        archive = os.path.join(self.root, 'large.zip')
+        lines = ['{:088d}\n'.format(x) for x in range(50000)]
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as paf_zip:
+            paf_zip.writestr('fpmainfl.c02', ''.join(lines))
+        with open_paf_file(os.path.join(archive, 'fpmainfl.c02')) as paf_file:
+            assert_equal(paf_file.readlines(), lines)
+
+    @raises(FileNotFoundError)
+    def test_missing_file(self):
+        open_paf_file(os.path.join(self.plain, 'missing.c01'))
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release
+from paf_tools import database
+from paf_tools.database.rebuild import rebuild_database
+from paf_tools.database.cache import QueryCache
+from paf_tools.database.lookup import lookup_many
+from paf_tools.populate.populate import populate_address_data
+
+class TestQueryCache(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        self.release = os.path.join(self.path, 'release')
+        os.mkdir(self.release)
+        write_sample_release(self.release)
+        self.database_path = os.path.join(self.path, 'paf.db')
+        rebuild_database(self.release, self.database_path)
+        self.cache = QueryCache(self.database_path, maxsize=2)
+
+    def teardown_method(self):
+        self.cache.close()
+        shutil.rmtree(self.path)
+
+    def test_hits_and_misses(self):
+        addresses = self.cache.find_postcode("ox41aa")
+        assert_equal([x.address_key for x in addresses], [1, 2])
+        assert_true(addresses[0].label.startswith('Flat 1'))
+        assert_true(self.cache.find_postcode("OX4 1AA") is addresses)
+        assert_equal(self.cache.find_postcode("invalid"), ())
+        info = self.cache.info()
+        assert_equal((info.hits, info.misses, info.size), (1, 1, 1))
+
+    def test_eviction(self):
+        for postcode in ("OX4 1AA", "OX4 1AB", "OX4 1AA", "SW1A 2AA"):
+            self.cache.find_postcode(postcode)
+        info = self.cache.info()
+        assert_equal((info.evictions, info.size), (1, 2))
+        #OX4 1AA was used more recently than OX4 1AB, so is kept.
+        self.cache.find_postcode("OX4 1AA")
+        assert_equal(self.cache.info().hits, 2)
+
+    def test_rebuild_invalidates(self):
+        assert_equal(len(self.cache.find_postcode("SW1A 2AA")), 1)
+        with open(os.path.join(self.release, 'fpmainfl.c03'), 'w') as f:
+            f.write('0' * 88 + '\n' + '9' * 88 + '\n')
+        rebuild_database(self.release, self.database_path)
+        assert_equal(self.cache.find_postcode("SW1A 2AA"), ())
+        assert_equal(self.cache.info().invalidations, 1)
+
+    def test_populate_in_place_invalidates(self):
+        engine = database.create_file_engine(self.database_path)
+        assert_equal(len(self.cache.find_postcode("OX4 1AA")), 2)
+        #Appending the release again doubles the addresses of each postcode.
+        populate_address_data(self.release, erase_existing=False,
+                              engine=engine)
+        assert_equal(len(self.cache.find_postcode("OX4 1AA")), 4)
+        assert_equal(self.cache.info().invalidations, 1)
+        populate_address_data(self.release, engine=engine)
+        assert_equal(len(self.cache.find_postcode("OX4 1AA")), 2)
+        assert_equal(self.cache.info().invalidations, 2)
+        engine.dispose()
+
+    def test_lookup_many(self):
+        rows = [{'postcode': x} for x in ("ox41aa", "SW1A 2AA", "OX4 1AA",
+                                          "invalid", "M1 1AA")]
+        results = [(row['postcode'], address and address['building_number'])
+                   for row, address in lookup_many(rows, cache=self.cache)]
+        assert_equal(results, [('invalid', None), ('M1 1AA', None),
+                               ('ox41aa', None), ('ox41aa', 12),
+                               ('OX4 1AA', None), ('OX4 1AA', 12),
+                               ('SW1A 2AA', 10)])
+        info = self.cache.info()
+        assert_equal((info.hits, info.misses), (0, 3))
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release
+from paf_tools.columnar import (ColumnarFile, write_columnar_file,
+                                FILE_MAGIC)
+from paf_tools.populate.data_store import PAFData
+
+class TestColumnar(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.addresses = list(PAFData(cls.path))
+        cls.filename = os.path.join(cls.path, 'release.col')
+        #Write in reverse, to check that rows are put in postcode order.
+        cls.count = write_columnar_file(reversed(cls.addresses),
+                                        cls.filename, run_size=2)
+        cls.columnar = ColumnarFile(cls.filename)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.columnar.close()
+        shutil.rmtree(cls.path)
+
+    def test_rows(self):
+        assert_equal(self.count, 4)
+        assert_equal(len(self.columnar), 4)
+        rows = sorted(self.columnar, key=lambda x: x['address key'])
+        assert_equal(rows, self.addresses)
+
+    def test_columns(self):
+        postcodes = self.columnar.column('postcode')
+        assert_equal([postcodes[x] for x in range(len(postcodes))],
+                     [b'OX4 1AA', b'OX4 1AA', b'OX4 1AB', b'SW1A2AA'])
+        keys = self.columnar.column('address key')
+        assert_equal(keys.tolist(), [2, 1, 3, 4])
+        towns = self.columnar.column('post town')
+        assert_equal(self.columnar.string(towns[3]), 'London')
+
+    def test_find_postcode(self):
+        assert_equal(self.columnar.postcode_range('ox41aa'), range(0, 2))
+        rows = self.columnar.find_postcode('SW1A 2AA')
+        assert_equal(rows, [self.addresses[3]])
+        assert_equal(self.columnar.find_postcode('OX4 9ZZ'), [])
+        assert_equal(self.columnar.find_postcode('invalid'), [])
+
+    def test_old_version(self):
+        filename = os.path.join(self.path, 'old.col')
+        with open(self.filename, 'rb') as columnar_file:
+            data = columnar_file.read()
+        with open(filename, 'wb') as columnar_file:
+            columnar_file.write(b"PAFCOL01" + data[len(FILE_MAGIC):])
+        assert_raises(ValueError, ColumnarFile, filename)
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy import create_engine
+from sample_release import (write_sample_release, format_record, LOCALITIES,
+                            _write_file)
+from paf_tools.structure import LOCALITY_FILENAME
+from paf_tools.populate.data_store import PAFData
+from paf_tools.populate.files_parser import PAFReader
+from paf_tools.populate.external import ExternalPAFData
+from paf_tools.populate.organisations import OrganisationIndex
+from paf_tools.populate.populate import populate_address_data
+
+class TestOrganisationIndex(object):
+
+    def setup_method(self):
+        self.index = OrganisationIndex([
+            ('00000001', 'S', 'SMALL CO', 'SALES', ''),
+            ('00000001', 'L', 'LARGE CO', '', ''),
+            ('00000002', 'S', 'OLD NAME', '', ''),
+            ('00000002', 'S', 'NEW NAME', '', ''),
+            ])
+
+    def test_composite_keys(self):
+        assert_equal(self.index.get('00000001', 'S'), ('SMALL CO', 'SALES'))
+        assert_equal(self.index.get('00000001', 'L'), ('LARGE CO', ''))
+        assert_equal(len(self.index), 3)
+
+    def test_last_entry_retained(self):
+        assert_equal(self.index.get('00000002', 'S'), ('NEW NAME', ''))
+
+    def test_missing(self):
+        assert_equal(self.index.get('00000002', 'L'), ('', ''))
+        assert_equal(self.index.get('00000000', ''), ('', ''))
+        assert_true(('00000001', 'L') in self.index)
+        assert_false(('00000003', 'S') in self.index)
+
+
+class TestPAFData(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.addresses = list(PAFData(cls.path))
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.path)
+
+    def test_flatten(self):
+        assert_equal(len(self.addresses), 4)
+        address = self.addresses[0]
+        assert_equal(address['postcode'], 'OX4 1AA')
+        assert_equal(address['building name'], 'Cowley House')
+        assert_equal(address['sub-building name'], 'Flat 1')
+        assert_equal(address['thoroughfare'], 'Cowley Road')
+        assert_equal(address['post town'], 'Oxford')
+        assert_equal(address['dependent locality'], 'Cowley')
+        assert_equal(address['building number'], None)
+        assert_equal(address['address key'], 1)
+        assert_equal(address['delivery point suffix'], '1A')
+
+    def test_organisation_postcode_type(self):
+        assert_equal(self.addresses[1]['organisation name'], 'Acme Widgets')
+        assert_equal(self.addresses[1]['department name'], 'Sales')
+        assert_equal(self.addresses[3]['organisation name'], 'Big Bank Plc')
+        assert_equal(self.addresses[3]['department name'], '')
+        assert_equal(self.addresses[3]['organisation key'], 1)
+        assert_equal(self.addresses[3]['postcode type'], 'L')
+
+    def test_binary_mode(self):
+        assert_equal(list(PAFData(self.path, binary=True)), self.addresses)
+
+    def test_concurrent_loading(self):
+        for binary in (False, True):
+            sequential = PAFData(self.path, binary=binary, workers=0)
+            concurrent = PAFData(self.path, binary=binary, workers=2)
+            assert_equal(list(concurrent), self.addresses)
+            assert_equal(concurrent.paf_data['MAILSORT'],
+                         sequential.paf_data['MAILSORT'])
+            assert_equal(concurrent.paf_data['LOCALITY'],
+                         sequential.paf_data['LOCALITY'])
+
+    def test_binary_reader(self):
+        reader = PAFReader(self.path, 'address', binary=True)
+        entry = next(iter(reader))
+        assert_equal(entry[:4], (b'OX4 1AA', 1, 1, 1))
+        assert_equal(reader.decode(entry[0]), 'OX4 1AA')
+        assert_equal(entry[12], b'S')
+
+    def test_binary_reader_non_digits(self):
+        reader = PAFReader(self.path, 'address', binary=True)
+        line = format_record('ADDRESS', (
+            'OX4 1AA', '1', '1', '1', '1', '0', '0', '0', '1', '1', '0',
+            '0', 'S', '', '1A', '', '')).encode()
+        assert_equal(reader._parse_binary_line(line)[1], 1)
+        #int would accept each of these keys, which are not all digits.
+        for key in (b' -000012', b'+0000005', b'0000_010'):
+            entry = reader._parse_binary_line(line[:7] + key + line[15:])
+            assert_equal(entry[1], key.strip())
+            assert_equal(entry[2], 1)
+
+    def test_external_sort_merge(self):
+        data = ExternalPAFData(self.path)
+        #Force the joins to use several runs each.
+        data.run_size = 2
+        data.merge_size = 3
+        assert_equal(list(data), self.addresses)
+
+
+class TestDuplicateKeys(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        write_sample_release(self.path)
+        #Repeat the first locality key, with another post town.
+        _write_file(os.path.join(self.path, LOCALITY_FILENAME), 'LOCALITY',
+                    LOCALITIES + [('1', '', '', 'HEADINGTON', '', '')])
+
+    def teardown_method(self):
+        shutil.rmtree(self.path)
+
+    def test_last_entry_used(self):
+        addresses = list(PAFData(self.path, workers=0))
+        assert_equal(addresses[0]['post town'], 'Headington')
+        data = ExternalPAFData(self.path)
+        data.run_size = 2
+        data.merge_size = 3
+        assert_equal(list(data), addresses)
+
+    def test_populate_tmpdir(self):
+        #The temporary files of a memory limited build go to tmpdir.
+        missing = os.path.join(self.path, 'missing')
+        assert_raises(FileNotFoundError, populate_address_data, self.path,
+                      memory_limit=1, tmpdir=missing,
+                      engine=create_engine('sqlite://'))
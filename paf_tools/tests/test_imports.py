@@ -0,0 +1,31 @@
+import sys
+import subprocess
+from nose.tools import *
+
+#Modules which must be importable without SQLAlchemy.
+LIGHTWEIGHT_MODULES = [
+        'paf_tools.structure',
+        'paf_tools.formatting',
+        'paf_tools.postcode',
+        'paf_tools.populate.files_parser',
+        'paf_tools.populate.data_store',
+        'paf_tools.populate.populate',
+        'paf_tools.populate.validate',
+        ]
+
+class TestImports(object):
+
+    def test_no_sqlalchemy(self):
+        code = ("import sys\n" +
+                ''.join("import {}\n".format(x) for x in LIGHTWEIGHT_MODULES) +
+                "print('sqlalchemy' in sys.modules)")
+        output = subprocess.check_output([sys.executable, '-c', code])
+        assert_equal(output.strip(), b'False')
+
+    def test_lazy_engine(self):
+        from paf_tools import database
+        from paf_tools.database.operations import format_address
+        from paf_tools.formatting import format_address as formatter
+        assert_true(format_address is formatter)
+        assert_true(database.engine is database.get_engine())
+        assert_raises(AttributeError, getattr, database, 'missing')
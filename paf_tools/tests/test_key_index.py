@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release
+from paf_tools.populate.data_store import PAFData
+from paf_tools.populate.key_index import KeyIndex, build_key_index
+
+class TestKeyIndex(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.counts = build_key_index(cls.path)
+        cls.addresses = list(PAFData(cls.path))
+        cls.index = KeyIndex(cls.path)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.index.close()
+        shutil.rmtree(cls.path)
+
+    def test_counts(self):
+        assert_equal(self.counts['ADDRESS'], 4)
+        assert_equal(self.counts['ORGANISATION'], 2)
+        assert_false('MAILSORT' in self.counts)
+        assert_false(os.path.exists(os.path.join(self.path, 'mailsort.idx')))
+
+    def test_fetch(self):
+        for address in self.addresses:
+            assert_equal(self.index.fetch(address['address key']), address)
+
+    def test_fetch_raw(self):
+        entry = self.index.fetch_raw('thoroughfare', 2)
+        assert_equal(entry, (2, b'DOWNING'))
+        assert_raises(ValueError, self.index.fetch_raw, 'mailsort', 1)
+
+    def test_missing(self):
+        assert_raises(KeyError, self.index.fetch, 5)
+        assert_true(4 in self.index)
+        assert_false(0 in self.index)
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy.orm import sessionmaker
+from sample_release import write_sample_release
+from paf_tools import database
+from paf_tools.formatting import format_label
+from paf_tools.populate.data_store import PAFData
+from paf_tools.database.operations import check_labels
+from paf_tools.database.rebuild import rebuild_database
+from paf_tools.database.tables import Address
+
+class TestLabels(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.addresses = list(PAFData(cls.path))
+        cls.database_path = os.path.join(cls.path, 'paf.db')
+        rebuild_database(cls.path, cls.database_path, validate=False,
+                         labels=True)
+        cls.engine = database.create_file_engine(cls.database_path)
+        cls.session = sessionmaker(bind=cls.engine)()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.session.close()
+        cls.engine.dispose()
+        shutil.rmtree(cls.path)
+
+    def test_format_label(self):
+        for address in self.addresses:
+            assert_equal(format_label(address),
+                         Address(**address).format_label())
+
+    def test_stored_labels(self):
+        addresses = self.session.query(Address).order_by(Address.id).all()
+        assert_equal([x.label for x in addresses],
+                     [format_label(x) for x in self.addresses])
+        assert_equal(str(addresses[1]), addresses[1].label)
+        assert_equal(check_labels(self.session), [])
+
+    def test_check_labels(self):
+        address = self.session.query(Address).first()
+        address.label = 'Stale label'
+        self.session.flush()
+        mismatches = check_labels(self.session)
+        self.session.rollback()
+        assert_equal(len(mismatches), 1)
+        assert_equal(mismatches[0][:2], (address.address_key, 'Stale label'))
@@ -0,0 +1,73 @@
+import io
+from nose.tools import *
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from paf_tools.database import Base
+from paf_tools.database.tables import Address
+from paf_tools.database.lookup import (find_by_organisation, lookup_many,
+                                       write_lookup_csv, LOOKUP_COLUMNS)
+
+class TestLookup(object):
+
+    def setup_method(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            Address(**{'organisation name': 'Acme Widgets',
+                       'department name': 'Sales',
+                       'postcode': 'OX4 1AB'}),
+            Address(**{'organisation name': 'Acme Widgets',
+                       'postcode': 'OX4 1AA'}),
+            Address(**{'organisation name': 'Big Bank Plc',
+                       'postcode': 'SW1A2AA'}),
+            ])
+        self.session.flush()
+
+    def test_find_by_organisation(self):
+        results = find_by_organisation("ACME widgets", session=self.session)
+        assert_equal([x.postcode for x in results], ['OX4 1AA', 'OX4 1AB'])
+
+    def test_find_by_department(self):
+        results = find_by_organisation("Acme Widgets", "sales",
+                                       session=self.session)
+        assert_equal([x.postcode for x in results], ['OX4 1AB'])
+
+
+class TestLookupMany(object):
+
+    def setup_method(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            Address(**{'building number': 1, 'postcode': 'OX4 1AA'}),
+            Address(**{'building number': 2, 'postcode': 'OX4 1AA'}),
+            Address(**{'building number': 3, 'postcode': 'OX4 1AB'}),
+            Address(**{'building number': 4, 'postcode': 'M1  1AA'}),
+            Address(**{'building number': 5, 'postcode': 'SW1A2AA'}),
+            ])
+        self.session.flush()
+        self.rows = [{'id': str(x), 'postcode': postcode} for x, postcode in
+                     enumerate(['ox41ab', 'SW1A 2AA', 'not a postcode',
+                                'm1 1aa', 'OX4-1AA', 'OX4 1AZ', 'ox4 1ab'])]
+
+    def test_lookup_many(self):
+        results = [(row['id'], address['building_number'] if address else None)
+                   for row, address in lookup_many(self.rows,
+                                                   session=self.session,
+                                                   run_size=2)]
+        assert_equal(results, [('2', None), ('3', 4), ('4', 1), ('4', 2),
+                               ('0', 3), ('6', 3), ('5', None), ('1', 5)])
+
+    def test_write_lookup_csv(self):
+        input_file = io.StringIO("id,postcode\n1,SW1A2AA\n2,XX\n")
+        output_file = io.StringIO()
+        assert_equal(write_lookup_csv(input_file, output_file,
+                                      session=self.session), 2)
+        lines = output_file.getvalue().splitlines()
+        assert_equal(lines[0].split(',')[:3], ['id', 'postcode',
+                                               'paf_organisation'])
+        assert_equal(lines[1], '2,XX' + ',' * len(LOOKUP_COLUMNS))
+        assert_true(lines[2].startswith('1,SW1A2AA,'))
+        assert_true(lines[2].endswith(',5,,,,,,SW1A2AA'))
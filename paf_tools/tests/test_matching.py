@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from paf_tools.database import Base
+from paf_tools.database.tables import Address
+from paf_tools.database.matching import AddressMatcher, match_many, tokenise
+
+ADDRESSES = [
+        {'address key': 1, 'building number': 10,
+         'thoroughfare': 'Downing Street', 'post town': 'London',
+         'postcode': 'SW1A2AA'},
+        {'address key': 2, 'building number': 11,
+         'thoroughfare': 'Downing Street', 'post town': 'London',
+         'postcode': 'SW1A2AA'},
+        {'address key': 3, 'building name': 'Cowley House',
+         'sub-building name': 'Flat 2', 'thoroughfare': 'Cowley Road',
+         'post town': 'Oxford', 'postcode': 'OX4 1AA'},
+        {'address key': 4, 'building name': 'Cowley House',
+         'thoroughfare': 'Cowley Road', 'post town': 'Oxford',
+         'postcode': 'OX4 1AA'},
+        ]
+
+class TestMatching(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.database_path = os.path.join(cls.folder, 'test.db')
+        engine = create_engine('sqlite:///{}'.format(cls.database_path))
+        Base.metadata.create_all(engine)
+        cls.session = sessionmaker(bind=engine)()
+        cls.session.add_all([Address(**x) for x in ADDRESSES])
+        cls.session.commit()
+        cls.matcher = AddressMatcher(cls.session)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.session.close()
+        shutil.rmtree(cls.folder)
+
+    def test_tokenise(self):
+        assert_equal(tokenise("Flat 2a, 10-12 Cowley Rd"),
+                     ['FLAT', '2A', '10', '12', 'COWLEY', 'ROAD'])
+
+    def test_match_number(self):
+        match = self.matcher.match("11 downing st, london sw1a 2aa")
+        assert_equal(match.address_key, 2)
+        assert_equal(match.confidence, 1.0)
+        assert_equal(match.label, "11 Downing Street, London, SW1A 2AA")
+
+    def test_match_most_specific(self):
+        assert_equal(self.matcher.match(
+            "Flat 2, Cowley House, Cowley Road, Oxford OX41AA").address_key, 3)
+        assert_equal(self.matcher.match(
+            "Cowley House, Cowley Road, Oxford OX41AA").address_key, 4)
+
+    def test_match_sector(self):
+        match = self.matcher.match("10 Downing Street SW1A 2AB")
+        assert_equal(match.address_key, 1)
+        assert_true(match.confidence < 1.0)
+
+    def test_no_match(self):
+        assert_equal(self.matcher.match("10 Downing Street").address_key, None)
+        assert_equal(self.matcher.match("99 Nowhere Lane SW1A 2AA").address_key,
+                     None)
+
+    def test_match_many(self):
+        addresses = ["10 Downing Street SW1A2AA", "no address",
+                     "11 Downing St SW1A 2AA"] * 5
+        keys = [x.address_key for x in match_many(
+            addresses, workers=2, database_path=self.database_path,
+            chunk_size=2)]
+        assert_equal(keys, [1, None, 2] * 5)
@@ -0,0 +1,43 @@
+from nose.tools import *
+from paf_tools.postcode import to_key, to_display, to_area, normalise_batch
+
+class TestPostcode(object):
+
+    def test_to_key(self):
+        assert_equal(to_key("ox41aa"), "OX4 1AA")
+        assert_equal(to_key("OX4  1AA"), "OX4 1AA")
+        assert_equal(to_key("Ox4-1aa"), "OX4 1AA")
+        assert_equal(to_key("m1 1aa"), "M1  1AA")
+        assert_equal(to_key("SW1A 2AA"), "SW1A2AA")
+
+    def test_invalid(self):
+        assert_equal(to_key(""), None)
+        assert_equal(to_key("OX4"), None)
+        assert_equal(to_key("1X4 1AA"), None)
+
+    def test_to_display(self):
+        assert_equal(to_display("M1  1AA"), "M1 1AA")
+        assert_equal(to_display("SW1A2AA"), "SW1A 2AA")
+
+    def test_to_area(self):
+        assert_equal(to_area("ox4 1aa"), "OX")
+        assert_equal(to_area("M1  1AA"), "M")
+        assert_equal(to_area("OX4"), None)
+
+    def test_normalise_batch(self):
+        postcodes = ["ox41aa", "OX4  1AA", "Ox4-1aa", "m1 1aa", "SW1A 2AA",
+                     "1X4 1AA", "OX41AAX", "", None, "OX4\n1AA"]
+        batch = normalise_batch(postcodes)
+        assert_equal(len(batch), 10)
+        assert_equal(batch.keys, [to_key(x or '') or '' for x in
+                                  postcodes[:-1]] + ["OX4 1AA"])
+        assert_equal(batch.valid, [True] * 5 + [False] * 4 + [True])
+        assert_equal(batch.display[3:6], ["M1 1AA", "SW1A 2AA", ""])
+        assert_equal(batch.area[3:6], ["M", "SW", ""])
+        assert_equal(batch.district[3:6], ["M1", "SW1A", ""])
+        assert_equal(batch.sector[3:6], ["M1 1", "SW1A 2", ""])
+
+    def test_normalise_empty_batch(self):
+        batch = normalise_batch([])
+        assert_equal(batch.keys, [])
+        assert_equal(batch.area, [])
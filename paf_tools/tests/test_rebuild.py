@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker
+from sample_release import write_sample_release
+from paf_tools import database
+from paf_tools.database.rebuild import rebuild_database, RebuildError
+from paf_tools.database.tables import Address
+
+class TestRebuild(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        self.release = os.path.join(self.path, 'release')
+        os.mkdir(self.release)
+        write_sample_release(self.release)
+        self.database_path = os.path.join(self.path, 'paf.db')
+
+    def teardown_method(self):
+        shutil.rmtree(self.path)
+
+    def test_rebuild_switches_readers(self):
+        assert_equal(rebuild_database(self.release, self.database_path), 4)
+        engine = database.create_file_engine(self.database_path)
+        session = sessionmaker(bind=engine)()
+        assert_equal(session.query(Address).count(), 4)
+        session.commit()
+        #Load a smaller release, while the reader remains open.
+        with open(os.path.join(self.release, 'fpmainfl.c03'), 'w') as f:
+            f.write('0' * 88 + '\n' + '9' * 88 + '\n')
+        assert_equal(rebuild_database(self.release, self.database_path), 3)
+        assert_equal(session.query(Address).count(), 3)
+        session.close()
+        indexes = inspect(engine).get_indexes(Address.__tablename__)
+        assert_true(any(x['column_names'] == ['postcode'] for x in indexes))
+        assert_false(os.path.exists(self.database_path + '.building'))
+        engine.dispose()
+
+    def test_invalid_release(self):
+        with open(os.path.join(self.release, 'local.c01'), 'w') as f:
+            f.write('')
+        assert_raises(RebuildError, rebuild_database, self.release,
+                      self.database_path)
+        assert_false(os.path.exists(self.database_path))
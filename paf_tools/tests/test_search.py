@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sample_release import write_sample_release
+from paf_tools.database import Base
+from paf_tools.database.tables import Address
+from paf_tools.database.search import (create_search_index, index_addresses,
+                                       search_addresses)
+from paf_tools.populate.populate import populate_address_data
+
+class TestSearch(object):
+
+    def setup_method(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all([
+            Address(**{'building number': 10,
+                       'thoroughfare': 'Downing Street',
+                       'post town': 'London',
+                       'postcode': 'SW1A2AA'}),
+            Address(**{'building name': 'Cowley House',
+                       'thoroughfare': 'Cowley Road',
+                       'post town': 'Oxford',
+                       'postcode': 'OX4 1AA'}),
+            Address(**{'organisation name': 'Acme Widgets',
+                       'thoroughfare': 'Cowley Road',
+                       'post town': 'Oxford',
+                       'postcode': 'OX4 1AB'}),
+            ])
+        self.session.flush()
+        create_search_index(self.session)
+        assert_equal(index_addresses(self.session), 3)
+
+    def test_search_by_words(self):
+        results = search_addresses("downing street", session=self.session)
+        assert_equal([x.postcode for x in results], ['SW1A2AA'])
+
+    def test_search_prefix(self):
+        results = search_addresses("cowley house ox", session=self.session)
+        assert_equal([x.building_name for x in results], ['Cowley House'])
+
+    def test_search_postcode_forms(self):
+        for query in ("OX4 1AB", "ox41ab"):
+            results = search_addresses(query, session=self.session)
+            assert_equal([x.organisation for x in results], ['Acme Widgets'])
+
+    def test_search_organisation_without_department(self):
+        self.session.add(Address(**{'organisation name': 'Big Bank Plc',
+                                    'department name': None,
+                                    'post town': 'London',
+                                    'postcode': 'SW1A2AB'}))
+        self.session.flush()
+        index_addresses(self.session, 3)
+        results = search_addresses("big bank", session=self.session)
+        assert_equal([x.postcode for x in results], ['SW1A2AB'])
+
+    def test_search_incremental(self):
+        self.session.add(Address(**{'thoroughfare': 'Cowley Road',
+                                    'post town': 'Oxford',
+                                    'postcode': 'OX4 1AD'}))
+        self.session.flush()
+        assert_equal(index_addresses(self.session, 3), 4)
+        results = search_addresses("cowley road", session=self.session)
+        assert_equal(len(results), 3)
+
+    def test_search_empty(self):
+        assert_equal(search_addresses("  ", session=self.session), [])
+
+
+class TestPopulateSearch(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        write_sample_release(self.path)
+        self.engine = create_engine('sqlite:///{}'.format(
+                os.path.join(self.path, 'paf.db')))
+        populate_address_data(self.path, search_index=True,
+                              engine=self.engine)
+
+    def teardown_method(self):
+        self.engine.dispose()
+        shutil.rmtree(self.path)
+
+    def test_existing_index_extended(self):
+        populate_address_data(self.path, erase_existing=False,
+                              engine=self.engine)
+        session = sessionmaker(bind=self.engine)()
+        results = search_addresses("downing street", session=session)
+        assert_equal(sorted(x.id for x in results), [4, 8])
+        session.close()
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy.orm import sessionmaker
+from sample_release import write_sample_release
+from paf_tools import database
+from paf_tools.database.sharding import (build_shards, merge_shards,
+                                         read_manifest, ShardRouter,
+                                         COLUMN_FIELDS, _ShardWriter,
+                                         _assign_areas)
+from paf_tools.database.rebuild import RebuildError
+from paf_tools.database.tables import Address
+from paf_tools.populate.data_store import PAFData
+from paf_tools.populate.populate import populate_address_data
+
+class TestSharding(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        self.release = os.path.join(self.path, 'release')
+        os.mkdir(self.release)
+        write_sample_release(self.release)
+        self.shard_path = os.path.join(self.path, 'shards')
+
+    def teardown_method(self):
+        shutil.rmtree(self.path)
+
+    def test_build_in_workers(self):
+        assert_equal(build_shards(self.release, self.shard_path, workers=2),
+                     4)
+        manifest = read_manifest(self.shard_path)
+        assert_equal(sorted(manifest['shards']), ['OX', 'SW'])
+        assert_equal(manifest['shards']['OX']['addresses'], 3)
+        assert_equal(manifest['shards']['SW']['addresses'], 1)
+
+    def test_build_with_memory_limit(self):
+        assert_equal(build_shards(self.release, self.shard_path,
+                                  memory_limit=1 << 20), 4)
+        manifest = read_manifest(self.shard_path)
+        assert_equal(manifest['shards']['OX']['addresses'], 3)
+        assert_raises(ValueError, build_shards, self.release,
+                      self.shard_path, workers=2, memory_limit=1 << 20)
+
+    def test_shards_match_flattened_data(self):
+        build_shards(self.release, self.shard_path, workers=2, labels=True)
+        with ShardRouter(self.shard_path) as router:
+            addresses = {x.address_key: x for postcode in
+                         ("OX4 1AA", "OX4 1AB", "SW1A 2AA")
+                         for x in router.find_postcode(postcode)}
+        for row in PAFData(self.release, workers=0):
+            address = addresses[row['address key']]
+            for column, field in COLUMN_FIELDS.items():
+                if field != 'label':
+                    assert_equal(getattr(address, column), row[field])
+            assert_equal(str(address), Address(**row).format_label())
+
+    def test_column_fields(self):
+        assert_equal(set(COLUMN_FIELDS),
+                     {x.name for x in Address.__table__.columns} - {'id'})
+
+    def test_row_budget(self):
+        os.mkdir(self.shard_path)
+        writer = _ShardWriter(self.shard_path, row_budget=3)
+        rows = list(PAFData(self.release, workers=0))
+        for address_id, row in enumerate(rows[:2], 1):
+            writer.add(address_id, 'OX', row)
+        assert_equal(writer.buffered, 2)
+        assert_equal(writer.counts, {})
+        #The budget is shared by every area, so a row of another area
+        #flushes both.
+        writer.add(4, 'SW', rows[3])
+        assert_equal(writer.buffered, 0)
+        assert_equal(writer.pending, {})
+        assert_equal(writer.counts, {'OX': 2, 'SW': 1})
+        writer.add(3, 'OX', rows[2])
+        assert_equal(writer.finish(), {'OX': 3, 'SW': 1})
+
+    def test_assign_areas(self):
+        assignments = _assign_areas({'B': 5, 'OX': 3, 'SW': 4, 'M': 1}, 2)
+        assert_equal(sorted(map(sorted, assignments)),
+                     [['B', 'M'], ['OX', 'SW']])
+        assert_equal(_assign_areas({'OX': 3}, 4), [{'OX'}])
+
+    def test_router(self):
+        build_shards(self.release, self.shard_path, workers=0, labels=True)
+        with ShardRouter(self.shard_path) as router:
+            assert_equal(router.areas, ['OX', 'SW'])
+            addresses = router.find_postcode("ox41aa")
+            assert_equal([x.address_key for x in addresses], [1, 2])
+            assert_equal(str(addresses[0]), addresses[0].format_label())
+            assert_equal(len(router.find_postcode("SW1A 2AA")), 1)
+            assert_equal(router.find_postcode("M1 1AA"), [])
+            assert_equal(router.find_postcode("invalid"), [])
+            assert_equal(router.session("M1 1AA"), None)
+
+    def test_merge(self):
+        build_shards(self.release, self.shard_path, workers=0)
+        database_path = os.path.join(self.path, 'paf.db')
+        assert_equal(merge_shards(self.shard_path, database_path), 4)
+        engine = database.create_file_engine(database_path)
+        session = sessionmaker(bind=engine)()
+        assert_equal(sorted(x.address_key for x in session.query(Address)),
+                     [1, 2, 3, 4])
+        session.close()
+        engine.dispose()
+
+    def test_merge_keeps_load_order(self):
+        #Put the SW address before the OX addresses in the release.
+        first, second = (os.path.join(self.release, x)
+                         for x in ('fpmainfl.c02', 'fpmainfl.c03'))
+        os.rename(first, first + '.tmp')
+        os.rename(second, first)
+        os.rename(first + '.tmp', second)
+        database_path = os.path.join(self.path, 'paf.db')
+        engine = database.create_file_engine(
+                os.path.join(self.path, 'populated.db'))
+        populate_address_data(self.release, engine=engine)
+        session = sessionmaker(bind=engine)()
+        expected = [(x.id, x.address_key) for x in
+                    session.query(Address).order_by(Address.id)]
+        assert_equal(expected, [(1, 4), (2, 1), (3, 2), (4, 3)])
+        session.close()
+        engine.dispose()
+        for workers in (0, 2):
+            build_shards(self.release, self.shard_path, workers=workers)
+            merge_shards(self.shard_path, database_path)
+            engine = database.create_file_engine(database_path)
+            session = sessionmaker(bind=engine)()
+            assert_equal([(x.id, x.address_key) for x in
+                          session.query(Address).order_by(Address.id)],
+                         expected)
+            session.close()
+            engine.dispose()
+
+    def test_missing_manifest(self):
+        assert_raises(RebuildError, ShardRouter, self.shard_path)
@@ -0,0 +1,61 @@
+import random
+from nose.tools import *
+from paf_tools.sorting import external_sort, merge_parameters
+
+class Tracked(object):
+    """An item which counts the instances of its class alive at once."""
+    live = 0
+
+    def __init__(self, value):
+        self.value = value
+        Tracked.live += 1
+
+    def __del__(self):
+        Tracked.live -= 1
+
+    def __reduce__(self):
+        return (Tracked, (self.value,))
+
+
+class TestExternalSort(object):
+
+    def test_shared_objects(self):
+        #Items sharing objects must survive the round trip through the
+        #temporary files unchanged.
+        shared = ('a', 'b')
+        items = [(random.randint(0, 100), shared, [shared], x)
+                 for x in range(5000)]
+        result = list(external_sort(items, key=lambda x: x[0], run_size=70))
+        assert_equal(result, sorted(items, key=lambda x: x[0]))
+
+    def test_sort_in_runs(self):
+        shared = ('a', 'b')
+        items = [(random.randint(0, 100), shared, x) for x in range(5000)]
+        result = list(external_sort(items, key=lambda x: x[0], run_size=70))
+        assert_equal(result, sorted(items, key=lambda x: x[0]))
+
+    def test_sort_in_memory(self):
+        assert_equal(list(external_sort([3, 1, 2])), [1, 2, 3])
+        assert_equal(list(external_sort([3, 1, 2], keep_in_memory=False)),
+                     [1, 2, 3])
+        assert_equal(list(external_sort([])), [])
+
+    def test_merge_memory_bounded(self):
+        random.seed(1)
+        values = [random.randint(0, 10000) for _ in range(2000)]
+        items = (Tracked(x) for x in values)
+        merge_size = 20
+        block_size, fan_in = merge_parameters(merge_size)
+        #There are 40 runs, so several passes are needed to merge them.
+        assert_true(2000 // 50 > fan_in)
+        result, peak = [], 0
+        for item in external_sort(items, key=lambda x: x.value, run_size=50,
+                                  merge_size=merge_size):
+            #Only the items held by the merge are alive at this point.
+            peak = max(peak, Tracked.live)
+            result.append(item.value)
+            del item
+        assert_equal(result, sorted(values))
+        #A block for each run merged, and the item being yielded.
+        assert_true(peak <= fan_in * block_size + 1)
+        assert_true(fan_in * block_size < merge_size)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import zipfile
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release, LOCALITIES, _write_file
+from paf_tools.structure import LOCALITY_FILENAME
+from paf_tools.populate.statistics import (Counts, compute_statistics,
+                                           load_statistics, CACHE_FILENAME)
+
+class TestStatistics(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.statistics = compute_statistics(cls.path, workers=2)
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.path)
+
+    def test_levels(self):
+        get = self.statistics.get
+        assert_equal(get('unit', 'ox41aa'), Counts(2, 4))
+        assert_equal(get('unit', 'OX4 1AB'), Counts(1, 1))
+        assert_equal(get('sector', 'OX4 1'), Counts(3, 5))
+        assert_equal(get('district', 'ox4'), Counts(3, 5))
+        assert_equal(get('area', 'SW'), Counts(1, 1))
+        assert_equal(get('post town', 'OXFORD'), Counts(3, 5))
+        assert_equal(get('post town', 'oxford, ox'), Counts(3, 5))
+        assert_equal(get('post town', 'Oxford, SW'), Counts(0, 0))
+        assert_equal(get('unit', 'OX4 9ZZ'), Counts(0, 0))
+        assert_raises(ValueError, get, 'county', 'Oxfordshire')
+
+    def test_summary(self):
+        summary = self.statistics.summary('SW1A 2AA')
+        assert_equal(summary['district'], Counts(1, 1))
+        assert_equal(summary['unit'], Counts(1, 1))
+        assert_equal(self.statistics.summary('not a postcode'), None)
+        assert_equal(self.statistics.top('area', 1), [('OX', Counts(3, 5))])
+        assert_equal(self.statistics.top('post town'),
+                     [('Oxford, OX', Counts(3, 5)),
+                      ('London, SW', Counts(1, 1))])
+
+    def test_cache(self):
+        #The release is changed, so a copy is used.
+        path = os.path.join(self.path, 'copy')
+        os.mkdir(path)
+        write_sample_release(path)
+        statistics = load_statistics(path, workers=1)
+        assert_true(os.path.exists(os.path.join(path, CACHE_FILENAME)))
+        assert_equal(statistics.levels, self.statistics.levels)
+        #A changed release invalidates the cache.
+        with open(os.path.join(path, 'fpmainfl.c06'), 'a') as paf_file:
+            paf_file.write('\n')
+        assert_not_equal(load_statistics(path).signature,
+                         statistics.signature)
+
+    def test_archive(self):
+        archive = os.path.join(self.path, 'archive', 'release.zip')
+        os.mkdir(os.path.dirname(archive))
+        with zipfile.ZipFile(archive, 'w') as paf_zip:
+            for name in os.listdir(self.path):
+                if name.startswith(('fpmainfl', 'local')):
+                    paf_zip.write(os.path.join(self.path, name), name)
+        statistics = load_statistics(archive, workers=1)
+        assert_equal(statistics.get('area', 'OX'), Counts(3, 5))
+        assert_true(os.path.exists(os.path.join(
+                os.path.dirname(archive), 'release-' + CACHE_FILENAME)))
+        assert_equal(load_statistics(archive).signature, statistics.signature)
+
+    def test_unwritable_cache(self):
+        cache_file = os.path.join(self.path, 'missing', CACHE_FILENAME)
+        statistics = load_statistics(self.path, cache_file, workers=1)
+        assert_equal(statistics.get('area', 'SW'), Counts(1, 1))
+        assert_false(os.path.exists(cache_file))
+
+
+class TestSharedTownNames(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        write_sample_release(self.path)
+        _write_file(os.path.join(self.path, LOCALITY_FILENAME), 'LOCALITY',
+                    LOCALITIES + [('3', '', '', 'NEWPORT', '', ''),
+                                  ('4', '', '', 'NEWPORT', '', '')])
+        #Addresses in two Newports, and one with no Locality File entry.
+        _write_file(os.path.join(self.path, 'fpmainfl.c04'), 'ADDRESS', [
+                ('NP201AA', '5', '3', '0', '0', '0', '0', '1', '0', '0',
+                 '0', '0', 'S', '', '1A', '', ''),
+                ('NP201AA', '6', '3', '0', '0', '0', '0', '2', '0', '0',
+                 '0', '0', 'S', '', '1B', '', ''),
+                ('PO301AA', '7', '4', '0', '0', '0', '0', '1', '0', '0',
+                 '0', '0', 'S', '', '1A', '', ''),
+                ('PO301AB', '8', '9', '0', '0', '0', '0', '1', '0', '0',
+                 '0', '0', 'S', '', '1A', '', ''),
+                ])
+        self.statistics = compute_statistics(self.path, workers=1)
+
+    def teardown_method(self):
+        shutil.rmtree(self.path)
+
+    def test_towns_by_area(self):
+        get = self.statistics.get
+        assert_equal(get('post town', 'Newport, NP'), Counts(2, 2))
+        assert_equal(get('post town', 'newport,po'), Counts(1, 1))
+        assert_raises(ValueError, get, 'post town', 'Newport')
+        assert_equal(get('area', 'PO'), Counts(2, 2))
+        assert_false('' in self.statistics.levels['post town'])
+        assert_equal(sum(x.delivery_points for x in
+                         self.statistics.levels['post town'].values()), 7)
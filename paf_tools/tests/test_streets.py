@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sample_release import write_sample_release
+from paf_tools.populate.populate import populate_address_data
+from paf_tools.database.tables import Address, Street
+from paf_tools.database.streets import find_streets, find_street_addresses
+
+class TestStreets(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.path = tempfile.mkdtemp()
+        write_sample_release(cls.path)
+        cls.engine = create_engine('sqlite:///{}'.format(
+                os.path.join(cls.path, 'paf.db')))
+        populate_address_data(cls.path, engine=cls.engine)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.engine.dispose()
+        shutil.rmtree(cls.path)
+
+    def setup_method(self):
+        self.session = sessionmaker(bind=self.engine)()
+
+    def teardown_method(self):
+        self.session.close()
+
+    def test_find_streets(self):
+        streets = find_streets("cowley  ROAD", session=self.session)
+        assert_equal([str(x) for x in streets],
+                     ['Cowley Road, Cowley, Oxford',
+                      'Bartlemas Close, Cowley Road, Cowley, Oxford'])
+        assert_equal([x.delivery_points for x in streets], [2, 1])
+        assert_equal(len(find_streets("Bartlemas Close", "oxford",
+                                      session=self.session)), 1)
+        assert_equal(find_streets("Downing Street", "Oxford",
+                                  session=self.session), [])
+
+    def test_find_streets_with_town(self):
+        streets = find_streets("Cowley Road, Oxford", session=self.session)
+        assert_equal([x.delivery_points for x in streets], [2, 1])
+        assert_equal(find_streets("Cowley Road, London",
+                                  session=self.session), [])
+
+    def test_street_addresses(self):
+        street = find_streets("Cowley Road", session=self.session)[0]
+        addresses = find_street_addresses(street, session=self.session)
+        assert_equal([x.address_key for x in addresses], [1, 2])
+        addresses = find_street_addresses(street, min_number=10,
+                                          max_number=12, session=self.session)
+        assert_equal([x.address_key for x in addresses], [2])
+
+    def test_street_of_address(self):
+        address = self.session.query(Address).filter_by(address_key=3).one()
+        addresses = find_street_addresses(address, session=self.session)
+        assert_equal([x.address_key for x in addresses], [3])
+
+    def test_uses_index(self):
+        plan = self.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM addresses WHERE "
+            "thoroughfare_key = 1 AND thoroughfare_descriptor_key = 1 AND "
+            "dependent_thoroughfare_key = 0 AND "
+            "dependent_thoroughfare_descriptor_key = 0 AND locality_key = 1 "
+            "AND building_number BETWEEN 1 AND 20 ORDER BY building_number"
+            )).fetchall()
+        assert_true(any('ix_addresses_street' in row[-1] for row in plan))
+
+
+class TestOldSchema(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        write_sample_release(self.path)
+        self.engine = create_engine('sqlite:///{}'.format(
+                os.path.join(self.path, 'paf.db')))
+        populate_address_data(self.path, engine=self.engine)
+
+    def teardown_method(self):
+        self.engine.dispose()
+        shutil.rmtree(self.path)
+
+    def test_missing_table(self):
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP TABLE {}".format(
+                    Street.__tablename__)))
+        assert_raises_regex(ValueError, "streets table", 
+                            populate_address_data, self.path, 
+                            erase_existing=False, engine=self.engine)
+
+    def test_missing_column(self):
+        #As for a database built before the street keys were added.
+        with self.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_addresses_street"))
+            connection.execute(text(
+                    "ALTER TABLE addresses DROP COLUMN locality_key"))
+        assert_raises_regex(ValueError, "locality_key", 
+                            populate_address_data, self.path, 
+                            erase_existing=False, engine=self.engine)
+        #Erasing the database rebuilds it with the current schema.
+        assert_equal(populate_address_data(self.path, engine=self.engine), 4)
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from paf_tools.typeahead import (TypeaheadIndex, Suggestion, normalise,
+                                 build_typeahead_index)
+
+def _addresses():
+    for number in range(1, 21):
+        yield {'postcode': 'OX4 1AA' if number < 15 else 'OX4 1AB',
+               'thoroughfare': 'Cowley Road', 'post town': 'Oxford'}
+    for number in range(1, 6):
+        yield {'postcode': 'OX4 2AA', 'thoroughfare': 'Cowley Place',
+               'dependent thoroughfare': 'Mews Lane', 'post town': 'Oxford'}
+    yield {'postcode': 'M1  1AA', 'thoroughfare': "St Mary's Street",
+           'post town': 'Manchester'}
+
+class TestTypeahead(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.folder, 'typeahead.idx')
+        cls.count = build_typeahead_index(_addresses(), cls.filename,
+                                          top_k=3)
+        cls.index = TypeaheadIndex(cls.filename)
+
+    @classmethod
+    def teardown_class(cls):
+        cls.index.close()
+        shutil.rmtree(cls.folder)
+
+    def test_normalise(self):
+        assert_equal(normalise("Cowley Rd, Oxf"), "COWLEY ROAD OXF")
+        assert_equal(normalise("cowley rd"), "COWLEY RD")
+        assert_equal(normalise("cowley rd "), "COWLEY ROAD ")
+
+    def test_postcodes(self):
+        assert_equal(len(self.index), self.count)
+        assert_equal(self.index.suggest("ox4 1"),
+                     [Suggestion('OX4 1AA', 14), Suggestion('OX4 1AB', 6)])
+        assert_equal(self.index.suggest("OX41A"),
+                     self.index.suggest("OX4 1A"))
+        assert_equal(self.index.suggest("m1 1"),
+                     [Suggestion('M1 1AA', 1)])
+
+    def test_streets(self):
+        assert_equal(self.index.suggest("Cowley Rd, Oxf"),
+                     [Suggestion('Cowley Road, Oxford', 20)])
+        assert_equal(self.index.suggest("co"),
+                     [Suggestion('Cowley Road, Oxford', 20),
+                      Suggestion('Cowley Place, Oxford', 5)])
+        assert_equal(self.index.suggest("mews"),
+                     [Suggestion('Mews Lane, Oxford', 5)])
+        assert_equal(self.index.suggest("st marys"),
+                     [Suggestion("St Mary's Street, Manchester", 1)])
+        assert_equal(self.index.suggest("zz"), [])
+
+    def test_limit(self):
+        assert_equal(len(self.index.suggest("c", limit=1)), 1)
+        assert_equal(len(self.index.suggest("c", limit=10)), 2)
+
+    def test_street_without_town(self):
+        filename = os.path.join(self.folder, 'no-town.idx')
+        build_typeahead_index([{'postcode': 'ZE1 1AA',
+                                'thoroughfare': 'Quiet Lane',
+                                'post town': None}], filename)
+        with TypeaheadIndex(filename) as index:
+            assert_equal(index.suggest("quiet"),
+                         [Suggestion('Quiet Lane', 1)])
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from nose.tools import *
+from sample_release import write_sample_release, format_record
+from paf_tools.populate.validate import validate_release
+
+class TestValidateRelease(object):
+
+    def setup_method(self):
+        self.path = tempfile.mkdtemp()
+        write_sample_release(self.path)
+
+    def teardown_method(self):
+        shutil.rmtree(self.path)
+
+    def _append(self, filename, line):
+        """Insert a line before the footer of a sample file."""
+        filename = os.path.join(self.path, filename)
+        with open(filename) as paf_file:
+            lines = paf_file.readlines()
+        lines.insert(-1, line + '\n')
+        with open(filename, 'w') as paf_file:
+            paf_file.writelines(lines)
+
+    def test_valid_release(self):
+        report = validate_release(self.path, workers=2)
+        assert_true(report)
+        assert_equal(sum(report.records.values()), 18)
+
+    def test_problems_reported(self):
+        self._append('fpmainfl.c04', format_record('ADDRESS', (
+            'OX4 1AD', '5', '9', '1', '1', '0', '0', '0', '7', '0', '0',
+            '1', 'L', '', '1A', '', '')))
+        self._append('fpmainfl.c05', format_record('ADDRESS', (
+            'OX4 1AA', '1', '1', '1', '1', '0', '0', '0', '1', '1', '0',
+            '0', 'S', '', '1A', '', '')))
+        self._append('fpmainfl.c05', 'OX4 1AEXXXXXXXX')
+        self._append('thfare.c01', format_record('THOROUGHFARE', (
+            '1', 'COWLEY'
+            )))
+        report = validate_release(self.path, workers=2)
+        assert_false(report)
+        assert_equal(dict(report.orphans),
+                     {'locality': 1, 'building name': 1})
+        assert_equal(dict(report.duplicates),
+                     {'ADDRESS': 1, 'THOROUGHFARE': 1})
+        assert_equal(sum(report.malformed.values()), 1)
+        assert_true("Release is NOT valid." in str(report))
+
+    def test_signed_key_malformed(self):
+        line = format_record('ADDRESS', (
+            'OX4 1AD', '5', '1', '1', '1', '0', '0', '0', '0', '0', '0',
+            '0', 'S', '', '1A', '', ''))
+        self._append('fpmainfl.c04', line[:7] + '+0000005' + line[15:])
+        report = validate_release(self.path, workers=1)
+        assert_false(report)
+        assert_equal(sum(report.malformed.values()), 1)
+
+    def test_duplicate_reported_in_its_file(self):
+        self._append('thfare.c01', format_record('THOROUGHFARE', (
+            '1', 'COWLEY'
+            )))
+        report = validate_release(self.path, workers=1)
+        example, = report.examples[('duplicate', 'THOROUGHFARE')]
+        #The header is line 1, and the duplicate follows the three entries.
+        assert_equal(example[:2], (os.path.join(self.path, 'thfare.c01'), 5))
+
+    def test_duplicate_address_location(self):
+        #Repeat the delivery point of fpmainfl.c02 in a later file.
+        self._append('fpmainfl.c03', format_record('ADDRESS', (
+            'OX4 1AB', '3', '1', '1', '1', '3', '3', '14', '0', '0', '0',
+            '0', 'S', '', '1A', '', '')))
+        report = validate_release(self.path, workers=2)
+        example, = report.examples[('duplicate', 'ADDRESS')]
+        assert_equal(example, (os.path.join(self.path, 'fpmainfl.c03'), 3,
+                               "Address Key 3"))
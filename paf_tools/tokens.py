@@ -0,0 +1,27 @@
+"""Tokens module.
+
+Contains helper functions for splitting free-form address text into 
+tokens which may be compared with the PAF, used by the matching and 
+typeahead modules.
+
+"""
+import re
+
+#Define common abbreviations, expanded before tokens are compared.
+ABBREVIATIONS = {
+        'RD': 'ROAD', 'ST': 'STREET', 'AVE': 'AVENUE', 'AV': 'AVENUE',
+        'LN': 'LANE', 'DR': 'DRIVE', 'CL': 'CLOSE', 'CT': 'COURT',
+        'CRES': 'CRESCENT', 'GDNS': 'GARDENS', 'GRN': 'GREEN', 'GR': 'GROVE',
+        'PL': 'PLACE', 'SQ': 'SQUARE', 'TER': 'TERRACE', 'TERR': 'TERRACE',
+        'HSE': 'HOUSE', 'APT': 'FLAT', 'APARTMENT': 'FLAT',
+        }
+
+def tokenise(text):
+    """Split text into a list of upper case tokens, expanding abbreviations.
+
+    Numbers with a letter suffix (e.g. 12A) are kept as single tokens, and
+    a number range (e.g. 12-14) is split into its numbers.
+
+    """
+    tokens = re.findall(r"[0-9]+[A-Z]?\b|[A-Z]+", text.upper())
+    return [ABBREVIATIONS.get(token, token) for token in tokens]
@@ -0,0 +1,294 @@
+"""Typeahead module.
+
+Provides an index for suggesting completions of partially typed
+postcodes (e.g. "OX4 1") and streets (e.g. "Cowley Rd, Oxf"), ranked by
+the number of delivery points each covers.
+
+The index is built from flattened address data (e.g. from PAFData) and
+written to a single file, laid out as:-
+
+    * a header of the magic bytes b"PAFTYPE1", the number of entries, the
+      number of precomputed prefixes, the number of results kept for each
+      precomputed prefix and the length of those prefixes;
+    * arrays of unsigned 32-bit integers holding the offsets of each key
+      and label within the key and label data, the delivery point count
+      of each entry, the offsets of each precomputed prefix, and the
+      entries suggested for each precomputed prefix; and
+    * the key, label and prefix data, as UTF-8 strings.
+
+Entries are sorted by key, so the entries beginning with a prefix form a
+contiguous range, found by binary search. Keys are normalised - upper case,
+with punctuation removed and abbreviations expanded - so that the typed
+text need not match the PAF exactly. Postcode keys are prefixed with "#"
+and have their spaces removed, so that "OX41" and "OX4 1" both match.
+
+Short prefixes match too many entries to rank quickly, so the suggestions
+for every prefix of up to PRECOMPUTED_LENGTH characters are computed when
+the index is built. The suggestions for longer prefixes are ranked from
+their range of entries as needed, and cached.
+
+The file is memory-mapped when opened, so it opens instantly and may be
+shared between processes through the page cache.
+
+"""
+import re
+import mmap
+import heapq
+import struct
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from functools import lru_cache
+from paf_tools.postcode import to_display
+from paf_tools.tokens import ABBREVIATIONS
+
+#Define the magic bytes at the start of every index file.
+INDEX_MAGIC = b"PAFTYPE1"
+#Define the layout of the header of an index file.
+INDEX_HEADER = struct.Struct("=8sIIII")
+#Define the default number of suggestions returned.
+DEFAULT_TOP_K = 10
+#Define the length of the longest prefix whose suggestions are precomputed.
+PRECOMPUTED_LENGTH = 3
+#Define the value used to pad the suggestions of a precomputed prefix.
+NO_ENTRY = 0xFFFFFFFF
+#Define the character beginning every postcode key.
+POSTCODE_MARKER = '#'
+#Define the pattern of text which may be the start of a postcode.
+POSTCODE_START = re.compile(r"^[A-Z]{1,2}[0-9]")
+
+Suggestion = namedtuple('Suggestion', ['label', 'delivery_points'])
+
+def normalise(text, partial=True):
+    """Normalise text for comparison with the keys of the index.
+
+    Returns the words of the text in upper case, separated by single spaces,
+    with abbreviations expanded. If partial is True, the last word is taken
+    to be incomplete unless the text ends with a space or punctuation, and
+    so is not expanded (and a trailing space is kept otherwise).
+
+    """
+    words = re.findall(r"[0-9A-Z]+", text.upper().replace("'", ""))
+    complete = not partial or not re.search(r"[0-9A-Za-z']$", text)
+    expanded = [ABBREVIATIONS.get(x, x) for x in words]
+    if words and not complete:
+        expanded[-1] = words[-1]
+    key = ' '.join(expanded)
+    if partial and complete and key:
+        key += ' '
+    return key
+
+def postcode_key(postcode):
+    """Return the index key of a (partial) postcode."""
+    return POSTCODE_MARKER + re.sub(r"[^0-9A-Z]", "", postcode.upper())
+
+def build_typeahead_index(addresses, filename, top_k=DEFAULT_TOP_K):
+    """Build a typeahead index from flattened address data.
+
+    Counts the delivery points of every postcode, and of every street (the
+    thoroughfare or dependent thoroughfare, with the post town), and
+    writes the index file. Returns the number of entries in the index.
+
+    Keyword arguments:
+    addresses - an iterable of flattened address dictionaries (e.g. a
+                PAFData instance)
+    filename - the path of the index file to write
+    top_k - the number of suggestions precomputed for each short prefix
+            (defaults to DEFAULT_TOP_K)
+
+    """
+    postcodes, streets = {}, {}
+    for address in addresses:
+        postcode = to_display(address['postcode'])
+        postcodes[postcode] = postcodes.get(postcode, 0) + 1
+        for street in ('thoroughfare', 'dependent thoroughfare'):
+            if address.get(street):
+                label = ', '.join(x for x in (address[street],
+                                              address.get('post town')) if x)
+                streets[label] = streets.get(label, 0) + 1
+    entries = {postcode_key(label): (label, count)
+               for label, count in postcodes.items()}
+    for label, count in streets.items():
+        key = normalise(label, partial=False)
+        #Where labels normalise to the same key, merge them.
+        if key in entries:
+            count += entries[key][1]
+            label = min(label, entries[key][0])
+        entries[key] = (label, count)
+    entries = sorted(entries.items())
+    _write_index(filename, entries, _precompute(entries, top_k), top_k)
+    return len(entries)
+
+def _precompute(entries, top_k):
+    """Find the top suggestions for every short prefix of the entry keys.
+
+    Returns a sorted list of (prefix, [entry index...]) tuples.
+
+    """
+    heaps = {}
+    for index, (key, (label, count)) in enumerate(entries):
+        start = 1 if key.startswith(POSTCODE_MARKER) else 0
+        for length in range(1, PRECOMPUTED_LENGTH + 1):
+            if start + length > len(key):
+                break
+            heap = heaps.setdefault(key[:start + length], [])
+            item = (count, -index)
+            if len(heap) < top_k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    return [(prefix, [-index for _, index in sorted(heap, reverse=True)])
+            for prefix, heap in sorted(heaps.items())]
+
+def _write_index(filename, entries, prefixes, top_k):
+    """Write the entries and precomputed prefixes to an index file."""
+    keys = [key.encode('utf-8') for key, _ in entries]
+    labels = [label.encode('utf-8') for _, (label, _) in entries]
+    prefix_keys = [prefix.encode('utf-8') for prefix, _ in prefixes]
+    results = array('I')
+    for _, indices in prefixes:
+        results.extend(indices + [NO_ENTRY] * (top_k - len(indices)))
+    with open(filename, 'wb') as index_file:
+        index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(entries),
+                                           len(prefixes), top_k,
+                                           PRECOMPUTED_LENGTH))
+        _offsets(keys).tofile(index_file)
+        _offsets(labels).tofile(index_file)
+        array('I', (count for _, (_, count) in entries)).tofile(index_file)
+        _offsets(prefix_keys).tofile(index_file)
+        results.tofile(index_file)
+        for strings in (keys, labels, prefix_keys):
+            index_file.write(b''.join(strings))
+    return None
+
+def _offsets(strings):
+    """Return an array of the offsets of each string once joined."""
+    offsets = array('I', [0])
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return offsets
+
+
+class TypeaheadIndex(object):
+    """This class defines the TypeaheadIndex class.
+
+    The TypeaheadIndex suggests completions of partially typed postcodes and
+    streets, using an index file written by build_typeahead_index.
+
+    """
+    def __init__(self, filename, cache_size=100000):
+        """Initialise TypeaheadIndex instance.
+
+        Keyword arguments:
+        filename - the path of the index file
+        cache_size - the number of prefixes for which suggestions are
+                     cached (defaults to 100000)
+
+        """
+        with open(filename, 'rb') as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, count, prefix_count, self.top_k, self.precomputed_length = \
+            INDEX_HEADER.unpack_from(self._map)
+        if magic != INDEX_MAGIC:
+            self._map.close()
+            raise ValueError("Error! {} is not a valid typeahead index."
+                             .format(filename))
+        view = memoryview(self._map)
+        position = INDEX_HEADER.size
+        arrays = []
+        for length in (count + 1, count + 1, count, prefix_count + 1,
+                       prefix_count * self.top_k):
+            arrays.append(view[position:position + length * 4].cast('I'))
+            position += length * 4
+        view.release()
+        (key_offsets, label_offsets, self._weights, prefix_offsets,
+         self._results) = arrays
+        self._arrays = arrays
+        self._keys = _Strings(self._map, position, key_offsets)
+        position += key_offsets[-1]
+        self._labels = _Strings(self._map, position, label_offsets)
+        position += label_offsets[-1]
+        self._prefixes = _Strings(self._map, position, prefix_offsets)
+        self._suggest = lru_cache(cache_size)(self._suggest_uncached)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._weights)
+
+    def suggest(self, text, limit=None):
+        """Suggest completions of partially typed text.
+
+        Returns a list of Suggestions, each of a label (a postcode, or a
+        street and post town) and the number of delivery points it covers,
+        in descending order of delivery points.
+
+        Keyword arguments:
+        text - the text typed so far
+        limit - the number of suggestions to return (defaults to the number
+                precomputed for each prefix)
+
+        """
+        return self._suggest(text, limit or self.top_k)
+
+    def close(self):
+        """Close the index file."""
+        self._suggest.cache_clear()
+        for view in self._arrays:
+            view.release()
+        self._map.close()
+        return None
+
+    def _suggest_uncached(self, text, limit):
+        """Suggest completions of text, without caching."""
+        prefixes = []
+        street = normalise(text)
+        if street.strip():
+            prefixes.append(street)
+        compact = re.sub(r"[^0-9A-Z]", "", text.upper())
+        if POSTCODE_START.match(compact):
+            prefixes.append(postcode_key(compact))
+        indices = set()
+        for prefix in prefixes:
+            indices.update(self._find(prefix.encode('utf-8'), limit))
+        ranked = sorted(indices, key=lambda x: (-self._weights[x], x))
+        return [Suggestion(self._labels[x].decode('utf-8'), self._weights[x])
+                for x in ranked[:limit]]
+
+    def _find(self, prefix, limit):
+        """Find the indices of the top entries beginning with a prefix."""
+        body = prefix[1:] if prefix.startswith(b'#') else prefix
+        if len(body) <= self.precomputed_length and limit <= self.top_k:
+            position = bisect_left(self._prefixes, prefix)
+            if (position < len(self._prefixes) and
+                    self._prefixes[position] == prefix):
+                start = position * self.top_k
+                return [x for x in self._results[start:start + limit]
+                        if x != NO_ENTRY]
+        low = bisect_left(self._keys, prefix)
+        high = bisect_left(self._keys, prefix + b'\xff', low)
+        return heapq.nsmallest(limit, range(low, high),
+                               key=lambda x: (-self._weights[x], x))
+
+
+class _Strings(object):
+    """A read-only sequence of the strings held in a memory-mapped file."""
+
+    def __init__(self, data, start, offsets):
+        self.data = data
+        self.start = start
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0 or index >= len(self.offsets) - 1:
+            raise IndexError(index)
+        return self.data[self.start + self.offsets[index]:
+                         self.start + self.offsets[index + 1]]